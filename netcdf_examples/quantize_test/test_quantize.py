@@ -1,12 +1,12 @@
 import copy
 import glob
-import netCDF4
-import numpy
 import os
 import sys
 import subprocess
 import unittest
 
+import xios_examples.nc_compare as nc_compare
+
 this_path = os.path.realpath(__file__)
 this_dir = os.path.dirname(this_path)
 
@@ -49,26 +49,20 @@ class TestQuantize(unittest.TestCase):
 
     def test_check_output(self):
         '''
-        Generate our reference netcdf files from the cdl files, and ensure
-        they are the same (within self.tolerance) as those produced from
-        the test
+        Compare the field of each produced netcdf file with the reference
+        compiled from its cdl file, see kgo_store, and ensure they are the
+        same (within self.tolerance)
         '''
         for netcdf_file in self.expected_netcdf_files:
             netcdf_fileroot = ''.join(netcdf_file.split('.')[:-1])
-            # create our reference netcdf file
-            reference_ncfile = '{}_ref.nc'.format(netcdf_fileroot)
-            subprocess.run(['ncgen', '-k', 'nc4', '-o', reference_ncfile,
-                            '{}.cdl'.format(netcdf_fileroot)],
-                           cwd=self.test_dir)
-            test_results = netCDF4.Dataset(
-                os.path.join(self.test_dir, netcdf_file))['field'][:]
-            expected = netCDF4.Dataset(
-                os.path.join(self.test_dir, reference_ncfile))['field'][:]
-            diff = test_results - expected
-            result = numpy.allclose(test_results, expected, rtol=self.tolerance)
+            cdl_file = os.path.join(self.test_dir, '{}.cdl'.format(netcdf_fileroot))
+            reports = nc_compare.compare_kgo(os.path.join(self.test_dir, netcdf_file),
+                                             cdl_file, ['field'], rtol=self.tolerance)
+            result = all(report['ok'] for report in reports)
             if not result:
-                sys.stdout.write('The produced data array in file {0}.nc '
+                sys.stdout.write('The produced data array in file {0} '
                                  'differes from \nthat in'
-                                 ' the reference cdl file {0}.cdl\n'.
-                                 format(netcdf_file))
+                                 ' the reference cdl file {1}.cdl\n{2}\n'.
+                                 format(netcdf_file, netcdf_fileroot,
+                                        nc_compare.format_report(reports)))
             self.assertTrue(result)
@@ -0,0 +1,158 @@
+"""
+Benchmarks of gen_netcdf, sweeping grid sizes, levels and analytic functions.
+
+Each case runs `gen_netcdf.run` in a fresh process, writing a regular lat/lon
+file or a UGRID file, and records the best wall time of its repeats, the
+throughput in points/s and MB/s written, and the peak resident memory of the
+process over its baseline after imports.  UGRID cases need a mesh file; by
+default the C12 mesh of read_unstructured_domain_resample is made with ncgen.
+
+usage: python -m xios_examples.bench_gen_netcdf [--grid 180x360 ...] [--nlev 0 10]
+           [--func vortex ...] [--backend numpy] [--repeat 3] [--json FILE]
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import netCDF4
+import numpy as np
+
+import xios_examples.gen_netcdf as gn
+from xios_examples.dataFunc import dataFunc
+
+this_path = os.path.realpath(__file__)
+this_dir = os.path.dirname(this_path)
+
+default_grids = ['90x180', '180x360', '360x720']
+default_nlev = [0, 10]
+mesh_cdl = os.path.join(this_dir, 'read_unstructured_domain_resample', 'mesh_C12.cdl')
+data_name = 'bench_data'
+
+
+def run_case(case, out_dir, repeat):
+    """
+    Run one benchmark case, a dict of kind ('regular' or 'ugrid'), func,
+    nlat, nlon, nlev, backend and mesh_file, returning it with its results.
+
+    Called in a fresh process, so that its peak memory is its own.
+    """
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out_file = os.path.join(out_dir, f'bench_{os.getpid()}.nc')
+    kwargs = dict(func_str=case['func'], nlev=case['nlev'], backend=case['backend'],
+                  data_name=[data_name], ugrid_data_name=data_name)
+    if case['kind'] == 'regular':
+        kwargs.update(file_out=out_file, nlat=[case['nlat']], nlon=[case['nlon']])
+    else:
+        kwargs.update(ugrid_file_out=out_file, mesh_file=case['mesh_file'])
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        gn.run(**kwargs)
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    with netCDF4.Dataset(out_file, 'r') as ds:
+        points = ds[data_name].size
+    nbytes = os.path.getsize(out_file)
+    os.remove(out_file)
+    result = dict(case)
+    result.update({'points': points, 'bytes': nbytes, 'best_s': best,
+                   'mean_s': sum(times) / len(times), 'repeat': repeat,
+                   'points_per_s': points / best, 'mb_per_s': nbytes / best / 1e6,
+                   'baseline_rss_kb': baseline_kb,
+                   'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+    return result
+
+
+def make_cases(grids, nlevs, funcs, backend, mesh_file=None):
+    """
+    Return the list of benchmark cases for the sweep.
+
+    """
+    cases = []
+    for func in funcs:
+        for nlev in nlevs:
+            for grid in grids:
+                nlat, nlon = (int(n) for n in grid.split('x'))
+                cases.append({'kind': 'regular', 'func': func, 'nlat': nlat, 'nlon': nlon,
+                              'nlev': nlev, 'backend': backend, 'mesh_file': None})
+            if mesh_file is not None:
+                cases.append({'kind': 'ugrid', 'func': func, 'nlat': None, 'nlon': None,
+                              'nlev': nlev, 'backend': backend, 'mesh_file': mesh_file})
+    return cases
+
+
+def run_cases(cases, repeat=3):
+    """
+    Run each case in its own process, yielding results as they complete.
+
+    """
+    with tempfile.TemporaryDirectory() as out_dir:
+        for case in cases:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+                yield executor.submit(run_case, case, out_dir, repeat).result()
+
+
+def report_line(result):
+    grid = (f"{result['nlat']}x{result['nlon']}" if result['kind'] == 'regular'
+            else 'mesh')
+    peak_mb = (result['peak_rss_kb'] - result['baseline_rss_kb']) / 1024
+    return (f"{result['kind']:8s} {result['func']:11s} {grid:>10s} {result['nlev']:5d} "
+            f"{result['points']:11d} {result['best_s']:9.4f} {result['points_per_s']:12.4g} "
+            f"{result['mb_per_s']:9.2f} {peak_mb:9.1f}")
+
+
+def main(argv=None):
+    funclist = dataFunc().get_funclist()
+    parser = argparse.ArgumentParser(description='Benchmark gen_netcdf across grid sizes and analytic functions')
+    parser.add_argument('--grid', nargs='+', default=default_grids,
+                        help='Regular grid sizes as NLATxNLON (default: %(default)s)')
+    parser.add_argument('--nlev', nargs='+', type=int, default=default_nlev,
+                        help='Numbers of levels, 0 for 2D data (default: %(default)s)')
+    parser.add_argument('--func', nargs='+', choices=funclist, default=funclist,
+                        help='Analytic functions (default: all)')
+    parser.add_argument('--backend', default=gn.defaults['backend'],
+                        help='Evaluation backend, see dataFunc (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per case, the best time is reported (default: %(default)s)')
+    parser.add_argument('--mesh_file', help='UGRID mesh file (default: made from mesh_C12.cdl)')
+    parser.add_argument('--no_ugrid', action='store_true', help='Skip the UGRID cases')
+    parser.add_argument('--json', help='Append results as JSON lines to this file')
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+
+    with tempfile.TemporaryDirectory() as mesh_dir:
+        mesh_file = args.mesh_file
+        if mesh_file is None and not args.no_ugrid:
+            if shutil.which('ncgen'):
+                mesh_file = os.path.join(mesh_dir, 'mesh_C12.nc')
+                subprocess.run(['ncgen', '-k', 'nc4', '-o', mesh_file, mesh_cdl], check=True)
+            else:
+                print('ncgen not found, skipping UGRID cases', file=sys.stderr)
+        if args.no_ugrid:
+            mesh_file = None
+
+        cases = make_cases(args.grid, args.nlev, args.func, args.backend, mesh_file)
+        print(f"{'kind':8s} {'func':11s} {'grid':>10s} {'nlev':>5s} {'points':>11s} "
+              f"{'best (s)':>9s} {'points/s':>12s} {'MB/s':>9s} {'peak MB':>9s}", flush=True)
+        stamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        for result in run_cases(cases, args.repeat):
+            print(report_line(result), flush=True)
+            if args.json:
+                result.update({'time': stamp, 'numpy': np.__version__,
+                               'netcdf4': netCDF4.__version__})
+                with open(args.json, 'a') as fout:
+                    fout.write(json.dumps(result) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
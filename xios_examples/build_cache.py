@@ -0,0 +1,198 @@
+"""
+Shared cache of compiled Fortran example programmes.
+
+A build is keyed on the Makefile and Fortran sources of an example directory,
+the `arch/*.fcm` files, the compiler environment and a fingerprint of the
+XIOS library.  An unchanged example reuses its cached executables without
+running `make`; a changed one restores the object files of its latest
+cached build whose sources are unchanged, so only stale objects are rebuilt.
+
+The cache is enabled by setting the environment variable TCD_CACHE_DIR,
+see nc_cache.  Without it every build runs `make clean` then `make`.
+"""
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import xios_examples.nc_cache as nc_cache
+
+this_path = os.path.realpath(__file__)
+this_dir = os.path.dirname(this_path)
+repo_dir = os.path.dirname(this_dir)
+
+# environment variables used by the example Makefiles
+build_env = ['FC', 'FCFLAGS', 'LDFLAGS', 'XIOS_BINDIR', 'XIOS_LIBDIR', 'MVER']
+source_patterns = ['Makefile', '*.F90', '*.f90']
+object_patterns = ['*.o', '*.mod', '*.MOD']
+# a Fortran module statement, or a module procedure statement
+module_statement = re.compile(r'^\s*module\s+(\w+)', re.IGNORECASE)
+# number of builds kept per example directory
+max_builds = 3
+
+
+def toolchain_key():
+    """
+    Return a key for everything outside an example directory that affects its build.
+
+    """
+    parts = [f'{name}={os.environ.get(name, "")}' for name in build_env]
+    for fcm in sorted(glob.glob(os.path.join(repo_dir, 'arch', '*.fcm'))):
+        parts.append(nc_cache.file_hash(fcm))
+    # the XIOS library and server are fingerprinted by size and modification time
+    for xios_file in [os.path.join(os.environ.get('XIOS_LIBDIR', ''), 'libxios.a'),
+                      os.path.join(os.environ.get('XIOS_BINDIR', ''), 'xios_server.exe')]:
+        if os.path.exists(xios_file):
+            stat = os.stat(xios_file)
+            parts.append(f'{xios_file}:{stat.st_size}:{stat.st_mtime_ns}')
+    return nc_cache.make_key(*parts)
+
+
+def source_hashes(test_dir):
+    """
+    Return a dict of file name to content hash for the build inputs of test_dir.
+
+    """
+    hashes = {}
+    for pattern in source_patterns:
+        for src in glob.glob(os.path.join(test_dir, pattern)):
+            hashes[os.path.basename(src)] = nc_cache.file_hash(src)
+    return hashes
+
+
+def builds_dir(test_dir):
+    """
+    Return the cache directory for builds of test_dir with the current toolchain,
+    or None if caching is disabled.
+
+    """
+    cdir = nc_cache.cache_dir('build')
+    if cdir is None:
+        return None
+    return cdir / os.path.basename(os.path.normpath(test_dir)) / toolchain_key()
+
+
+def link_xios_server(test_dir):
+    # as done by the example Makefiles when linking
+    server = os.path.join(test_dir, 'xios_server.exe')
+    if os.path.lexists(server):
+        os.remove(server)
+    os.symlink(os.path.join(os.environ.get('XIOS_BINDIR', ''), 'xios_server.exe'), server)
+
+
+def restore_executables(test_dir, build):
+    """
+    Copy the executables of a cached build into test_dir.
+
+    """
+    for exe in build.glob('*.exe'):
+        shutil.copy2(exe, os.path.join(test_dir, exe.name))
+    link_xios_server(test_dir)
+
+
+def module_sources(test_dir, sources):
+    """
+    Return a dict of lower case Fortran module name to the names of the
+    sources in test_dir defining it.
+
+    """
+    modules = {}
+    for name in sources:
+        if Path(name).suffix.lower() != '.f90':
+            continue
+        with open(os.path.join(test_dir, name), errors='replace') as fin:
+            for line in fin:
+                match = module_statement.match(line)
+                if match and match.group(1).lower() != 'procedure':
+                    modules.setdefault(match.group(1).lower(), []).append(name)
+    return modules
+
+
+def restore_objects(test_dir, bdir, sources):
+    """
+    Copy object and module files of the latest cached build into test_dir,
+    for those sources which are unchanged, marking them newer than the sources
+    so that `make` only rebuilds stale objects.
+
+    Module files are restored only if the sources defining the module are
+    unchanged, as for objects.
+    """
+    builds = sorted((b for b in bdir.glob('*')
+                     if not b.name.startswith('.') and (b / 'manifest.json').exists()),
+                    key=lambda b: b.stat().st_mtime, reverse=True)
+    if not builds:
+        return
+    with open(builds[0] / 'manifest.json') as fin:
+        manifest = json.load(fin)
+    if manifest.get('Makefile') != sources.get('Makefile'):
+        return
+    modules = module_sources(test_dir, sources)
+    for obj in builds[0].glob('*'):
+        stem = obj.stem
+        if obj.suffix == '.o':
+            src = [name for name in sources if Path(name).stem == stem]
+        elif obj.suffix in ('.mod', '.MOD'):
+            src = modules.get(stem.lower(), [])
+        else:
+            continue
+        if not src or any(manifest.get(name) != sources[name] for name in src):
+            continue
+        dest = os.path.join(test_dir, obj.name)
+        shutil.copy2(obj, dest)
+        os.utime(dest)
+
+
+def store(test_dir, bdir, key, sources):
+    """
+    Copy the executables, objects and modules of test_dir into the cache.
+
+    """
+    bdir.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=bdir, prefix='.tmp'))
+    for pattern in ['*.exe'] + object_patterns:
+        for built in glob.glob(os.path.join(test_dir, pattern)):
+            if not os.path.islink(built):
+                shutil.copy2(built, tmp)
+    with open(tmp / 'manifest.json', 'w') as fout:
+        json.dump(sources, fout, indent=1)
+    try:
+        os.rename(tmp, bdir / key)
+    except OSError:
+        # stored concurrently by another process
+        shutil.rmtree(tmp, ignore_errors=True)
+    old = sorted((b for b in bdir.glob('*') if not b.name.startswith('.')),
+                 key=lambda b: b.stat().st_mtime, reverse=True)
+    for build in old[max_builds:]:
+        shutil.rmtree(build, ignore_errors=True)
+
+
+def build(test_dir):
+    """
+    Build the Fortran programme(s) of test_dir, reusing cached builds if enabled.
+
+    """
+    bdir = builds_dir(test_dir)
+    if bdir is None:
+        subprocess.run(['make', 'clean'], cwd=test_dir, check=True)
+        subprocess.run(['make'], cwd=test_dir, check=True)
+        return
+
+    sources = source_hashes(test_dir)
+    key = nc_cache.make_key(json.dumps(sources, sort_keys=True))
+    cached = bdir / key
+    subprocess.run(['make', 'clean'], cwd=test_dir, check=True)
+    if cached.is_dir():
+        print(f'reusing cached build {cached}', flush=True)
+        restore_executables(test_dir, cached)
+        # mark as recently used
+        os.utime(cached)
+        return
+
+    if bdir.is_dir():
+        restore_objects(test_dir, bdir, sources)
+    subprocess.run(['make'], cwd=test_dir, check=True)
+    store(test_dir, bdir, key, sources)
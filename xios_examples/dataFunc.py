@@ -1,5 +1,11 @@
+import functools
 import numpy as np
 
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
 class dataFunc:
     """
     Class containing functions which generate analytical data values for an input of
@@ -8,8 +14,70 @@ class dataFunc:
     Functions sinusiod,harmonic,vortex,gulfstream are taken from the paper
     `Benchmarking Regridding Libraries Used in Earth System Modelling`, see
     https://www.mdpi.com/2297-8747/27/2/31
+
+    The latitude and longitude arrays may be full 2-D coordinate arrays, or for regular
+    grids a latitude column (nlat, 1) and longitude row (1, nlon) which broadcast
+    against each other. Terms depending on only one axis are then evaluated once per
+    axis point and cached, rather than at every grid point.
+
+    The evaluation backend is chosen per instance:
+        numpy: plain NumPy expressions (default)
+        inplace: NumPy ufuncs writing into a few preallocated out= buffers,
+                 bit-identical to numpy
+        fused: the fused backend bit-identical to numpy, i.e. inplace
+        numexpr: fused numexpr kernels, needs the optional numexpr package, opt-in
+                 only as it is not bit-identical to numpy: its transcendental
+                 functions agree to a relative 1e-14 (vortex differs by up to
+                 ~80 ulp), or 1e-13 for gulfstream, on float64 coordinates
+
+    Time dependent data, for a time t in hours, is given by get_time_func: functions
+    with a time parameter, such as vortex, are evaluated at t, others drift eastward
+    at lon_drift degrees per hour.
     """
 
+    # maximum number of cached axis terms held by an instance
+    max_axis_cache = 64
+    backends = ['numpy', 'inplace', 'fused', 'numexpr']
+    # functions with a time parameter t
+    time_funcs = ['vortex']
+    # eastward drift of functions without a time parameter, in degrees per hour
+    lon_drift = 1.0
+
+    def __init__(self, backend='numpy'):
+        if backend not in self.backends:
+            raise ValueError(f'Unknown backend {backend}, expected one of {self.backends}')
+        if backend == 'fused':
+            backend = 'inplace'
+        if backend == 'numexpr' and numexpr is None:
+            raise ImportError('The numexpr backend needs the numexpr package')
+        self.backend = backend
+        self._axis_cache = {}
+
+    def axis_term(self, name, arr, term):
+        """
+        Return term(arr), cached when arr is a broadcastable axis vector.
+
+            Parameters:
+                name: Unique name of the term, used in the cache key
+                arr: Coordinate array
+                term: Function of arr only
+        """
+
+        if np.ndim(arr) != 2 or min(np.shape(arr)) != 1 or np.ma.isMaskedArray(arr):
+            # full 2-D or unstructured coordinates, nothing to share between points
+            return term(arr)
+
+        key = (name, arr.shape, arr.dtype.str, arr.tobytes())
+        value = self._axis_cache.get(key)
+        if value is None:
+            if len(self._axis_cache) >= self.max_axis_cache:
+                self._axis_cache.clear()
+            value = term(arr)
+            value.flags.writeable = False
+            self._axis_cache[key] = value
+
+        return value
+
     def func_sinusiod(self, latarr, lonarr):
     
         length = 1.2*np.pi
@@ -17,7 +85,21 @@ class dataFunc:
         coef = 2.0
         coefmult = 1.0
     
-        data = np.array(coefmult*(coef - np.cos( np.pi*(np.arccos( np.cos(lonarr*conv)*np.cos(latarr*conv) )/length))), dtype=np.float64)
+        coslon = self.axis_term('cos_lon', lonarr, lambda a: np.cos(a*conv))
+        coslat = self.axis_term('cos_lat', latarr, lambda a: np.cos(a*conv))
+        if self.backend == 'numexpr':
+            pi = np.pi
+            data = numexpr.evaluate('coefmult*(coef - cos(pi*(arccos(coslon*coslat)/length)))')
+        elif self.backend == 'inplace':
+            data = np.multiply(coslon, coslat)
+            np.arccos(data, out=data)
+            np.divide(data, length, out=data)
+            np.multiply(np.pi, data, out=data)
+            np.cos(data, out=data)
+            np.subtract(coef, data, out=data)
+            np.multiply(coefmult, data, out=data)
+        else:
+            data = np.array(coefmult*(coef - np.cos( np.pi*(np.arccos( coslon*coslat )/length))), dtype=np.float64)
     
         return data
     
@@ -25,40 +107,89 @@ class dataFunc:
     
         conv = np.pi/180.0
     
-        data = np.array(2.0 + (np.sin(2.0*latarr*conv)**16)*np.cos(16.0*lonarr*conv), dtype=np.float64)
+        sinlat16 = self.axis_term('sin_2lat_16', latarr, lambda a: np.sin(2.0*a*conv)**16)
+        cos16lon = self.axis_term('cos_16lon', lonarr, lambda a: np.cos(16.0*a*conv))
+        if self.backend == 'numexpr':
+            data = numexpr.evaluate('2.0 + sinlat16*cos16lon')
+        elif self.backend == 'inplace':
+            data = np.multiply(sinlat16, cos16lon)
+            np.add(2.0, data, out=data)
+        else:
+            data = np.array(2.0 + sinlat16*cos16lon, dtype=np.float64)
     
         return data
     
-    def func_vortex(self, latarr, lonarr):
+    def func_vortex(self, latarr, lonarr, t=6.0):
     
         lon0 = 5.5
         lat0 = 0.2
         r0 = 3.0
         d = 5.0
-        t = 6.0
         conv = np.pi/180.0
         sinc = np.sin(lat0)
         cosc = np.cos(lat0)
     
         # Find the rotated Longitude and Latitude of a point on a sphere
         # with pole at (lon0, lat0)
-        cost = np.cos(latarr*conv)
-        sint = np.sin(latarr*conv)
+        cost = self.axis_term('cos_lat', latarr, lambda a: np.cos(a*conv))
+        sint = self.axis_term('sin_lat', latarr, lambda a: np.sin(a*conv))
+        cosl = self.axis_term('cos_lon_vortex', lonarr, lambda a: np.cos(a*conv-lon0))
+        sinl = self.axis_term('sin_lon_vortex', lonarr, lambda a: np.sin(a*conv-lon0))
     
-        trm = cost * np.cos(lonarr*conv-lon0)
-        x = sinc * trm - cosc*sint
-        y = cost * np.sin(lonarr*conv-lon0)
-        z = sinc * sint + cosc*trm
+        if self.backend == 'numexpr':
+            pi = np.pi
+            vt0 = 3.0 * np.sqrt(3.0)/2.0
+            lon = numexpr.evaluate('arctan2(cost*sinl, sinc*(cost*cosl) - cosc*sint)')
+            lon = numexpr.evaluate('where(lon < 0.0, lon + 2.0*pi, lon)')
+            rho = numexpr.evaluate('r0*cos(arcsin(sinc*sint + cosc*(cost*cosl)))')
+            data = numexpr.evaluate('2.0*(1.0 + tanh(rho/d*sin(lon - where(rho == 0.0, 0.0, '
+                                    'vt0/cosh(rho)/cosh(rho)*tanh(rho)/rho)*t)))')
+        elif self.backend == 'inplace':
+            # four full size buffers: trm (until rho is made), lon, rho, work and omega;
+            # terms with sinc or cosc are float64 even for float32 coordinates, as in numpy
+            trm = np.multiply(cost, cosl)
+            lon = np.multiply(sinc, trm)
+            np.subtract(lon, cosc*sint, out=lon)
+            np.arctan2(np.multiply(cost, sinl), lon, out=lon)
+            np.add(lon, 2.0*np.pi, out=lon, where=lon < 0.0)
+            rho = np.multiply(cosc, trm)
+            del trm
+            np.add(sinc*sint, rho, out=rho)
+            np.arcsin(rho, out=rho)
+            np.cos(rho, out=rho)
+            np.multiply(r0, rho, out=rho)
+            work = np.cosh(rho)
+            omega = np.divide(3.0 * np.sqrt(3.0)/2.0, work)
+            np.divide(omega, work, out=omega)
+            np.tanh(rho, out=work)
+            np.multiply(omega, work, out=omega)
+            at_pole = rho == 0.0
+            np.divide(omega, rho, out=omega, where=~at_pole)
+            omega[at_pole] = 0.0
+            np.multiply(omega, t, out=omega)
+            np.subtract(lon, omega, out=lon)
+            np.sin(lon, out=lon)
+            data = rho
+            np.divide(data, d, out=data)
+            np.multiply(data, lon, out=data)
+            np.tanh(data, out=data)
+            np.add(1.0, data, out=data)
+            np.multiply(2.0, data, out=data)
+        else:
+            trm = cost * cosl
+            x = sinc * trm - cosc*sint
+            y = cost * sinl
+            z = sinc * sint + cosc*trm
     
-        lon = np.arctan2(y, x)
-        lon = np.where(lon < 0.0, lon+2.0*np.pi, lon)
-        lat = np.arcsin(z)
+            lon = np.arctan2(y, x)
+            lon = np.where(lon < 0.0, lon+2.0*np.pi, lon)
+            lat = np.arcsin(z)
     
-        rho = r0 * np.cos(lat)
-        vt = 3.0 * np.sqrt(3.0)/2.0/np.cosh(rho)/np.cosh(rho)*np.tanh(rho)
-        omega = np.where(rho == 0.0, 0.0, vt/rho)
+            rho = r0 * np.cos(lat)
+            vt = 3.0 * np.sqrt(3.0)/2.0/np.cosh(rho)/np.cosh(rho)*np.tanh(rho)
+            omega = np.where(rho == 0.0, 0.0, vt/rho)
     
-        data = np.array(2.0*(1.0+np.tanh(rho/d * np.sin(lon-omega*t))), dtype=np.float64)
+            data = np.array(2.0*(1.0+np.tanh(rho/d * np.sin(lon-omega*t))), dtype=np.float64)
     
         return data
     
@@ -83,19 +214,68 @@ class dataFunc:
                       ((gf_dmp_lat - gf_ori_lat)*conv)**2)
 
         # Original OASIS fcos analytical test function
-        fnc_ana = (coef-np.cos(np.pi*(np.arccos(np.cos(latarr*conv)*np.cos(lonarr*conv))/length)))
+        coslat = self.axis_term('cos_lat', latarr, lambda a: np.cos(a*conv))
+        coslon = self.axis_term('cos_lon', lonarr, lambda a: np.cos(a*conv))
         gf_per_lon = lonarr
         gf_per_lon = np.where(gf_per_lon > 180.0, gf_per_lon-360.0, gf_per_lon)
         gf_per_lon = np.where(gf_per_lon < -180.0, gf_per_lon+360.0, gf_per_lon)
         dx = (gf_per_lon - gf_ori_lon)*conv
         dy = (latarr - gf_ori_lat)*conv
-        dr = np.sqrt(dx*dx + dy*dy)
-        dth = np.arctan2(dy, dx)
-        dc = 1.3*gf_coef
-        dc = np.where(dr > dr0, 0.0, dc)
-        dc = np.where(dr > dr1, dc * np.cos(np.pi*0.5*(dr-dr1)/(dr0-dr1)), dc)
-        data = np.array(fnc_ana + (np.maximum(1000.0*np.sin(0.4*(0.5*dr+dth)+0.007*np.cos(50.0*dth) +
-                                                            0.37*np.pi),999.0)-999.0)*dc, dtype=np.float64)
+        if self.backend == 'numexpr':
+            pi = np.pi
+            dc0 = 1.3*gf_coef
+            dr = numexpr.evaluate('sqrt(dx*dx + dy*dy)')
+            dth = numexpr.evaluate('arctan2(dy, dx)')
+            wave = numexpr.evaluate('1000.0*sin(0.4*(0.5*dr+dth)+0.007*cos(50.0*dth)+0.37*pi)')
+            data = numexpr.evaluate('coef-cos(pi*(arccos(coslat*coslon)/length)) + '
+                                    '(where(wave > 999.0, wave, 999.0)-999.0)*'
+                                    'where(dr > dr0, 0.0, where(dr > dr1, dc0*cos(pi*0.5*(dr-dr1)/(dr0-dr1)), dc0))')
+        elif self.backend == 'inplace':
+            # five full size buffers: data, dr, dth, dc and work; dc and the terms
+            # with dr0 or dr1 are float64 even for float32 coordinates, as in numpy
+            data = np.multiply(coslat, coslon)
+            np.arccos(data, out=data)
+            np.divide(data, length, out=data)
+            np.multiply(np.pi, data, out=data)
+            np.cos(data, out=data)
+            np.subtract(coef, data, out=data)
+            dr = np.add(dx*dx, dy*dy)
+            np.sqrt(dr, out=dr)
+            dth = np.arctan2(dy, dx)
+            dc = np.full(dr.shape, 1.3*gf_coef)
+            dc[dr > dr0] = 0.0
+            work = np.subtract(dr, dr1)
+            np.multiply(np.pi*0.5, work, out=work)
+            np.divide(work, dr0-dr1, out=work)
+            np.cos(work, out=work)
+            np.multiply(dc, work, out=dc, where=dr > dr1)
+            del work
+            # the wave term, in the dr buffer
+            wave = dr
+            np.multiply(0.5, wave, out=wave)
+            np.add(wave, dth, out=wave)
+            np.multiply(0.4, wave, out=wave)
+            np.multiply(50.0, dth, out=dth)
+            np.cos(dth, out=dth)
+            np.multiply(0.007, dth, out=dth)
+            np.add(wave, dth, out=wave)
+            np.add(wave, 0.37*np.pi, out=wave)
+            np.sin(wave, out=wave)
+            np.multiply(1000.0, wave, out=wave)
+            np.maximum(wave, 999.0, out=wave)
+            np.subtract(wave, 999.0, out=wave)
+            np.multiply(wave, dc, out=dc)
+            np.add(data, dc, out=dc)
+            data = dc
+        else:
+            fnc_ana = (coef-np.cos(np.pi*(np.arccos(coslat*coslon)/length)))
+            dr = np.sqrt(dx*dx + dy*dy)
+            dth = np.arctan2(dy, dx)
+            dc = 1.3*gf_coef
+            dc = np.where(dr > dr0, 0.0, dc)
+            dc = np.where(dr > dr1, dc * np.cos(np.pi*0.5*(dr-dr1)/(dr0-dr1)), dc)
+            data = np.array(fnc_ana + (np.maximum(1000.0*np.sin(0.4*(0.5*dr+dth)+0.007*np.cos(50.0*dth) +
+                                                                0.37*np.pi),999.0)-999.0)*dc, dtype=np.float64)
 
         return data
     
@@ -106,8 +286,31 @@ class dataFunc:
         coef = 21.0
         coefmult = 3.846 * 20.0
     
-        data = np.array(coefmult*(coef - np.cos( np.pi*(np.arccos( np.cos(lonarr*conv)*np.cos(latarr*conv) )/length)) *
-                                         np.sin( np.pi*(np.arcsin( np.sin(lonarr*conv)*np.sin(latarr*conv) )/length))), dtype=np.float64)
+        coslon = self.axis_term('cos_lon', lonarr, lambda a: np.cos(a*conv))
+        coslat = self.axis_term('cos_lat', latarr, lambda a: np.cos(a*conv))
+        sinlon = self.axis_term('sin_lon', lonarr, lambda a: np.sin(a*conv))
+        sinlat = self.axis_term('sin_lat', latarr, lambda a: np.sin(a*conv))
+        if self.backend == 'numexpr':
+            pi = np.pi
+            data = numexpr.evaluate('coefmult*(coef - cos(pi*(arccos(coslon*coslat)/length)) * '
+                                    'sin(pi*(arcsin(sinlon*sinlat)/length)))')
+        elif self.backend == 'inplace':
+            data = np.multiply(coslon, coslat)
+            np.arccos(data, out=data)
+            np.divide(data, length, out=data)
+            np.multiply(np.pi, data, out=data)
+            np.cos(data, out=data)
+            work = np.multiply(sinlon, sinlat)
+            np.arcsin(work, out=work)
+            np.divide(work, length, out=work)
+            np.multiply(np.pi, work, out=work)
+            np.sin(work, out=work)
+            np.multiply(data, work, out=data)
+            np.subtract(coef, data, out=data)
+            np.multiply(coefmult, data, out=data)
+        else:
+            data = np.array(coefmult*(coef - np.cos( np.pi*(np.arccos( coslon*coslat )/length)) *
+                                             np.sin( np.pi*(np.arcsin( sinlon*sinlat )/length))), dtype=np.float64)
     
         return data
 
@@ -117,8 +320,31 @@ class dataFunc:
 
         return funclist
 
-    def get_func(self, name: str):
+    def get_func(self, name: str, backend=None):
+
+        if backend is not None and backend != self.backend:
+            return dataFunc(backend).get_func(name)
 
         do = f"func_{name}"
         if hasattr(self, do) and callable(func := getattr(self, do)):
+            if self.backend != 'numpy':
+                # fused kernels work on plain arrays, not netCDF masked arrays
+                return functools.partial(self.eval_plain, func)
             return func
+
+    def get_time_func(self, name: str, backend=None):
+
+        func = self.get_func(name, backend)
+        if func is not None:
+            return functools.partial(self.eval_time, func, name in self.time_funcs)
+
+    def eval_time(self, func, has_t, latarr, lonarr, t):
+
+        if has_t:
+            return func(latarr, lonarr, t=t)
+        return func(latarr, np.subtract(lonarr, self.lon_drift*t))
+
+    def eval_plain(self, func, latarr, lonarr, **kwargs):
+
+        data = func(np.ma.getdata(latarr), np.ma.getdata(lonarr), **kwargs)
+        return np.asarray(data, dtype=np.float64)
@@ -1,6 +1,8 @@
 import sys
 import os
 import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import netCDF4 as nc
 import numpy as np
 from .dataFunc import dataFunc
@@ -15,27 +17,121 @@ defaults = {
             'nlat': [101],
             'nlon': [100],
             'nlev': 0,
+            'ntime': 0,
+            'timestep': 1.0,
             'dim_prefix': '',
             'dim_suffix': '',
             'data_name': 'data',
             'ugrid_data_name': 'data',
+            'nlat_chunk': None,
+            'workers': 1,
+            'backend': 'numpy',
            }
 
-def create_ncfile(ncfile, nlat, nlon, nlev, func, dim_prefix='', dim_suffix='', data_name=''):
+def lat_bands(nlat, nlat_chunk=None):
+    """
+    Generate slices which split the latitude dimension into bands.
+
+        Parameters:
+            nlat: Number of latitude points
+            nlat_chunk: Number of latitude points per band, None for a single band
+    """
+
+    if nlat_chunk is None or nlat_chunk <= 0:
+        nlat_chunk = nlat
+    for start in range(0, nlat, nlat_chunk):
+        yield slice(start, min(start + nlat_chunk, nlat))
+
+def eval_band(func, lat_vals, lon_vals, band, *args):
+    """
+    Evaluate a data function for one latitude band of a regular latitude/longitude grid.
+
+        Parameters:
+            func: Function to generate data values
+            lat_vals: Latitude values of the whole grid
+            lon_vals: Longitude values of the whole grid
+            band: Slice of latitude points to evaluate
+            args: Further arguments of func, such as the time
+    """
+
+    # latitude column and longitude row broadcast against each other in func
+    lat_col = lat_vals[band, np.newaxis]
+    lon_row = lon_vals[np.newaxis, :]
+
+    return func(lat_col, lon_row, *args)
+
+def fill_band(buffer_file, shape, func, lat_vals, lon_vals, band, *args):
+    """
+    Evaluate a data function for one latitude band into a memory-mapped buffer file,
+    used by worker processes.
+
+        Parameters:
+            buffer_file: Name of the memory-mapped float64 buffer file for the whole grid
+            shape: Shape of the buffer, (nlat, nlon)
+            func: Function to generate data values
+            lat_vals: Latitude values of the whole grid
+            lon_vals: Longitude values of the whole grid
+            band: Slice of latitude points to evaluate
+            args: Further arguments of func, such as the time
+    """
+
+    field = np.memmap(buffer_file, dtype=np.float64, mode='r+', shape=shape)
+    field[band, :] = eval_band(func, lat_vals, lon_vals, band, *args)
+    field.flush()
+    del field
+
+def create_time(ncfile):
+    """
+    Create the unlimited time dimension and coordinate, in hours, if not already
+    in ncfile, and return the coordinate variable.
+
+        Parameters:
+            ncfile: An open, writable netCDF4 dataset
+    """
+
+    if 'time' not in ncfile.dimensions:
+        ncfile.createDimension('time', None)
+        time = ncfile.createVariable('time', np.float64, ('time',))
+        time.units = 'hours since 1970-01-01 00:00:00'
+        time.standard_name = 'time'
+        time.calendar = 'standard'
+        time.axis = 'T'
+    return ncfile.variables['time']
+
+def create_ncfile(ncfile, nlat, nlon, nlev, func, dim_prefix='', dim_suffix='', data_name='',
+                  nlat_chunk=None, executor=None, workers=1, ntime=0, timestep=1.0):
     """
     Create netCDF file variables for data on a regular latitude/longitude grid.
 
+    Data values are generated and written one latitude band at a time, and each
+    band is written once per vertical level, so memory use does not depend on nlev.
+    Time series are appended one time step at a time, so memory use does not
+    depend on ntime either.
+
         Parameters:
             ncfile: An open, writable netCDF4 dataset
             nlat: Number of latitude points
             nlon: Number of longitude points
             nlev: Number of vertical levels
-            func: Function to generate data values
+            func: Function to generate data values, or a dict of data variable
+                  name to function to write several variables on the grid
             dim_prefix: prefix for the latitude/longitude/level dimension name
             dim_suffix: suffix for the latitude/longitude/level dimension name
-            data_name: data variable name
+            data_name: data variable name, not used if func is a dict
+            nlat_chunk: Number of latitude points per band written, also used as
+                        the netCDF chunk size, None to write the whole grid at once
+            executor: Process pool used to generate latitude bands in parallel,
+                      None to generate them serially
+            workers: Number of processes in executor, used to size the bands
+                     when nlat_chunk is None
+            ntime: Number of time steps written along an unlimited time dimension,
+                   0 for data without time, in which case func is called func(lat, lon)
+                   rather than func(lat, lon, time)
+            timestep: Time step in hours
     """
 
+    funcs = func if isinstance(func, dict) else {data_name: func}
+
     latname = f'{dim_prefix}latitude{dim_suffix}'
     lonname = f'{dim_prefix}longitude{dim_suffix}'
 
@@ -52,7 +148,8 @@ def create_ncfile(ncfile, nlat, nlon, nlev, func, dim_prefix='', dim_suffix='',
     step_lat = 180.0/(nlat-1)
     first_lat = -90.0
     lat[:] = first_lat + step_lat*np.arange(nlat)
-    lat2d = np.repeat(lat,nlon).reshape(nlat,nlon)
+    # the data functions are evaluated on the float32 coordinates, as stored
+    lat_vals = np.asarray(lat[:])
 
     lat_bnds = ncfile.createVariable(lat.bounds, np.float32, (latname,'nbounds'))
     lat_bnds[:,0] = lat[:] - step_lat/2.0
@@ -66,12 +163,16 @@ def create_ncfile(ncfile, nlat, nlon, nlev, func, dim_prefix='', dim_suffix='',
     step_lon = 360.0/nlon
     first_lon = 0.0
     lon[:] = first_lon + step_lon*np.arange(nlon)
-    lon2d = np.tile(lon,(nlat,1))
+    # the float32 longitudes are promoted to float64 on first use, as masked array
+    # arithmetic did for the tiled longitudes of the 2-D grids this replaces
+    lon_vals = np.asarray(lon[:], dtype=np.float64)
 
     lon_bnds = ncfile.createVariable(lon.bounds, np.float32, (lonname,'nbounds'))
     lon_bnds[:,0] = lon[:] - step_lon/2.0
     lon_bnds[:,1] = lon[:] + step_lon/2.0
 
+    dims = (latname,lonname)
+    chunksizes = None if nlat_chunk is None else (min(nlat_chunk, nlat), nlon)
     if nlev > 0:
         levname = f'{dim_prefix}level{dim_suffix}'
         ncfile.createDimension(levname, nlev)
@@ -81,16 +182,195 @@ def create_ncfile(ncfile, nlat, nlon, nlev, func, dim_prefix='', dim_suffix='',
         lev.standard_name = 'model_levels'
         lev[:] = np.arange(nlev) + 1
 
-        data = ncfile.createVariable(data_name, np.float64, (levname,latname,lonname))
+        dims = (levname,) + dims
+        chunksizes = None if chunksizes is None else (1,) + chunksizes
+    if ntime > 0:
+        time = create_time(ncfile)
+        # one time step and level per chunk, so that each step is appended without
+        # rewriting others, and chunks stay small for fine grids with many levels
+        if chunksizes is None:
+            chunksizes = (1,)*(nlev > 0) + (nlat, nlon)
+        dims = ('time',) + dims
+        chunksizes = (1,) + chunksizes
+    datas = {}
+    for name in funcs:
+        data = ncfile.createVariable(name, np.float64, dims, chunksizes=chunksizes)
         data.long_name = "input data values"
-        data[:] = np.tile(func(lat2d, lon2d), (nlev,1,1))
+        datas[name] = data
+
+    def write_band(data, band, data_band, *record):
+        if nlev > 0:
+            for ilev in range(nlev):
+                data[record + (ilev, band, slice(None))] = data_band
+        else:
+            data[record + (band, slice(None))] = data_band
+
+    # time steps as record index and time value, or a single step without either
+    steps = [((itime,), (itime*timestep,)) for itime in range(ntime)] or [((), ())]
+
+    if executor is None:
+        for record, args in steps:
+            if record:
+                time[record] = args[0]
+            for band in lat_bands(nlat, nlat_chunk):
+                for name, func in funcs.items():
+                    write_band(datas[name], band, eval_band(func, lat_vals, lon_vals, band, *args), *record)
     else:
-        data = ncfile.createVariable(data_name, np.float64, (latname,lonname))
-        data.long_name = "input data values"
-        data[:] = func(lat2d, lon2d)
+        # workers fill bands of a memory-mapped buffer, only this process writes the netCDF file
+        nlat_tile = nlat_chunk if nlat_chunk is not None else -(-nlat // (4*workers))
+        with tempfile.TemporaryDirectory() as buffer_dir:
+            buffer_file = os.path.join(buffer_dir, 'field.buf')
+            field = np.memmap(buffer_file, dtype=np.float64, mode='w+', shape=(nlat, nlon))
+            for record, args in steps:
+                if record:
+                    time[record] = args[0]
+                for name, func in funcs.items():
+                    futures = [executor.submit(fill_band, buffer_file, field.shape, func,
+                                               lat_vals, lon_vals, band, *args)
+                               for band in lat_bands(nlat, nlat_tile)]
+                    for future in futures:
+                        future.result()
+                    for band in lat_bands(nlat, nlat_chunk):
+                        write_band(datas[name], band, field[band, :], *record)
+            del field
+
+def read_connectivity(var, start_index=0):
+    """
+    Read a UGRID connectivity variable as a plain integer array rebased to
+    start_index, and a boolean array marking its missing (fill) values.
+
+        Parameters:
+            var: netCDF4 connectivity variable, with a start_index attribute
+            start_index: start index of the returned connectivity
+    """
+    auto_mask = var.mask
+    var.set_auto_mask(False)
+    try:
+        data = var[:]
+    finally:
+        var.set_auto_mask(auto_mask)
+    fills = [nc.default_fillvals[data.dtype.str[1:]]]
+    if '_FillValue' in var.ncattrs():
+        fills.append(var._FillValue)
+    missing = np.isin(data, fills)
+    offset = start_index - var.start_index
+    if offset:
+        np.add(data, offset, out=data, where=~missing, casting='unsafe')
+    return data, missing
+
+
+def write_connectivity(var, data, missing):
+    """
+    Write connectivity data to var, once, with missing values set to its fill value.
+
+    """
+    if np.any(missing):
+        fill = var._FillValue if '_FillValue' in var.ncattrs() else nc.default_fillvals[var.dtype.str[1:]]
+        data = np.where(missing, fill, data)
+    var[:] = data
+
+
+class UgridMesh:
+    """
+    Topology, coordinates and connectivity of a 2D UGRID mesh, read once
+    from a netCDF file into arrays, with connectivity rebased to start_index.
+
+        Parameters:
+            meshin_file: UGRID netCDF file
+            meshin_varname: Variable name of mesh topology data in meshin_file,
+                            None to use the first with cf_role mesh_topology
+    """
+    start_index = 0
+
+    def __init__(self, meshin_file, meshin_varname=None):
+
+        with nc.Dataset(meshin_file, 'r', format='NETCDF4') as ncmeshin:
+
+            if meshin_varname is None:
+                for name,var in ncmeshin.variables.items():
+                    if 'cf_role' in var.ncattrs():
+                        if var.cf_role == 'mesh_topology':
+                            # Will use the first instance of cf_role == 'mesh_topology' found.
+                            # If multiple instances in file consider specifying --meshvar meshin_varname on command line
+                            meshin_varname = name
+                            break
+
+            try:
+                meshin_var = ncmeshin.variables[meshin_varname]
+            except KeyError:
+                print (f'Mesh topology variable {meshin_varname} does not exist')
+                raise
+            self.varname = meshin_varname
+
+            self.nface = ncmeshin.dimensions[f'n{meshin_varname}_face'].size
+            self.nnode = ncmeshin.dimensions[f'n{meshin_varname}_node'].size
+            self.nedge = ncmeshin.dimensions[f'n{meshin_varname}_edge'].size
+
+            # connectivity as (data, missing) pairs
+            def connectivity(attr):
+                return read_connectivity(ncmeshin.variables[meshin_var.getncattr(attr)],
+                                         self.start_index)
+            self.face_node = connectivity('face_node_connectivity')
+            self.edge_node = connectivity('edge_node_connectivity')
+            self.face_edge = connectivity('face_edge_connectivity')
+            self.edge_face = None
+            if 'edge_face_connectivity' in meshin_var.ncattrs():
+                self.edge_face = connectivity('edge_face_connectivity')
+            self.face_face = connectivity('face_face_connectivity')
+
+            def coordinates(attr):
+                lon = lat = None
+                for coord in meshin_var.getncattr(attr).split(" "):
+                    coordvar = ncmeshin.variables[coord]
+                    if coordvar.standard_name == 'longitude':
+                        lon = coordvar[:]
+                    elif coordvar.standard_name == 'latitude':
+                        lat = coordvar[:]
+                return lon, lat
+            self.face_lon, self.face_lat = coordinates('face_coordinates')
+            self.node_lon, self.node_lat = coordinates('node_coordinates')
+            self.edge_lon = self.edge_lat = None
+            if 'edge_coordinates' in meshin_var.ncattrs():
+                self.edge_lon, self.edge_lat = coordinates('edge_coordinates')
+
+        # shared between calls, so must not be modified
+        for arr in (self.face_lon, self.face_lat, self.node_lon, self.node_lat,
+                    self.edge_lon, self.edge_lat):
+            if arr is not None:
+                arr.flags.writeable = False
+        for pair in (self.face_node, self.edge_node, self.face_edge, self.edge_face,
+                     self.face_face):
+            if pair is not None:
+                for arr in pair:
+                    arr.flags.writeable = False
+
+
+# meshes read by load_mesh, by file and variable name, most recently used last
+mesh_cache = {}
+max_mesh_cache = 4
+
+
+def load_mesh(meshin_file, meshin_varname=None):
+    """
+    Return the UgridMesh of meshin_file, reusing the mesh read by an earlier
+    call unless the file has since changed.
+
+    """
+    key = (os.path.realpath(meshin_file), meshin_varname)
+    stat = os.stat(meshin_file)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = mesh_cache.pop(key, None)
+    if cached is None or cached[0] != version:
+        cached = (version, UgridMesh(meshin_file, meshin_varname))
+    mesh_cache[key] = cached
+    while len(mesh_cache) > max_mesh_cache:
+        del mesh_cache[next(iter(mesh_cache))]
+    return cached[1]
+
 
 def create_ncfile_unstructured(ncmeshout, meshin_file, meshin_varname, nlev, func, 
-                               add_bounds=True, dim_prefix='', dim_suffix='', data_name=''):
+                               add_bounds=True, dim_prefix='', dim_suffix='', data_name='',
+                               ntime=0, timestep=1.0):
     """
     Create netCDF file variables for data on a unstructured latitude/longitude grid,
     uses unstructured mesh from UGRID netCDF file.
@@ -99,70 +379,29 @@ def create_ncfile_unstructured(ncmeshout, meshin_file, meshin_varname, nlev, fun
             ncmeshout: An open, writable netCDF4 dataset
             meshin_file: UGRID netCDF file, used to extract mesh topology
             meshin_varname: Variable name of mesh topology data in meshin_file
-            func: Function to generate data values
+            func: Function to generate data values, or a dict of data variable
+                  name to function to write several variables on the mesh
             add_bounds: Add latitude/longitude bounds information
             dim_prefix: prefix for the level dimension name
             dim_suffix: suffix for the level dimension name
-            data_name: data variable name
+            data_name: data variable name, not used if func is a dict
+            ntime: Number of time steps appended along an unlimited time dimension,
+                   0 for data without time, in which case func is called func(lat, lon)
+                   rather than func(lat, lon, time)
+            timestep: Time step in hours
     """
 
-    ncmeshin = nc.Dataset(meshin_file, 'r', format='NETCDF4')
+    funcs = func if isinstance(func, dict) else {data_name: func}
 
-    if meshin_varname is None:
-        for name,var in ncmeshin.variables.items():
-            if 'cf_role' in var.ncattrs():
-                if var.cf_role == 'mesh_topology':
-                    # Will use the first instance of cf_role == 'mesh_topology' found.
-                    # If multiple instances in file consider specifying --meshvar meshin_varname on command line
-                    meshin_varname = name
-                    break
-
-    try:
-        meshin_var = ncmeshin.variables[meshin_varname]
-    except KeyError:
-        print (f'Mesh topology variable {meshin_varname} does not exist')
-        raise
-
-    nface = ncmeshin.dimensions[f'n{meshin_varname}_face'].size
-    nnode = ncmeshin.dimensions[f'n{meshin_varname}_node'].size
-    nedge = ncmeshin.dimensions[f'n{meshin_varname}_edge'].size
-    
-    face_node_connectivity = ncmeshin.variables[meshin_var.face_node_connectivity]
-    edge_node_connectivity = ncmeshin.variables[meshin_var.edge_node_connectivity]
-    face_edge_connectivity = ncmeshin.variables[meshin_var.face_edge_connectivity]
-    if 'edge_face_connectivity' in meshin_var.ncattrs():
-        edge_face_connectivity = ncmeshin.variables[meshin_var.edge_face_connectivity]
-    face_face_connectivity = ncmeshin.variables[meshin_var.face_face_connectivity]
-
-    for face_coord in meshin_var.face_coordinates.split(" "):
-        face_coordvar = ncmeshin.variables[face_coord]
-        if face_coordvar.standard_name == 'longitude':
-            face_lon = face_coordvar[:]
-        elif face_coordvar.standard_name == 'latitude':
-            face_lat = face_coordvar[:]
-
-    for node_coord in meshin_var.node_coordinates.split(" "):
-        node_coordvar = ncmeshin.variables[node_coord]
-        if node_coordvar.standard_name == 'longitude':
-            node_lon = node_coordvar[:]
-        elif node_coordvar.standard_name == 'latitude':
-            node_lat = node_coordvar[:]
-
-    if 'edge_coordinates' in meshin_var.ncattrs():
-        for edge_coord in meshin_var.edge_coordinates.split(" "):
-            edge_coordvar = ncmeshin.variables[edge_coord]
-            if edge_coordvar.standard_name == 'longitude':
-                edge_lon = edge_coordvar[:]
-            elif edge_coordvar.standard_name == 'latitude':
-                edge_lat = edge_coordvar[:]
+    mesh = load_mesh(meshin_file, meshin_varname)
 
     meshout_varname = 'Mesh2d'
     ncmeshout.Conventions = "UGRID-1.0"
-    start_index = 0
+    start_index = mesh.start_index
 
-    face_dim = ncmeshout.createDimension(f'n{meshout_varname}_face', nface)
-    node_dim = ncmeshout.createDimension(f'n{meshout_varname}_node', nnode)
-    edge_dim = ncmeshout.createDimension(f'n{meshout_varname}_edge', nedge)
+    face_dim = ncmeshout.createDimension(f'n{meshout_varname}_face', mesh.nface)
+    node_dim = ncmeshout.createDimension(f'n{meshout_varname}_node', mesh.nnode)
+    edge_dim = ncmeshout.createDimension(f'n{meshout_varname}_edge', mesh.nedge)
     vertex_dim = ncmeshout.createDimension(f'n{meshout_varname}_vertex', 4)
     two_dim = ncmeshout.createDimension('Two', 2)
 
@@ -176,7 +415,7 @@ def create_ncfile_unstructured(ncmeshout, meshin_file, meshin_varname, nlev, fun
     meshout_var.face_node_connectivity = f"{meshout_varname}_face_nodes"
     meshout_var.edge_node_connectivity = f"{meshout_varname}_edge_nodes"
     meshout_var.face_edge_connectivity = f"{meshout_varname}_face_edges"
-    if 'edge_face_connectivity' in meshin_var.ncattrs():
+    if mesh.edge_face is not None:
         meshout_var.edge_face_connectivity = f"{meshout_varname}_edge_face_links"
     meshout_var.face_face_connectivity = f"{meshout_varname}_face_links"
 
@@ -184,65 +423,65 @@ def create_ncfile_unstructured(ncmeshout, meshin_file, meshin_varname, nlev, fun
     face_x.standard_name = "longitude"
     face_x.long_name = "Characteristic longitude of mesh faces."
     face_x.units = "degrees_east"
-    face_x[:] = face_lon
+    face_x[:] = mesh.face_lon
 
     face_y = ncmeshout.createVariable(f"{meshout_varname}_face_y", np.float32, (face_dim.name,))
     face_y.standard_name = "latitude"
     face_y.long_name = "Characteristic latitude of mesh faces."
     face_y.units = "degrees_north"
-    face_y[:] = face_lat
+    face_y[:] = mesh.face_lat
 
     node_x = ncmeshout.createVariable(f"{meshout_varname}_node_x", np.float32, (node_dim.name,))
     node_x.standard_name = "longitude"
     node_x.long_name = "Longitude of mesh nodes."
     node_x.units = "degrees_east"
-    node_x[:] = node_lon
+    node_x[:] = mesh.node_lon
 
     node_y = ncmeshout.createVariable(f"{meshout_varname}_node_y", np.float32, (node_dim.name,))
     node_y.standard_name = "latitude"
     node_y.long_name = "Latitude of mesh nodes."
     node_y.units = "degrees_north"
-    node_y[:] = node_lat
+    node_y[:] = mesh.node_lat
 
     edge_x = ncmeshout.createVariable(f"{meshout_varname}_edge_x", np.float32, (edge_dim.name,))
     edge_x.standard_name = "longitude"
     edge_x.long_name = "Characteristic longitude of mesh edges."
     edge_x.units = "degrees_east"
-    if 'edge_coordinates' in meshin_var.ncattrs():
-        edge_x[:] = edge_lon
+    if mesh.edge_lon is not None:
+        edge_x[:] = mesh.edge_lon
 
     edge_y = ncmeshout.createVariable(f"{meshout_varname}_edge_y", np.float32, (edge_dim.name,))
     edge_y.standard_name = "latitude"
     edge_y.long_name = "Characteristic latitude of mesh edges."
     edge_y.units = "degrees_north"
-    if 'edge_coordinates' in meshin_var.ncattrs():
-        edge_y[:] = edge_lat
+    if mesh.edge_lat is not None:
+        edge_y[:] = mesh.edge_lat
 
     face_node = ncmeshout.createVariable(f"{meshout_varname}_face_nodes", np.int32, (face_dim.name,vertex_dim.name))
     face_node.cf_role = "face_node_connectivity"
     face_node.long_name = "Maps every face to its corner nodes."
     face_node.start_index = np.int32(start_index)
-    face_node[:] = face_node_connectivity[:] - face_node_connectivity.start_index + start_index
+    write_connectivity(face_node, *mesh.face_node)
 
     edge_node = ncmeshout.createVariable(f"{meshout_varname}_edge_nodes", np.int32, (edge_dim.name,two_dim.name))
     edge_node.cf_role = "edge_node_connectivity"
     edge_node.long_name = "Maps every edge/link to two nodes that it connects."
     edge_node.start_index = np.int32(start_index)
-    edge_node[:] = edge_node_connectivity[:] - edge_node_connectivity.start_index + start_index
+    write_connectivity(edge_node, *mesh.edge_node)
 
     face_edge = ncmeshout.createVariable(f"{meshout_varname}_face_edges", np.int32, (face_dim.name,vertex_dim.name), fill_value=999999)
     face_edge.cf_role = "face_edge_connectivity"
     face_edge.long_name = "Maps every face to its edges."
     face_edge.start_index = np.int32(start_index)
-    face_edge[:] = face_edge_connectivity[:] - face_edge_connectivity.start_index + start_index
+    write_connectivity(face_edge, *mesh.face_edge)
 
-    if 'edge_face_connectivity' in meshin_var.ncattrs():
+    if mesh.edge_face is not None:
         edge_face = ncmeshout.createVariable(f"{meshout_varname}_edge_face_links", np.int32, (edge_dim.name,two_dim.name), fill_value=-999)
         edge_face.cf_role = "edge_face_connectivity"
         edge_face.long_name = "neighbor faces for edges"
         edge_face.start_index = np.int32(start_index)
         edge_face.comment = "missing neighbor faces are indicated using _FillValue"
-        edge_face[:] = edge_face_connectivity[:] - edge_face_connectivity.start_index + start_index
+        write_connectivity(edge_face, *mesh.edge_face)
 
     face_face = ncmeshout.createVariable(f"{meshout_varname}_face_links", np.int32, (face_dim.name,vertex_dim.name), fill_value=999999)
     face_face.cf_role = "face_face_connectivity"
@@ -250,16 +489,23 @@ def create_ncfile_unstructured(ncmeshout, meshin_file, meshin_varname, nlev, fun
     face_face.start_index = np.int32(start_index)
     face_face.flag_values = np.int32(-1) ;
     face_face.flag_meanings = "out_of_mesh" ;
-    face_face[:] = face_face_connectivity[:] - face_face_connectivity.start_index + start_index
+    write_connectivity(face_face, *mesh.face_face)
 
     if add_bounds:
+        # gather the node coordinates, as written, by the in-memory face nodes,
+        # leaving missing nodes masked
+        face_node_data, face_node_missing = mesh.face_node
+        corners = np.where(face_node_missing, 0, face_node_data - mesh.start_index)
+
         face_x.bounds = f"{face_x.name}_bounds"
         face_x_bnds = ncmeshout.createVariable(face_x.bounds, face_x.dtype, face_node.dimensions)
-        face_x_bnds[:] = node_x[face_node[:].flatten()].reshape(face_x_bnds.shape)
-        
+        node_x_vals = np.ma.asarray(mesh.node_lon).astype(node_x.dtype)
+        face_x_bnds[:] = np.ma.masked_where(face_node_missing, node_x_vals[corners])
+
         face_y.bounds = f"{face_y.name}_bounds"
         face_y_bnds = ncmeshout.createVariable(face_y.bounds, face_y.dtype, face_node.dimensions)
-        face_y_bnds[:] = node_y[face_node[:].flatten()].reshape(face_y_bnds.shape)
+        node_y_vals = np.ma.asarray(mesh.node_lat).astype(node_y.dtype)
+        face_y_bnds[:] = np.ma.masked_where(face_node_missing, node_y_vals[corners])
 
     if nlev > 0:
         levname = f'{dim_prefix}level{dim_suffix}'
@@ -270,23 +516,37 @@ def create_ncfile_unstructured(ncmeshout, meshin_file, meshin_varname, nlev, fun
         lev.standard_name = 'model_levels'
         lev[:] = np.arange(nlev) + 1
 
-        data = ncmeshout.createVariable(data_name, np.float64, (levname,face_dim.name))
-        data.long_name = "input data values"
-        data.mesh = meshout_varname
-        data.location = "face"
-        data.coordinates = f"{face_y.name} {face_x.name}"
-
-        data[:] = np.tile(func(face_lat, face_lon), (nlev,1,1))
-    else:
-        data = ncmeshout.createVariable(data_name, np.float64, (face_dim.name,))
+    dims = (levname,face_dim.name) if nlev > 0 else (face_dim.name,)
+    chunksizes = None
+    if ntime > 0:
+        time = create_time(ncmeshout)
+        # one time step and level per chunk, so that each step is appended without rewriting others
+        chunksizes = (1,)*len(dims) + (len(face_dim),)
+        dims = ('time',) + dims
+
+    def write_faces(data, data_lev, *record):
+        if nlev > 0:
+            for ilev in range(nlev):
+                data[record + (ilev, slice(None))] = data_lev
+        else:
+            data[record + (slice(None),)] = data_lev
+
+    datas = {}
+    for name, func in funcs.items():
+        data = ncmeshout.createVariable(name, np.float64, dims, chunksizes=chunksizes)
         data.long_name = "input data values"
         data.mesh = meshout_varname
         data.location = "face"
         data.coordinates = f"{face_y.name} {face_x.name}"
+        if ntime == 0:
+            write_faces(data, func(mesh.face_lat, mesh.face_lon))
+        datas[name] = data
 
-        data[:] = func(face_lat, face_lon)
-
-    ncmeshin.close()
+    # append time series one time step at a time
+    for itime in range(ntime):
+        time[itime] = itime*timestep
+        for name, func in funcs.items():
+            write_faces(datas[name], func(mesh.face_lat, mesh.face_lon, itime*timestep), itime)
 
 def getargs(argv=None):
 
@@ -300,14 +560,19 @@ def getargs(argv=None):
     parser.add_argument("-u","--ugrid_output", help="Name of UGRID output netCDF file", dest='ugrid_file_out')
     parser.add_argument("-m","--meshfile", help="Name of netCDF file containing UGRID mesh topology data, needed for UGRID data", dest='mesh_file')
     parser.add_argument("--meshvar", help="Variable name of mesh topology data in netCDF file, optional for UGRID data", dest='mesh_varname')
-    parser.add_argument("--func", help="Analytic function for data variable (default: %(default)s)", choices=funclist, dest='func_str')
+    parser.add_argument("--func", help="Analytic functions for data variables, each written as data variable name followed by _func when more than one is given (default: %(default)s)", choices=funclist, dest='func_str', nargs = '+')
     parser.add_argument("--nlat", help=f"Number of latitude points for regular grid, not needed for UGRID data (default: {defaults['nlat'][0]})", type = int, nargs = '+')
     parser.add_argument("--nlon", help=f"Number of longitude points for regular grid, not needed for UGRID data (default: {defaults['nlon'][0]})", type = int, nargs = '+')
     parser.add_argument("--nlev", help=f"Number of vertical levels for regular grid and UGRID data (default: {defaults['nlev']})", type = int)
+    parser.add_argument("--ntime", help=f"Number of time steps appended along an unlimited time dimension, 0 for data without time (default: {defaults['ntime']})", type = int)
+    parser.add_argument("--timestep", help=f"Time step in hours (default: {defaults['timestep']})", type = float)
     parser.add_argument("--dim_prefix", help=f"Prefix applied to dimension variable names in output file (default: {defaults['dim_prefix']})",  nargs = '+')
     parser.add_argument("--dim_suffix", help=f"Suffix applied to dimension variable names in output file (default: {defaults['dim_suffix']})",  nargs = '+')
     parser.add_argument("--data_name", help=f"Data variable names in output file (default: {defaults['data_name']})",  nargs = '+')
     parser.add_argument("--ugrid_data_name", help=f"Data variable name in UGRID output file (default: {defaults['ugrid_data_name']})")
+    parser.add_argument("--nlat_chunk", help="Number of latitude points generated and written at a time for regular grid, also used as the netCDF chunk size (default: whole grid)", type = int)
+    parser.add_argument("--workers", help=f"Number of processes used to generate regular grid data (default: {defaults['workers']})", type = int)
+    parser.add_argument("--backend", help="Evaluation backend for the analytic function (default: %(default)s)", choices=dataFunc.backends)
 
     parser.set_defaults(**defaults)
     args = parser.parse_args(argv)
@@ -319,6 +584,10 @@ def getargs(argv=None):
     nnlon = len(vars(args)['nlon'])
     if nnlat != nnlon:
         parser.error('Number of latitude and longitude points specified must be equal')
+    if vars(args)['workers'] < 1:
+        parser.error('Number of workers must be at least 1')
+    if vars(args)['ntime'] < 0:
+        parser.error('Number of time steps must not be negative')
 
     return args
 
@@ -331,52 +600,91 @@ def get_strval(name, index):
 
     return name_i
 
+def field_funcs(df, func_str, data_name, ntime=0):
+    """
+    Return a dict of data variable name to data function.
+
+        Parameters:
+            df: dataFunc providing the functions
+            func_str: Name of analytic function, or list of names
+            data_name: data variable name, suffixed by _func for each
+                       function when more than one function is named
+            ntime: Number of time steps, if more than 0 the functions
+                   are of latitude, longitude and time
+    """
+
+    get_func = df.get_time_func if ntime > 0 else df.get_func
+    if isinstance(func_str, str):
+        func_str = [func_str]
+    if len(func_str) == 1:
+        return {data_name: get_func(func_str[0])}
+    return {f'{data_name}_{fs}': get_func(fs) for fs in func_str}
+
 def run(file_out=defaults['file_out'], ugrid_file_out=defaults['ugrid_file_out'], 
         func_str=defaults['func_str'], mesh_file=defaults['mesh_file'], 
         mesh_varname=defaults['mesh_varname'], 
         nlat=defaults['nlat'], nlon=defaults['nlon'], nlev=defaults['nlev'],
+        ntime=defaults['ntime'], timestep=defaults['timestep'],
         dim_prefix=defaults['dim_prefix'], dim_suffix=defaults['dim_suffix'],
-        data_name=defaults['data_name'], ugrid_data_name=defaults['ugrid_data_name']):
+        data_name=defaults['data_name'], ugrid_data_name=defaults['ugrid_data_name'],
+        nlat_chunk=defaults['nlat_chunk'], workers=defaults['workers'],
+        backend=defaults['backend']):
     """
     Generate netCDF files with data on domains suitable for regridding
 
         Parameters:
             file_out: Name of regular lat/lon output netCDF file
             ugrid_file_out: Name of UGRID output netCDF file
-            func_str: Name of analytic function for data variable
+            func_str: Name of analytic function for data variable, or list of names
+                      to write one data variable per function, named data_name_func
             mesh_file: Name of netCDF file containing UGRID mesh topology data, needed for UGRID data
             mesh_varname: Variable name of mesh topology data in netCDF file, optional for UGRID data
             nlat: Number of latitude points for lat/lon data, not needed for UGRID data
             nlon: Number of longitude points for lat/lon data, not needed for UGRID data
             nlev: Number of vertical levels for lat/lon and UGRID data
+            ntime: Number of time steps for lat/lon and UGRID data, appended one at a
+                   time along an unlimited time dimension, 0 for data without time
+            timestep: Time step in hours
             dim_prefix: prefix for the latitude/longitude/level dimension name
             dim_suffix: suffix for the latitude/longitude/level dimension name
             data_name: data variable names for regular lat/lon file
             ugrid_data_name: data variable name for UGRID file
+            nlat_chunk: Number of latitude points generated and written at a time for
+                        lat/lon data, None to write the whole grid at once
+            workers: Number of processes used to generate lat/lon data, the output
+                     file is written by this process only
+            backend: Evaluation backend for the analytic function, see dataFunc
     """
 
-    df = dataFunc()
-    func = df.get_func(func_str)
+    df = dataFunc(backend)
 
     # Create regular lat/lon grid netCDF file
     if file_out is not None:
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
         ncfile = nc.Dataset(file_out, 'w', format='NETCDF4')
-        for index,(nlat0,nlon0) in enumerate(zip(nlat,nlon)):
-            dim_p = get_strval(dim_prefix, index)
-            dim_s = get_strval(dim_suffix, index)
-            data_n = get_strval(data_name, index)
-            create_ncfile(ncfile, nlat0, nlon0, nlev, func,
-                          dim_prefix=dim_p, dim_suffix=dim_s, data_name=data_n)
-        ncfile.close()
+        try:
+            for index,(nlat0,nlon0) in enumerate(zip(nlat,nlon)):
+                dim_p = get_strval(dim_prefix, index)
+                dim_s = get_strval(dim_suffix, index)
+                data_n = get_strval(data_name, index)
+                create_ncfile(ncfile, nlat0, nlon0, nlev, field_funcs(df, func_str, data_n, ntime),
+                              dim_prefix=dim_p, dim_suffix=dim_s,
+                              nlat_chunk=nlat_chunk, executor=executor, workers=workers,
+                              ntime=ntime, timestep=timestep)
+        finally:
+            ncfile.close()
+            if executor is not None:
+                executor.shutdown()
 
     # Create UGRID netCDF file
     if ugrid_file_out is not None:
         ncfile = nc.Dataset(ugrid_file_out, 'w', format='NETCDF4')
         dim_p = get_strval(dim_prefix, 0)
         dim_s = get_strval(dim_suffix, 0)
-        create_ncfile_unstructured(ncfile, mesh_file, mesh_varname, nlev, func,
-                                   add_bounds=True, dim_prefix=dim_p, dim_suffix=dim_s, 
-                                   data_name=ugrid_data_name)
+        create_ncfile_unstructured(ncfile, mesh_file, mesh_varname, nlev,
+                                   field_funcs(df, func_str, ugrid_data_name, ntime),
+                                   add_bounds=True, dim_prefix=dim_p, dim_suffix=dim_s,
+                                   ntime=ntime, timestep=timestep)
         ncfile.close()
 
 def main(argv=None):
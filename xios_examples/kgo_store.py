@@ -0,0 +1,217 @@
+"""
+Store of known good output (KGO) references compiled from CDL files.
+
+Each reference `.cdl` file is compiled once, with `ncgen -k nc4`, into a
+directory keyed by the hash of its contents, holding one `.npy` file per
+variable (and per variable mask, if any values are masked) and a
+`meta.json` of the dimensions, variables and attributes.  References are then
+loaded with the variables memory mapped, without running `ncgen` or reading
+netCDF again.
+
+The store is kept under TCD_CACHE_DIR if set, see nc_cache, where the least
+recently used references are evicted when it exceeds TCD_CACHE_MAX_MB, and
+otherwise in a temporary directory for the life of the test process.
+"""
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import netCDF4
+import numpy as np
+
+import xios_examples.nc_cache as nc_cache
+
+# change when the stored layout changes, to invalidate stored references
+format_version = '1'
+_session_dir = None
+
+
+def store_dir():
+    """
+    Return the directory holding compiled references.
+
+    """
+    global _session_dir
+    cdir = nc_cache.cache_dir('kgo')
+    if cdir is not None:
+        return cdir
+    if _session_dir is None:
+        _session_dir = Path(tempfile.mkdtemp(prefix='tcd_kgo_'))
+        atexit.register(shutil.rmtree, _session_dir, ignore_errors=True)
+    return _session_dir
+
+
+def cdl_key(cdl_path):
+    return nc_cache.make_key(format_version, nc_cache.file_hash(cdl_path))
+
+
+def jsonable(value):
+    """
+    Return a netCDF attribute value as a JSON serialisable value.
+
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def describe(dataset):
+    """
+    Return a dict of the dimensions, global attributes and variables (their
+    dimensions, shape, dtype and attributes) of an open netCDF4 Dataset.
+
+    """
+    meta = {'dimensions': {}, 'variables': {},
+            'attrs': {att: jsonable(dataset.getncattr(att)) for att in dataset.ncattrs()}}
+    for name, dim in dataset.dimensions.items():
+        meta['dimensions'][name] = {'size': len(dim), 'unlimited': dim.isunlimited()}
+    for name, var in dataset.variables.items():
+        meta['variables'][name] = {
+            'dimensions': list(var.dimensions), 'shape': list(var.shape),
+            'dtype': str(var.dtype),
+            'attrs': {att: jsonable(var.getncattr(att)) for att in var.ncattrs()}}
+    return meta
+
+
+def compile_cdl(cdl_path, dest):
+    """
+    Compile cdl_path into the reference directory dest.
+
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=dest.parent, prefix='.tmp'))
+    try:
+        nc_file = tmp / 'kgo.nc'
+        subprocess.run(['ncgen', '-k', 'nc4', '-o', str(nc_file), str(cdl_path)], check=True)
+        with netCDF4.Dataset(nc_file, 'r') as dataset:
+            meta = describe(dataset)
+            meta['cdl'] = str(cdl_path)
+            for ivar, (name, var) in enumerate(dataset.variables.items()):
+                entry = meta['variables'][name]
+                entry.update({'file': None, 'mask': None})
+                data = var[...]
+                # string variables are described but not stored
+                if np.asarray(data).dtype.kind in 'biufc':
+                    entry['file'] = f'{ivar}.npy'
+                    np.save(tmp / entry['file'], np.ma.getdata(data))
+                    if np.ma.is_masked(data):
+                        entry['mask'] = f'{ivar}.mask.npy'
+                        np.save(tmp / entry['mask'], np.ma.getmaskarray(data))
+        nc_file.unlink()
+        with open(tmp / 'meta.json', 'w') as fout:
+            json.dump(meta, fout, indent=1)
+        try:
+            os.rename(tmp, dest)
+        except OSError:
+            # compiled concurrently by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    evict(dest.parent)
+
+
+def evict(kgo_dir):
+    """
+    Remove least recently used references in kgo_dir until they fit in
+    nc_cache.max_bytes.
+
+    """
+    entries = []
+    # references being compiled are hidden .tmp directories
+    for kd in Path(kgo_dir).glob('[!.]*'):
+        try:
+            size = sum(f.stat().st_size for f in kd.iterdir())
+            entries.append((kd.stat().st_mtime, size, kd))
+        except FileNotFoundError:
+            continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, kd in sorted(entries):
+        if total <= nc_cache.max_bytes():
+            break
+        shutil.rmtree(kd, ignore_errors=True)
+        total -= size
+
+
+class KgoVariable:
+    """
+    A variable of a compiled reference, indexed like a netCDF4 Variable.
+
+    """
+
+    def __init__(self, name, entry, path):
+        self.name = name
+        self.dimensions = tuple(entry['dimensions'])
+        self.shape = tuple(entry['shape'])
+        self.dtype = entry['dtype']
+        self.attrs = entry['attrs']
+        mmap_mode = 'r' if np.prod(self.shape, dtype=int) > 0 else None
+        self._data = None
+        self._mask = None
+        if entry['file'] is not None:
+            self._data = np.load(path / entry['file'], mmap_mode=mmap_mode)
+        if entry['mask'] is not None:
+            self._mask = np.load(path / entry['mask'], mmap_mode=mmap_mode)
+
+    @property
+    def stored(self):
+        """
+        True if the values of the variable are stored, i.e. it is numeric.
+
+        """
+        return self._data is not None
+
+    def __getitem__(self, index):
+        if self._data is None:
+            raise TypeError(f'values of {self.dtype} variable {self.name} are not stored')
+        data = np.array(self._data[index])
+        if self._mask is not None:
+            return np.ma.masked_array(data, mask=np.array(self._mask[index]))
+        return data
+
+    def ncattrs(self):
+        return list(self.attrs)
+
+
+class Kgo:
+    """
+    A compiled reference, with variables accessed by name like a netCDF4 Dataset.
+
+    """
+
+    def __init__(self, path):
+        with open(path / 'meta.json') as fin:
+            meta = json.load(fin)
+        self.path = path
+        self.meta = meta
+        self.cdl = meta['cdl']
+        self.dimensions = meta['dimensions']
+        self.attrs = meta['attrs']
+        self.variables = {name: KgoVariable(name, entry, path)
+                          for name, entry in meta['variables'].items()}
+
+    def __getitem__(self, name):
+        return self.variables[name]
+
+
+def load(cdl_path):
+    """
+    Return the reference for cdl_path, compiling it if not yet stored.
+
+    """
+    cdl_path = Path(cdl_path)
+    dest = store_dir() / cdl_key(cdl_path)
+    if (dest / 'meta.json').exists():
+        # mark as recently used, for eviction
+        os.utime(dest)
+    else:
+        compile_cdl(cdl_path, dest)
+    return Kgo(dest)
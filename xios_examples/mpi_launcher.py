@@ -0,0 +1,163 @@
+"""
+MPI launchers for XIOS client/server runs.
+
+A launcher builds the MPMD command line which starts `nclients` ranks of an
+example programme and `nservers` ranks of the XIOS server, for a given MPI
+implementation, with an optional process binding/mapping profile.
+
+The launcher used by the tests is chosen from environment variables:
+    MPI_LAUNCHER: mpiexec, openmpi, mpich or slurm; by default slurm when
+                  PLATFORM is Archer2, else MPI_FLAVOUR if it names a launcher,
+                  else a plain mpiexec
+    MPI_BINDING: binding profile, one of core, socket, numa or none
+    MPIEXEC: the launcher programme, e.g. a local stand-in for mpiexec
+    XIOS_CLIENTS_PER_SERVER: if set, the number of servers is derived from
+                             the number of clients using this ratio
+"""
+import math
+import os
+import subprocess
+
+xios_server = './xios_server.exe'
+
+
+class Launcher:
+    """
+    Generic `mpiexec` launcher, without binding or mapping options.
+
+    """
+    program = 'mpiexec'
+    binding_profiles = {None: []}
+
+    def __init__(self, binding=None, clients_per_server=None, program=None):
+        if binding not in self.binding_profiles:
+            raise ValueError(f'Binding profile {binding} is not supported by '
+                             f'{type(self).__name__}, expected one of '
+                             f'{[b for b in self.binding_profiles if b is not None]}')
+        self.binding = binding
+        self.clients_per_server = clients_per_server
+        if program is not None:
+            self.program = program
+
+    def ranks(self, nclients, nservers):
+        """
+        Return the number of client and server ranks to run,
+        applying the client/server ratio if set.
+
+        """
+        if self.clients_per_server:
+            nservers = max(1, math.ceil(nclients / self.clients_per_server))
+        return nclients, nservers
+
+    def options(self):
+        """
+        Return the launcher options applying to all ranks.
+
+        """
+        return list(self.binding_profiles[self.binding])
+
+    def command(self, executable, nclients=1, nservers=1):
+        """
+        Return the command line to run executable on nclients ranks
+        and the XIOS server on nservers ranks.
+
+        """
+        nclients, nservers = self.ranks(nclients, nservers)
+        return ([self.program] + self.options() +
+                ['-n', str(nclients), executable, ':',
+                 '-n', str(nservers), xios_server])
+
+    def run(self, executable, nclients=1, nservers=1, cwd=None):
+        run_cmd = self.command(executable, nclients, nservers)
+        print(' '.join(run_cmd), flush=True)
+        return subprocess.run(run_cmd, cwd=cwd, check=True)
+
+
+class OpenMPILauncher(Launcher):
+    """
+    Open MPI `mpiexec`, counting hardware threads as cpus,
+    as needed on the github ubuntu runner.
+
+    """
+    binding_profiles = {None: [],
+                        'none': ['--bind-to', 'none'],
+                        'core': ['--map-by', 'core', '--bind-to', 'core'],
+                        'socket': ['--map-by', 'socket', '--bind-to', 'socket'],
+                        'numa': ['--map-by', 'numa', '--bind-to', 'numa']}
+
+    def options(self):
+        return ['--use-hwthread-cpus'] + super().options()
+
+
+class MPICHLauncher(Launcher):
+    """
+    MPICH (hydra) `mpiexec`.
+
+    """
+    binding_profiles = {None: [],
+                        'none': ['-bind-to', 'none'],
+                        'core': ['-map-by', 'core', '-bind-to', 'core'],
+                        'socket': ['-map-by', 'socket', '-bind-to', 'socket'],
+                        'numa': ['-map-by', 'numa', '-bind-to', 'numa']}
+
+
+class SlurmLauncher(Launcher):
+    """
+    Slurm `srun`, running clients and servers as heterogeneous job groups
+    on separate nodes, as used on Archer2.
+
+    """
+    program = 'srun'
+    binding_profiles = {None: [],
+                        'none': ['--cpu-bind=none'],
+                        'core': ['--cpu-bind=cores'],
+                        'socket': ['--cpu-bind=sockets'],
+                        'numa': ['--cpu-bind=ldoms']}
+
+    def options(self):
+        return ['--distribution=block:block', '--hint=nomultithread'] + super().options()
+
+    def command(self, executable, nclients=1, nservers=1):
+        """
+        Return the srun command line, with the distribution and binding options
+        given for each het-group, as srun applies options only to the group they
+        are given in.
+
+        """
+        nclients, nservers = self.ranks(nclients, nservers)
+        return ([self.program] +
+                self.options() + ['--het-group=0', '--nodes=1', '-n', str(nclients), executable, ':'] +
+                self.options() + ['--het-group=1', '--nodes=1', '-n', str(nservers), xios_server])
+
+
+launchers = {'mpiexec': Launcher,
+             'openmpi': OpenMPILauncher,
+             'mpich': MPICHLauncher,
+             'slurm': SlurmLauncher}
+
+
+def get_launcher(name=None, binding=None, clients_per_server=None, program=None):
+    """
+    Return a launcher, with settings not given taken from the environment.
+
+    """
+    if name is None:
+        name = os.environ.get('MPI_LAUNCHER')
+    if name is None:
+        if os.environ.get('PLATFORM', '') == 'Archer2':
+            name = 'slurm'
+        elif os.environ.get('MPI_FLAVOUR', '') in launchers:
+            name = os.environ['MPI_FLAVOUR']
+        else:
+            name = 'mpiexec'
+    if name not in launchers:
+        raise ValueError(f'Unknown MPI launcher {name}, expected one of {list(launchers)}')
+    if binding is None:
+        binding = os.environ.get('MPI_BINDING') or None
+    if clients_per_server is None and os.environ.get('XIOS_CLIENTS_PER_SERVER'):
+        clients_per_server = int(os.environ['XIOS_CLIENTS_PER_SERVER'])
+    if program is None:
+        program = os.environ.get('MPIEXEC') or None
+
+    return launchers[name](binding=binding, clients_per_server=clients_per_server,
+                           program=program)
@@ -0,0 +1,202 @@
+"""
+Content addressed, on-disk cache of generated netCDF input files.
+
+Files made by `ncgen` from a `.cdl` file, or by `gen_netcdf.run`, are stored
+under a key hashed from their inputs and hard linked (or copied) into place
+when the same inputs are requested again.
+
+The cache is enabled by setting the environment variable TCD_CACHE_DIR to a
+writable directory. TCD_CACHE_MAX_MB limits its size (default 2048), the
+least recently used files are evicted first.
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import xios_examples.gen_netcdf as gn
+
+this_path = os.path.realpath(__file__)
+this_dir = os.path.dirname(this_path)
+
+# source files which determine the output of gen_netcdf.run
+gen_code_files = ['gen_netcdf.py', 'dataFunc.py']
+
+
+def cache_dir(kind):
+    """
+    Return the cache directory for `kind` of files, or None if caching is disabled.
+
+    """
+    root = os.environ.get('TCD_CACHE_DIR')
+    if not root:
+        return None
+    path = Path(root) / kind
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def max_bytes():
+    return int(os.environ.get('TCD_CACHE_MAX_MB', 2048)) * 1024**2
+
+
+def file_hash(filename):
+    """
+    Return the sha256 hex digest of the contents of a file.
+
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as fin:
+        for block in iter(lambda: fin.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """
+    Return a cache key from strings or bytes.
+
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dest):
+    """
+    Hard link src to dest, copying if a link is not possible,
+    e.g. across file systems.
+
+    """
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def unlink_outputs(dest_files):
+    """
+    Remove existing output files before they are regenerated, as they may be
+    hard links to cached files which must not be truncated in place.
+
+    """
+    for dest in dest_files:
+        if os.path.lexists(dest):
+            os.remove(dest)
+
+
+def fetch(kind, key, dest_files):
+    """
+    Place the cached files for key at dest_files,
+    returning False if any of them are not in the cache.
+
+    """
+    cdir = cache_dir(kind)
+    if cdir is None:
+        return False
+    cached = [cdir / f'{key}.{i}.nc' for i in range(len(dest_files))]
+    if not all(cf.exists() for cf in cached):
+        return False
+    for cf, dest in zip(cached, dest_files):
+        link_or_copy(cf, dest)
+        # mark as recently used, for eviction
+        os.utime(cf)
+    return True
+
+
+def store(kind, key, src_files):
+    """
+    Copy src_files into the cache under key, then evict old files.
+
+    """
+    cdir = cache_dir(kind)
+    if cdir is None:
+        return
+    for i, src in enumerate(src_files):
+        # write then rename, so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=cdir, suffix='.tmp')
+        os.close(fd)
+        shutil.copy2(src, tmp)
+        os.replace(tmp, cdir / f'{key}.{i}.nc')
+    evict()
+
+
+def evict():
+    """
+    Remove least recently used files until the cached netCDF files fit in
+    max_bytes.
+
+    """
+    root = os.environ.get('TCD_CACHE_DIR')
+    if not root:
+        return
+    entries = []
+    for cf in Path(root).glob('*/*.nc'):
+        try:
+            stat = cf.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, cf))
+    total = sum(size for _, size, _ in entries)
+    for _, size, cf in sorted(entries):
+        if total <= max_bytes():
+            break
+        cf.unlink(missing_ok=True)
+        total -= size
+
+
+def ncgen(cdl_file, nc_file, cwd):
+    """
+    Create nc_file from cdl_file with `ncgen -k nc4`, using the cache if enabled.
+
+    """
+    cdl_path = Path(cwd) / cdl_file
+    nc_path = Path(cwd) / nc_file
+    args = ['ncgen', '-k', 'nc4']
+    key = None
+    if cache_dir('ncgen') is not None:
+        key = make_key(' '.join(args), file_hash(cdl_path))
+        if fetch('ncgen', key, [nc_path]):
+            return
+        unlink_outputs([nc_path])
+    subprocess.run(args + ['-o', nc_file, cdl_file], cwd=cwd, check=True)
+    if key is not None:
+        store('ncgen', key, [nc_path])
+
+
+def gen_netcdf_run(**kwargs):
+    """
+    Call gen_netcdf.run with kwargs, using the cache if enabled.
+
+    The key covers all arguments except the output file names, the contents
+    of any mesh file and the gen_netcdf source code.
+    """
+    outputs = [kwargs[name] for name in ('file_out', 'ugrid_file_out')
+               if kwargs.get(name) is not None]
+    key = None
+    if cache_dir('gen_netcdf') is not None:
+        key_args = {name: value for name, value in kwargs.items()
+                    if name not in ('file_out', 'ugrid_file_out')}
+        key_args['outputs'] = [kwargs.get(name) is not None
+                               for name in ('file_out', 'ugrid_file_out')]
+        if key_args.get('mesh_file') is not None:
+            key_args['mesh_file'] = file_hash(key_args['mesh_file'])
+        # workers does not change the output
+        key_args.pop('workers', None)
+        code = [file_hash(os.path.join(this_dir, cf)) for cf in gen_code_files]
+        key = make_key(json.dumps(key_args, sort_keys=True, default=str), *code)
+        if fetch('gen_netcdf', key, outputs):
+            return
+        unlink_outputs(outputs)
+    gn.run(**kwargs)
+    if key is not None:
+        store('gen_netcdf', key, outputs)
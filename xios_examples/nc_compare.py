@@ -0,0 +1,402 @@
+"""
+Compare variables of a result netCDF file with a reference (KGO) file.
+
+Each file is opened once, and each variable is read and compared in chunks
+along its first (typically time) dimension, so large outputs are never held
+in memory whole.  The comparison of a variable stops at the first chunk out
+of tolerance; the report gives the maximum absolute and relative errors
+found up to that point.
+
+References may be netCDF files, or CDL files loaded from the KGO store,
+see kgo_store.  The structure of a file, its dimensions, variables, dtypes
+and attributes, may also be compared with a reference, without rendering
+any data as text.  A set of files, such as the outputs of a time-split run, is
+verified on a process pool.
+
+Arrays may also be checked within tolerance in full, with a summary of the
+worst points and error statistics built only when the check fails, see
+check_close.
+"""
+import concurrent.futures
+import heapq
+import math
+import os
+
+import netCDF4
+import numpy as np
+
+import xios_examples.kgo_store as kgo_store
+
+# number of array elements read per chunk, 32 MiB of float64
+chunk_elements = 2 ** 22
+# attributes set by XIOS which differ on every run
+ignored_attrs = ('timeStamp', 'uuid')
+
+
+def chunk_slices(shape, max_elements=None):
+    """
+    Yield index tuples covering an array of shape, in blocks along the first
+    dimension of at most max_elements elements (at least one row).
+
+    """
+    if max_elements is None:
+        max_elements = chunk_elements
+    if len(shape) == 0:
+        yield ()
+        return
+    row = math.prod(shape[1:])
+    block = max(1, max_elements // row) if row else shape[0] or 1
+    for start in range(0, shape[0], block):
+        yield (slice(start, min(start + block, shape[0])),)
+
+
+def compare_variable(result, expected, rtol=1e-05, atol=1e-08, exact=False,
+                     max_elements=None):
+    """
+    Compare netCDF variables result and expected, chunk by chunk.
+
+    Values compare as by numpy.allclose(result, expected, rtol, atol), or
+    numpy.array_equal if exact; masked values are not compared.
+    Returns a report dict with keys 'name', 'ok', 'max_abs', 'max_rel',
+    'checked' (the number of values compared) and 'failed_at', the index
+    of the first chunk out of tolerance, or None.
+    """
+    report = {'name': result.name, 'ok': True, 'max_abs': 0.0, 'max_rel': 0.0,
+              'checked': 0, 'failed_at': None}
+    if result.shape != expected.shape:
+        report.update({'ok': False, 'failed_at': (),
+                       'error': f'shape {result.shape} differs from expected {expected.shape}'})
+        return report
+
+    for index in chunk_slices(result.shape, max_elements):
+        res = np.ma.asarray(result[index])
+        exp = np.ma.asarray(expected[index])
+        # values masked in either are not compared
+        masked = np.ma.getmaskarray(res) | np.ma.getmaskarray(exp)
+        res_data = np.ma.getdata(res)
+        exp_data = np.ma.getdata(exp)
+        if exact:
+            passed = (res_data == exp_data) | masked
+        else:
+            passed = np.isclose(res_data, exp_data, rtol=rtol, atol=atol) | masked
+        if res.dtype.kind in 'fiuc':
+            abs_err = np.where(masked, 0.0, np.abs(res_data.astype(np.float64) -
+                                                   exp_data.astype(np.float64)))
+            denom = np.where(masked, 0.0, np.abs(exp_data.astype(np.float64)))
+            rel_err = np.divide(abs_err, denom, out=np.zeros_like(abs_err), where=denom > 0)
+            if abs_err.size:
+                report['max_abs'] = max(report['max_abs'], float(np.nanmax(abs_err)))
+                report['max_rel'] = max(report['max_rel'], float(np.nanmax(rel_err)))
+        report['checked'] += np.size(passed)
+        if not np.all(passed):
+            report['ok'] = False
+            report['failed_at'] = index
+            break
+    return report
+
+
+def block_values(block, fill_value):
+    """
+    Return the data and mask of a block of values, masking fill_value.
+
+    """
+    block = np.ma.asarray(block)
+    data = np.ma.getdata(block)
+    mask = np.ma.getmaskarray(block)
+    if fill_value is not None:
+        mask = mask | (data == fill_value)
+    return data, mask
+
+
+def check_close(result, expected, rtol=1e-05, atol=1e-08, fill_value=None,
+                worst=10, max_elements=None):
+    """
+    Check all values of result are close to expected, as by numpy.allclose,
+    reading numpy or netCDF4 arrays in blocks along the first dimension.
+
+    Values which are masked, or equal to fill_value, in either array are not
+    compared; points masked in only one of the arrays are counted in the
+    report.  Unmasked NaN values fail.  Statistics are accumulated per block, and the worst points kept
+    only from blocks out of tolerance.
+
+    Returns (passed, report), where report is a summary of the error
+    statistics and the worst points if the check failed, else ''.
+    """
+    if not hasattr(result, 'shape'):
+        result = np.ma.asanyarray(result)
+    if not hasattr(expected, 'shape'):
+        expected = np.ma.asanyarray(expected)
+    shape = np.shape(result)
+    if shape != np.shape(expected):
+        # broadcast, as numpy.allclose, reading both in full
+        try:
+            result, expected = np.broadcast_arrays(np.ma.asanyarray(result[...]),
+                                                   np.ma.asanyarray(expected[...]))
+        except ValueError:
+            return False, (f'result shape {np.shape(result)} does not match '
+                           f'expected shape {np.shape(expected)}')
+        shape = result.shape
+    stats = {'compared': 0, 'failed': 0, 'masked_result_only': 0,
+             'masked_expected_only': 0, 'max_abs': 0.0, 'max_rel': 0.0, 'sum_abs': 0.0}
+    # heap of (excess over tolerance, flat index, result, expected)
+    worst_points = []
+    offset = 0
+    for index in chunk_slices(shape, max_elements):
+        res, res_mask = block_values(result[index], fill_value)
+        exp, exp_mask = block_values(expected[index], fill_value)
+        res = res.astype(np.float64, copy=False)
+        exp = exp.astype(np.float64, copy=False)
+        masked = res_mask | exp_mask
+        stats['masked_result_only'] += int(np.count_nonzero(res_mask & ~exp_mask))
+        stats['masked_expected_only'] += int(np.count_nonzero(exp_mask & ~res_mask))
+        abs_err = np.where(masked, 0.0, np.abs(res - exp))
+        tolerance = atol + rtol * np.abs(exp)
+        failed = ~(abs_err <= tolerance) & ~masked
+        # NaN fails, and is ranked worst, but is left out of the statistics
+        nan = np.isnan(abs_err)
+        abs_err[nan] = 0.0
+        denom = np.where(masked, 0.0, np.abs(exp))
+        rel_err = np.divide(abs_err, denom, out=np.zeros_like(abs_err), where=denom > 0)
+        stats['compared'] += int(np.size(masked) - np.count_nonzero(masked))
+        if np.size(abs_err):
+            stats['max_abs'] = max(stats['max_abs'], float(abs_err.max()))
+            stats['max_rel'] = max(stats['max_rel'], float(rel_err.max()))
+            stats['sum_abs'] += float(abs_err.sum())
+        nfailed = int(np.count_nonzero(failed))
+        if nfailed:
+            stats['failed'] += nfailed
+            excess = np.where(failed, abs_err - tolerance, -np.inf)
+            excess = np.where(nan, np.inf, excess).ravel()
+            top = np.argpartition(excess, -min(worst, nfailed))[-min(worst, nfailed):]
+            for flat in top:
+                item = (float(excess[flat]), offset + int(flat),
+                        float(res.flat[flat]), float(exp.flat[flat]))
+                if len(worst_points) < worst:
+                    heapq.heappush(worst_points, item)
+                else:
+                    heapq.heappushpop(worst_points, item)
+        offset += int(np.size(masked))
+
+    if not stats['failed']:
+        return True, ''
+    lines = [f"{stats['failed']} of {stats['compared']} values differ by more than "
+             f"rtol={rtol:g}, atol={atol:g}",
+             f"max abs error {stats['max_abs']:.6g}, max rel error {stats['max_rel']:.6g}, "
+             f"mean abs error {stats['sum_abs'] / max(stats['compared'], 1):.6g}"]
+    if stats['masked_result_only'] or stats['masked_expected_only']:
+        lines.append(f"{stats['masked_result_only']} values masked in the result only, "
+                     f"{stats['masked_expected_only']} in the expected only")
+    lines.append(f'worst {len(worst_points)} points:')
+    for _, flat, res, exp in sorted(worst_points, reverse=True):
+        point = np.unravel_index(flat, shape) if shape else ()
+        lines.append(f'  {tuple(int(i) for i in point)}: result {res:.8g}, expected {exp:.8g}, '
+                     f'diff {res - exp:.6g}')
+    return False, '\n'.join(lines)
+
+
+def compare_datasets(result, expected, variables, rtol=1e-05, atol=1e-08,
+                     exact=(), max_elements=None):
+    """
+    Compare the named variables of open datasets result and expected,
+    those named in exact for equality, the others within tolerance.
+
+    Returns a list of report dicts, one per variable, see compare_variable.
+    """
+    reports = []
+    for name in variables:
+        if name not in result.variables or name not in expected.variables:
+            where = 'result' if name not in result.variables else 'reference'
+            reports.append({'name': name, 'ok': False, 'max_abs': None,
+                            'max_rel': None, 'checked': 0, 'failed_at': None,
+                            'error': f'variable missing from {where}'})
+            continue
+        reports.append(compare_variable(result[name], expected[name], rtol=rtol,
+                                        atol=atol, exact=name in exact,
+                                        max_elements=max_elements))
+    return reports
+
+
+def compare_files(result_path, expected_path, variables, **kwargs):
+    """
+    Compare the named variables of the result and expected netCDF files,
+    see compare_datasets.
+
+    """
+    with netCDF4.Dataset(result_path, 'r') as result, \
+            netCDF4.Dataset(expected_path, 'r') as expected:
+        return compare_datasets(result, expected, variables, **kwargs)
+
+
+def compare_kgo(result_path, cdl_path, variables, **kwargs):
+    """
+    Compare the named variables of the result netCDF file with the reference
+    compiled from cdl_path in the KGO store, see compare_datasets.
+
+    """
+    expected = kgo_store.load(cdl_path)
+    with netCDF4.Dataset(result_path, 'r') as result:
+        return compare_datasets(result, expected, variables, **kwargs)
+
+
+def format_report(reports):
+    """
+    Return a readable summary of comparison reports, one line per variable.
+
+    """
+    lines = []
+    for report in reports:
+        status = 'ok' if report['ok'] else 'FAILED'
+        if 'error' in report:
+            lines.append(f"{report['name']}: {status}, {report['error']}")
+            continue
+        line = (f"{report['name']}: {status}, max abs error {report['max_abs']:.6g}, "
+                f"max rel error {report['max_rel']:.6g}, {report['checked']} values compared")
+        if report['failed_at'] is not None:
+            first = report['failed_at'][0] if report['failed_at'] else None
+            if isinstance(first, slice):
+                line += f', out of tolerance in records {first.start}:{first.stop}'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def attribute_differences(where, actual, expected, ignore_attrs=ignored_attrs):
+    """
+    Return a list of differences between the actual and expected dicts of
+    attributes of where, a variable name or 'global', skipping ignore_attrs.
+
+    """
+    differences = []
+    for att in sorted(set(actual) | set(expected)):
+        if att in ignore_attrs:
+            continue
+        if att not in actual:
+            differences.append(f'{where} attribute {att} is missing')
+        elif att not in expected:
+            differences.append(f'{where} attribute {att} is not expected')
+        elif actual[att] != expected[att]:
+            differences.append(f'{where} attribute {att}: {actual[att]!r} '
+                               f'differs from expected {expected[att]!r}')
+    return differences
+
+
+def structure_differences(actual, expected, ignore_attrs=ignored_attrs):
+    """
+    Return a list of differences between the actual and expected descriptions
+    of files, as given by kgo_store.describe.
+
+    """
+    differences = []
+    for name in sorted(set(actual['dimensions']) | set(expected['dimensions'])):
+        if name not in actual['dimensions']:
+            differences.append(f'dimension {name} is missing')
+        elif name not in expected['dimensions']:
+            differences.append(f'dimension {name} is not expected')
+        elif actual['dimensions'][name] != expected['dimensions'][name]:
+            differences.append(f'dimension {name}: {actual["dimensions"][name]} '
+                               f'differs from expected {expected["dimensions"][name]}')
+    differences += attribute_differences('global', actual['attrs'], expected['attrs'],
+                                         ignore_attrs)
+    for name in sorted(set(actual['variables']) | set(expected['variables'])):
+        if name not in actual['variables']:
+            differences.append(f'variable {name} is missing')
+            continue
+        if name not in expected['variables']:
+            differences.append(f'variable {name} is not expected')
+            continue
+        act = actual['variables'][name]
+        exp = expected['variables'][name]
+        for key in ('dimensions', 'shape', 'dtype'):
+            if act[key] != exp[key]:
+                differences.append(f'variable {name} {key}: {act[key]} '
+                                   f'differs from expected {exp[key]}')
+        differences += attribute_differences(name, act['attrs'], exp['attrs'], ignore_attrs)
+    return differences
+
+
+def compare_structure(result_path, cdl_path, ignore_attrs=ignored_attrs, rtol=1e-05,
+                      atol=1e-08, max_elements=None, exact=False):
+    """
+    Compare the dimensions, variables, dtypes and attributes of the result
+    netCDF file with the reference compiled from cdl_path, then the values of
+    numeric variables present in both, chunk by chunk, within tolerance, or
+    for equality if exact.
+
+    Returns a list of differences, as readable lines, empty if the files match.
+    """
+    expected = kgo_store.load(cdl_path)
+    with netCDF4.Dataset(result_path, 'r') as result:
+        differences = structure_differences(kgo_store.describe(result), expected.meta,
+                                            ignore_attrs)
+        names = [name for name, var in expected.variables.items()
+                 if var.stored and name in result.variables]
+        reports = compare_datasets(result, expected, names, rtol=rtol, atol=atol,
+                                   exact=names if exact else (), max_elements=max_elements)
+    differences += ['values of ' + format_report([report])
+                    for report in reports if not report['ok']]
+    return differences
+
+
+def verify_file(cdl_dir, cdl_file, result_path, variables, rtol=1e-05,
+                atol=1e-08, exact=()):
+    """
+    Compare variables of result_path against the reference for cdl_file in
+    cdl_dir, see compare_kgo.
+
+    Returns a dict of the result and reference paths and the list of reports.
+    """
+    cdl_path = os.path.join(cdl_dir, cdl_file)
+    return {'result': result_path, 'kgo': cdl_path,
+            'reports': compare_kgo(result_path, cdl_path, variables, rtol=rtol,
+                                   atol=atol, exact=exact)}
+
+
+def verify_files(jobs, workers=None):
+    """
+    Run verify_file for each job, a dict of its keyword arguments, on a
+    pool of workers processes, by default one per job up to the cpu count.
+
+    Returns the verify_file results in the order of jobs; a job which raised
+    gives its result path and the 'error'.
+    """
+    if workers is None:
+        workers = min(len(jobs), os.cpu_count() or 1)
+    # set up the store before the workers start, so that they share it
+    kgo_store.store_dir()
+    if workers <= 1:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    with executor:
+        futures = [executor.submit(verify_file, **job) for job in jobs]
+    results = []
+    for job, future in zip(jobs, futures):
+        try:
+            results.append(future.result())
+        except Exception as err:
+            results.append({'result': job['result_path'],
+                            'kgo': os.path.join(job['cdl_dir'], job['cdl_file']),
+                            'reports': [], 'error': f'{type(err).__name__}: {err}'})
+    return results
+
+
+def results_ok(results):
+    """
+    Return True if every file of verify_files results compared within tolerance.
+
+    """
+    return all('error' not in result and all(report['ok'] for report in result['reports'])
+               for result in results)
+
+
+def format_results(results):
+    """
+    Return a readable summary of verify_files results, per file.
+
+    """
+    lines = []
+    for result in results:
+        lines.append(f"{result['result']} against {result['kgo']}:")
+        if 'error' in result:
+            lines.append(f"  {result['error']}")
+        lines.extend('  ' + line for line in format_report(result['reports']).splitlines())
+    return '\n'.join(lines)
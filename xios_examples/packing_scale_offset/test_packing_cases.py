@@ -6,6 +6,7 @@ import os
 import subprocess
 import unittest
 
+import xios_examples.nc_compare as nc_compare
 import xios_examples.shared_testing as xshared
 
 this_path = os.path.realpath(__file__)
@@ -32,32 +33,29 @@ class TestPackDomain(xshared._TestCase):
         def test_pack(self):
             # create a netCDF file from the `.cdl` input
             subprocess.run(['ncgen', '-k', 'nc4', '-o', inputfile,
-                            infile], cwd=cls.test_dir, check=True)
-            cls.run_mpi_xios()
+                            infile], cwd=self.run_dir, check=True)
+            cls.run_mpi_xios(run_dir=self.run_dir)
 
             # load the result netCDF file
-            runfile = '{}/{}'.format(cls.test_dir, outputfile)
+            runfile = '{}/{}'.format(self.run_dir, outputfile)
             assert(os.path.exists(runfile))
-            rootgrp = netCDF4.Dataset(runfile, 'r')
-            # read data from the packed, expected & diff variables
-            expected = rootgrp['original_data'][:]
-            result = rootgrp['packed_data'][:]
-            rtol = rootgrp['packed_data'].scale_factor
-            # prepare message for failure
-            msg = ('\n the packed data array\n {res}\n '
-                   'differs from the original data array\n {exp} \n '
-                   'with diff outside expected tolerance {rtol}\n {diff}\n')
-            msg = msg.format(exp=expected, res=result, rtol=rtol,
-                             diff=result-expected)
-            if not np.allclose(result, expected, rtol=rtol):
-                # print message for fail case,
-                # as expected failures do not report msg.
-                print(msg)
-            # assert that all of the `diff` varaible values are zero
-            # self.assertTrue(not np.any(diff), msg=msg)
-            self.assertTrue(np.allclose(result, expected, rtol=rtol) and
-                            not np.allclose(result, expected, rtol=0.1*rtol),
-                            msg=msg)
+            with netCDF4.Dataset(runfile, 'r') as rootgrp:
+                # compare the packed & expected variables
+                expected = rootgrp['original_data']
+                result = rootgrp['packed_data']
+                rtol = result.scale_factor
+                msg = ('\n the packed data array differs from the original data array '
+                       'with diff outside expected tolerance {rtol}\n'.format(rtol=rtol))
+                self.assert_close(result, expected, rtol=rtol, msg=msg)
+                # packing should lose precision, i.e. not be within 0.1*rtol
+                passed, _ = nc_compare.check_close(result, expected, rtol=0.1*rtol)
+                msg = ('\n the packed data array matches the original data array '
+                       'within 0.1 * tolerance {rtol}\n'.format(rtol=rtol))
+                if passed:
+                    # print message for fail case,
+                    # as expected failures do not report msg.
+                    print(msg)
+                self.assertFalse(passed, msg=msg)
         return test_pack
 
 
@@ -0,0 +1,190 @@
+"""
+Run the xios_examples test classes concurrently, packing them onto the available cores.
+
+Each test directory is run as one job, a `python -m unittest` subprocess for
+the test classes in that directory, as classes sharing a directory also share
+its build and files.  A job needs as many cores as the largest number of MPI
+ranks (the `nclients` + `nservers` of the class, as run by the launcher, see
+mpi_launcher) of its classes; jobs are started largest first whenever enough
+cores are free.
+
+With --sandbox, each test function is run as its own job, in its own scratch
+directory (see TCD_SANDBOX in shared_testing), after building each test
+directory once, so the test functions of a directory also run concurrently.
+
+usage: python -m xios_examples.parallel_runner [-j CORES] [-s START_DIR] [-k SUBSTRING] [--sandbox]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import xios_examples.build_cache as build_cache
+import xios_examples.mpi_launcher as mpi_launcher
+
+this_path = os.path.realpath(__file__)
+this_dir = os.path.dirname(this_path)
+repo_dir = os.path.dirname(this_dir)
+
+
+def iter_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iter_tests(test)
+        else:
+            yield test
+
+
+def class_ranks(cls, launcher):
+    """
+    Return the number of MPI ranks of the XIOS runs of a test class, 1 if
+    it runs none.
+
+    """
+    if not hasattr(cls, 'nclients'):
+        return 1
+    return sum(launcher.ranks(cls.nclients, cls.nservers))
+
+
+def find_jobs(start_dir, pattern='test*.py', split=False):
+    """
+    Discover test classes under start_dir and group them by test directory,
+    or with split, make a job of each test function.
+
+    Returns a list of dicts with the test directory, the unittest names
+    of its classes (or test function) and the number of MPI ranks needed.
+    """
+    launcher = mpi_launcher.get_launcher()
+    loader = unittest.TestLoader()
+    suite = loader.discover(start_dir, pattern=pattern, top_level_dir=repo_dir)
+    jobs = {}
+    for test in iter_tests(suite):
+        if isinstance(test, unittest.loader._FailedTest):
+            raise ImportError(f'failed to import test module {test.id()}')
+        cls = type(test)
+        test_dir = getattr(cls, 'test_dir', os.path.dirname(
+            sys.modules[cls.__module__].__file__))
+        name = test.id() if split else f'{cls.__module__}.{cls.__qualname__}'
+        job = jobs.setdefault(name if split else test_dir,
+                              {'test_dir': test_dir, 'names': [], 'ranks': 1,
+                               'label': name.split('.')[-1] if split else None})
+        if name not in job['names']:
+            job['names'].append(name)
+        job['ranks'] = max(job['ranks'], class_ranks(cls, launcher))
+    return list(jobs.values())
+
+
+def job_name(job):
+    name = os.path.relpath(job['test_dir'], repo_dir)
+    if job.get('label'):
+        name = f"{name}:{job['label']}"
+    return name
+
+
+def build_jobs(jobs):
+    """
+    Build the example of each test directory of jobs once, before its test
+    functions are run concurrently.
+
+    """
+    for test_dir in sorted({job['test_dir'] for job in jobs}):
+        print(f'building {os.path.relpath(test_dir, repo_dir)}', flush=True)
+        build_cache.build(test_dir)
+
+
+def run_jobs(jobs, cores, verbosity=2, sandbox=False):
+    """
+    Run jobs as subprocesses, keeping the ranks in use within cores,
+    with sandbox, each in its own scratch directories of prebuilt examples.
+
+    Returns a list of results, one per job, in completion order.
+    """
+    env = dict(os.environ)
+    if sandbox:
+        env.update({'TCD_SANDBOX': '1', 'TCD_BUILT': '1'})
+    # concurrent Open MPI jobs must not all bind their ranks to the first cores
+    env.setdefault('OMPI_MCA_hwloc_base_binding_policy', 'none')
+    env.setdefault('PRTE_MCA_hwloc_default_binding_policy', 'none')
+
+    pending = sorted(jobs, key=lambda job: job['ranks'], reverse=True)
+    running = []
+    results = []
+    free = cores
+    while pending or running:
+        # start the largest jobs which fit, or any one job when all cores are free
+        for job in list(pending):
+            if job['ranks'] <= free or not running:
+                log = tempfile.TemporaryFile(mode='w+')
+                cmd = [sys.executable, '-m', 'unittest', f'-{"v" if verbosity > 1 else "q"}'] + job['names']
+                proc = subprocess.Popen(cmd, cwd=repo_dir, env=env, stdout=log,
+                                        stderr=subprocess.STDOUT, text=True)
+                running.append((job, proc, log, time.perf_counter()))
+                pending.remove(job)
+                free -= job['ranks']
+                print(f'started {job_name(job)} '
+                      f'({job["ranks"]} ranks, {free} cores free)', flush=True)
+        time.sleep(0.1)
+        for item in list(running):
+            job, proc, log, start = item
+            if proc.poll() is None:
+                continue
+            wall = time.perf_counter() - start
+            running.remove(item)
+            free += job['ranks']
+            log.seek(0)
+            print(f'\n==== {job_name(job)} '
+                  f'finished in {wall:.1f} s, exit code {proc.returncode}', flush=True)
+            print(log.read(), flush=True)
+            log.close()
+            results.append({'job': job, 'returncode': proc.returncode, 'wall': wall})
+    return results
+
+
+def report(results, wall):
+    serial = sum(result['wall'] for result in results)
+    print(f'{"test directory":40s} {"ranks":>5s} {"wall (s)":>9s}  status')
+    for result in sorted(results, key=lambda r: r['wall'], reverse=True):
+        job = result['job']
+        status = 'ok' if result['returncode'] == 0 else 'FAILED'
+        print(f'{job_name(job):40s} {job["ranks"]:5d} '
+              f'{result["wall"]:9.1f}  {status}')
+    speedup = serial / wall if wall > 0 else 0.0
+    print(f'\naggregate wall time {wall:.1f} s, serial wall time (sum of jobs) {serial:.1f} s, '
+          f'speedup {speedup:.2f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run xios_examples test classes concurrently')
+    parser.add_argument('-j', '--cores', type=int, default=os.cpu_count(),
+                        help='Number of cores available for MPI ranks (default: %(default)s)')
+    parser.add_argument('-s', '--start_dir', default=this_dir,
+                        help='Directory to discover tests in (default: xios_examples)')
+    parser.add_argument('-p', '--pattern', default='test*.py',
+                        help='Pattern to match test files (default: %(default)s)')
+    parser.add_argument('-k', dest='only', action='append', default=[],
+                        help='Only run test directories containing this substring, may be repeated')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Less verbose unittest output')
+    parser.add_argument('--sandbox', action='store_true',
+                        help='Run each test function as a job, in its own scratch directory')
+    args = parser.parse_args(argv)
+
+    jobs = find_jobs(args.start_dir, args.pattern, split=args.sandbox)
+    if args.only:
+        jobs = [job for job in jobs if any(only in job['test_dir'] for only in args.only)]
+    start = time.perf_counter()
+    if args.sandbox:
+        build_jobs(jobs)
+    results = run_jobs(jobs, args.cores, verbosity=1 if args.quiet else 2, sandbox=args.sandbox)
+    report(results, time.perf_counter() - start)
+    if args.sandbox and not os.environ.get('logs'):
+        for test_dir in {job['test_dir'] for job in jobs}:
+            subprocess.run(['make', 'clean'], cwd=test_dir, stdout=subprocess.DEVNULL)
+
+    return 0 if all(result['returncode'] == 0 for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Timing and resource records for XIOS runs.
+
+Each XIOS launch made by a test is measured for wall time, CPU time and peak
+memory of the launched processes; when the test finishes the records are
+completed with the test identity and the sizes of the netCDF files written
+by the run, and appended as JSON lines to the file named by the environment
+variable PERF_LOG.  The CPU time and memory are those of the launcher and the
+ranks it runs on this host, not of remote ranks, e.g. under srun.
+"""
+import datetime
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+# records of runs made by the current test, not yet written
+pending = []
+
+
+def measure(cmd, cwd=None):
+    """
+    Run the command cmd, which launches an XIOS run, and record its wall time
+    and the CPU time and peak memory of the launched process and the
+    processes it waited for, from the resource usage returned by os.wait4.
+
+    Returns the CompletedProcess, raising CalledProcessError if it failed.
+    """
+    start = time.perf_counter()
+    record = {'ok': False, 'started': time.time()}
+    proc = subprocess.Popen(cmd, cwd=cwd)
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    record.update({'ok': proc.returncode == 0,
+                   'wall_s': time.perf_counter() - start,
+                   'user_cpu_s': usage.ru_utime,
+                   'sys_cpu_s': usage.ru_stime,
+                   # largest resident set of the run's processes, in KiB on Linux
+                   'max_rss_kb': usage.ru_maxrss})
+    pending.append(record)
+    print('run took {wall_s:.2f} s wall, {user_cpu_s:.2f} s user, {sys_cpu_s:.2f} s sys, '
+          'max rss {max_rss_kb} kB'.format(**record), flush=True)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return subprocess.CompletedProcess(cmd, proc.returncode)
+
+
+def annotate(**fields):
+    """
+    Add fields, such as the command and rank counts, to the latest pending record.
+
+    """
+    if pending:
+        pending[-1].update(fields)
+
+
+def output_sizes(output_dir, since):
+    """
+    Return a dict of name to size of the netCDF files in output_dir
+    modified at or after time since.
+
+    """
+    sizes = {}
+    for path in glob.glob(os.path.join(output_dir, '*.nc')):
+        stat = os.stat(path)
+        if stat.st_mtime >= since:
+            sizes[os.path.basename(path)] = stat.st_size
+    return sizes
+
+
+def flush(test_id, output_dir):
+    """
+    Complete the pending records with the test identity and the sizes of the
+    netCDF files written in output_dir, append them to the PERF_LOG file if
+    set, and clear them.
+
+    """
+    log_file = os.environ.get('PERF_LOG')
+    records = list(pending)
+    pending.clear()
+    if not log_file or not records:
+        return
+    with open(log_file, 'a') as fout:
+        for irun, record in enumerate(records):
+            sizes = output_sizes(output_dir, record['started'])
+            record.update({'test': test_id,
+                           'run': irun,
+                           'mver': os.environ.get('MVER', ''),
+                           'host': platform.node(),
+                           'time': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                           'output_bytes': sizes,
+                           'total_output_bytes': sum(sizes.values())})
+            fout.write(json.dumps(record) + '\n')
+
+
+def unstaged_wall(test_ids, log_file=None):
+    """
+    Return a dict of test id to the wall time of its XIOS runs in earlier
+    records of the PERF_LOG file made without a staging directory, the
+    median over records of each run of the test, summed over its runs.
+
+    """
+    log_file = log_file or os.environ.get('PERF_LOG')
+    if not log_file or not os.path.exists(log_file):
+        return {}
+    walls = {}
+    with open(log_file) as fin:
+        for line in fin:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if (record.get('test') in test_ids and record.get('ok')
+                    and not record.get('stage_dir')):
+                walls.setdefault(record['test'], {}).setdefault(
+                    record.get('run', 0), []).append(record['wall_s'])
+    return {test: sum(statistics.median(times) for times in runs.values())
+            for test, runs in walls.items()}
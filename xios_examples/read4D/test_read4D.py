@@ -34,8 +34,8 @@ class TestRead4D(xshared._TestCase):
         infile = inputfile.replace('.nc', '.cdl')
         
         subprocess.run(['ncgen', '-k', 'nc4', '-o', inputfile,
-                        infile], cwd=self.test_dir, check=True)
-        self.run_mpi_xios()
+                        infile], cwd=self.run_dir, check=True)
+        self.run_mpi_xios(run_dir=self.run_dir)
 
     @classmethod
     def setUpClass(cls):
@@ -16,6 +16,7 @@ class TestResampleDomain(xshared._TestCase):
     transient_inputs = ['domain_input.nc']
     transient_outputs = ['domain_output.nc']
     rtol = 5e-03
+    nclients = 3
 
 
 # A list of input `.cdl` files where XIOS is known to produce different
@@ -46,7 +47,7 @@ for f in glob.glob('{}/*.cdl'.format(this_dir)):
     elif tname in known_failures:
         # set decorator @unittest.expectedFailure
         setattr(TestResampleDomain, tname,
-                unittest.expectedFailure(TestResampleDomain.make_a_resample_test(f, nclients=3)))
+                unittest.expectedFailure(TestResampleDomain.make_a_resample_test(f)))
     else:
         setattr(TestResampleDomain, tname,
-                TestResampleDomain.make_a_resample_test(f, nclients=3))
+                TestResampleDomain.make_a_resample_test(f))
@@ -17,6 +17,7 @@ class TestResampleDomain(xshared._TestCase):
     transient_outputs = ['domain_output.nc', 'domain_output_ugrid.nc']
     rtol = 0.7
     mesh_file_cdl = 'mesh_C12.cdl'
+    nclients = 3
 
 
 # A list of input function names where XIOS is known to produce different
@@ -41,7 +42,7 @@ for f in ['sinusiod', 'harmonic', 'vortex', 'gulfstream']:
     elif tname in known_failures:
         # set decorator @unittest.expectedFailure
         setattr(TestResampleDomain, tname,
-                unittest.expectedFailure(TestResampleDomain.make_a_resample_test(f, nc_method='data_func', nclients=3)))
+                unittest.expectedFailure(TestResampleDomain.make_a_resample_test(f, nc_method='data_func')))
     else:
         setattr(TestResampleDomain, tname,
-                TestResampleDomain.make_a_resample_test(f, nc_method='data_func', nclients=3))
+                TestResampleDomain.make_a_resample_test(f, nc_method='data_func'))
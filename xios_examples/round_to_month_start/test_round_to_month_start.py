@@ -17,13 +17,13 @@ class TestSamplingOffset(xshared._TestCase):
     bounds = [[201, 229], [301, 331], [401, 413]]
 
     def test_field_output(self):
-        self.run_mpi_xios()
+        self.run_mpi_xios(run_dir=self.run_dir)
         self.check_daily_output()
         self.check_monthly_output()
 
     def check_daily_output(self):
         # Check the expected output file exists
-        outputfile = '{}/{}'.format(self.test_dir, "daily_output.nc")
+        outputfile = '{}/{}'.format(self.run_dir, "daily_output.nc")
         self.assertTrue(os.path.exists(outputfile))
 
         rootgrp = netCDF4.Dataset(outputfile, 'r')
@@ -37,7 +37,7 @@ class TestSamplingOffset(xshared._TestCase):
 
     def check_monthly_output(self):
         # Check the expected output file exists
-        outputfile = '{}/{}'.format(self.test_dir, "monthly_output.nc")
+        outputfile = '{}/{}'.format(self.run_dir, "monthly_output.nc")
         self.assertTrue(os.path.exists(outputfile))
 
         rootgrp = netCDF4.Dataset(outputfile, 'r')
@@ -16,10 +16,10 @@ class TestSamplingOffset(xshared._TestCase):
     axis_size = 10
 
     def test_sampling_offset(self):
-        self.run_mpi_xios()
+        self.run_mpi_xios(run_dir=self.run_dir)
 
         # Check the expected output file exists
-        outputfile = '{}/{}'.format(self.test_dir, self.transient_outputs[0])
+        outputfile = '{}/{}'.format(self.run_dir, self.transient_outputs[0])
         self.assertTrue(os.path.exists(outputfile))
 
         rootgrp = netCDF4.Dataset(outputfile, 'r')
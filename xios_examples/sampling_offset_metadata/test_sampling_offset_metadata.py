@@ -17,19 +17,19 @@ class TestSamplingOffsetMetadata(xshared._TestCase):
     axis_size = 10
 
     def test_sampling_offset_metadata(self):
-        self.run_mpi_xios()
+        self.run_mpi_xios(run_dir=self.run_dir)
 
         # Generate metadata netCDF file
-        comparison_file = Path(self.test_dir, self.transient_outputs[0])
+        comparison_file = Path(self.run_dir, self.transient_outputs[0])
         subprocess.run(
             ["ncgen", "-k", "nc4", "-o", comparison_file, comparison_file.with_suffix(".cdl")],
-            cwd=self.test_dir,
+            cwd=self.run_dir,
             check=True,
         )
 
         # Check the output files exist
-        daily_average_file = Path(self.test_dir, self.transient_outputs[1])
-        shifted_daily_average_file = Path(self.test_dir, self.transient_outputs[2])
+        daily_average_file = Path(self.run_dir, self.transient_outputs[1])
+        shifted_daily_average_file = Path(self.run_dir, self.transient_outputs[2])
 
         self.assertTrue(daily_average_file.exists())
         self.assertTrue(shifted_daily_average_file.exists())
@@ -0,0 +1,199 @@
+"""
+Strong and weak scaling of XIOS parallel output, using write_domain_parallel.
+
+Each case runs the compiled `write_parallel.exe` of write_domain_parallel on a
+number of client and server ranks, in its own run directory holding the
+example XML with the domain size and number of timesteps set in main.xml,
+see xios_config.XiosConfig.
+For strong scaling the domain is fixed as the clients increase; for weak
+scaling the number of cells grows in proportion to the clients.
+
+The time to solution, the bytes written per second and the XIOS client and
+server times are recorded per case, with the speedup and parallel efficiency
+relative to the case with fewest clients of the same mode and server count
+(or client/server ratio), and written as CSV.  Runs use the launcher chosen
+by the environment, see mpi_launcher.
+
+usage: python -m xios_examples.scale_write_parallel [--clients 1 2 4 8] [--servers 1 2]
+           [--mode strong weak] [--grid 100x100] [--nlev 3] [--nsteps 10] [--csv FILE]
+"""
+import argparse
+import csv
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import xios_examples.build_cache as build_cache
+import xios_examples.mpi_launcher as mpi_launcher
+import xios_examples.xios_config as xios_config
+import xios_examples.xios_report as xios_report
+
+this_path = os.path.realpath(__file__)
+this_dir = os.path.dirname(this_path)
+
+example_dir = os.path.join(this_dir, 'write_domain_parallel')
+executable = './write_parallel.exe'
+output_file = 'domain_output_1.nc'
+
+# XIOS report entries of the time spent in XIOS, see xios_report
+xios_time_keys = {'client': 'total time spent for xios (s)',
+                  'server': 'time spent for xios'}
+
+columns = ['mode', 'group', 'nclients', 'nservers', 'nlon', 'nlat', 'nlevs', 'ncell', 'n_steps',
+           'wall_s', 'bytes', 'mb_per_s', 'client_xios_s', 'server_xios_s',
+           'speedup', 'efficiency']
+
+
+def make_cases(modes, clients, servers, nlon, nlat, nlevs, n_steps, clients_per_server=None):
+    """
+    Return the list of scaling cases, the domain of weak scaling cases
+    growing in latitude so that the cells per client are those of the
+    case with fewest clients.
+
+    Cases are grouped by server count, or with clients_per_server set,
+    by that ratio, the server count then following the client count.
+    """
+    cases = []
+    base = min(clients)
+    if clients_per_server:
+        groups = [(f'{clients_per_server} clients per server', None)]
+    else:
+        groups = [(f'{nservers} servers', nservers) for nservers in servers]
+    for mode in modes:
+        for group, nservers in groups:
+            for nclients in clients:
+                nlat_case = nlat
+                if mode == 'weak':
+                    # the domain has nlon*(nlat-1) cells
+                    nlat_case = round((nlat - 1) * nclients / base) + 1
+                if clients_per_server:
+                    nservers = max(1, math.ceil(nclients / clients_per_server))
+                cases.append({'mode': mode, 'group': group,
+                              'nclients': nclients, 'nservers': nservers,
+                              'nlon': nlon, 'nlat': nlat_case, 'nlevs': nlevs,
+                              'ncell': nlon * (nlat_case - 1), 'n_steps': n_steps})
+    return cases
+
+
+def prepare(case, run_dir):
+    """
+    Fill run_dir with links to the example files and its XML, with the
+    domain size and number of timesteps of case set in main.xml.
+
+    """
+    config = xios_config.XiosConfig(example_dir)
+    for name in ['nlon', 'nlat', 'nlevs', 'n_steps']:
+        config.set_variable(name, case[name], var_type='int', name='main.xml')
+    config.stage(run_dir)
+
+
+def run_case(case, launcher, work_dir, repeat=1):
+    """
+    Run one scaling case, returning it with its results, for the best of repeat runs.
+
+    """
+    run_dir = tempfile.mkdtemp(dir=work_dir, prefix=f"{case['mode']}_{case['nclients']}_")
+    prepare(case, run_dir)
+    result = dict(case)
+    times = []
+    for _ in range(repeat):
+        started = time.time()
+        start = time.perf_counter()
+        launcher.run(executable, nclients=case['nclients'], nservers=case['nservers'],
+                     cwd=run_dir)
+        times.append(time.perf_counter() - start)
+        if times[-1] == min(times):
+            reports = xios_report.collect(run_dir, since=started)
+    result['wall_s'] = min(times)
+    result['bytes'] = os.path.getsize(os.path.join(run_dir, output_file))
+    result['mb_per_s'] = result['bytes'] / result['wall_s'] / 1e6
+    for role, key in xios_time_keys.items():
+        result[f'{role}_xios_s'] = reports.get(role, {}).get('max', {}).get(key)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return result
+
+
+def add_efficiency(results):
+    """
+    Add the speedup and parallel efficiency of each result, relative to the
+    result with fewest clients of the same mode and group.
+
+    Strong scaling efficiency is the speedup over the increase in clients,
+    weak scaling efficiency the ratio of the base time to the time taken.
+    """
+    bases = {}
+    for result in results:
+        key = (result['mode'], result['group'])
+        if key not in bases or result['nclients'] < bases[key]['nclients']:
+            bases[key] = result
+    for result in results:
+        base = bases[(result['mode'], result['group'])]
+        speedup = base['wall_s'] / result['wall_s']
+        result['speedup'] = speedup
+        if result['mode'] == 'strong':
+            result['efficiency'] = speedup * base['nclients'] / result['nclients']
+        else:
+            result['efficiency'] = speedup
+    return results
+
+
+def write_csv(results, fout):
+    writer = csv.DictWriter(fout, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for result in results:
+        writer.writerow({name: (f'{val:.6g}' if isinstance(val, float) else val)
+                         for name, val in result.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Strong and weak scaling of XIOS parallel output '
+                                                 'with write_domain_parallel')
+    parser.add_argument('--clients', nargs='+', type=int, default=[1, 2, 4, 8],
+                        help='Numbers of client ranks (default: %(default)s)')
+    parser.add_argument('--servers', nargs='+', type=int, default=[1],
+                        help='Numbers of XIOS server ranks (default: %(default)s)')
+    parser.add_argument('--clients_per_server', type=int,
+                        help='Derive the server ranks from the client ranks, see mpi_launcher')
+    parser.add_argument('--mode', nargs='+', choices=['strong', 'weak'], default=['strong', 'weak'],
+                        help='Scaling modes (default: %(default)s)')
+    parser.add_argument('--grid', default='100x100',
+                        help='Domain size as NLONxNLAT, for weak scaling that of the fewest '
+                             'clients (default: %(default)s)')
+    parser.add_argument('--nlev', type=int, default=3, help='Number of levels (default: %(default)s)')
+    parser.add_argument('--nsteps', type=int, default=10,
+                        help='Number of timesteps written (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per case, the best time is reported (default: %(default)s)')
+    parser.add_argument('--csv', help='Write the results to this CSV file (default: stdout)')
+    parser.add_argument('--work_dir', help='Directory for run directories (default: a temporary directory)')
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or min(args.clients + args.servers) < 1:
+        parser.error('--repeat, --clients and --servers must be at least 1')
+    nlon, nlat = (int(n) for n in args.grid.split('x'))
+
+    build_cache.build(example_dir)
+    launcher = mpi_launcher.get_launcher(clients_per_server=args.clients_per_server)
+    cases = make_cases(args.mode, args.clients, args.servers, nlon, nlat, args.nlev, args.nsteps,
+                       clients_per_server=launcher.clients_per_server)
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        for case in cases:
+            result = run_case(case, launcher, work_dir, args.repeat)
+            print(f"{result['mode']:6s} {result['nclients']:5d} clients {result['nservers']:4d} servers "
+                  f"{result['ncell']:10d} cells {result['wall_s']:9.3f} s {result['mb_per_s']:9.2f} MB/s",
+                  file=sys.stderr, flush=True)
+            results.append(result)
+    add_efficiency(results)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as fout:
+            write_csv(results, fout)
+    else:
+        write_csv(results, sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
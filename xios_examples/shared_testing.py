@@ -3,16 +3,36 @@ import glob
 import netCDF4
 import numpy as np
 import os
+import shutil
 import subprocess
+import time
 import unittest
 from pathlib import Path
 
-import xios_examples.gen_netcdf as gn
+import xios_examples.build_cache as build_cache
+import xios_examples.mpi_launcher as mpi_launcher
+import xios_examples.nc_cache as nc_cache
+import xios_examples.nc_compare as nc_compare
+import xios_examples.perf_log as perf_log
+import xios_examples.xios_config as xios_config
+import xios_examples.xios_report as xios_report
 
 this_path = os.path.realpath(__file__)
 this_dir = os.path.dirname(this_path)
 
 
+def stage_root():
+    """
+    Return the directory for run directories set by environment variable
+    'TCD_STAGE_DIR', a tmpfs if available when set to 'tmpfs', or None.
+
+    """
+    root = os.environ.get('TCD_STAGE_DIR')
+    if root == 'tmpfs':
+        return xios_config.scratch_root()
+    return root or None
+
+
 class _TestCase(unittest.TestCase):
     """
     UnitTest class to contain tests,
@@ -25,15 +45,31 @@ class _TestCase(unittest.TestCase):
     rtol = 5e-03
     executable = './resample.exe'
     mesh_file_cdl = None
+    # numbers of client and server MPI ranks of the XIOS runs of the tests,
+    # also used by parallel_runner to pack test classes onto cores
+    nclients = 1
+    nservers = 1
+    # source directory of the example, while test_dir is the run directory of this class
+    source_dir = None
+    # bytes and number of transient files, seconds copying them back and
+    # wall time of the XIOS runs of each test, of this class run on a staging directory
+    staged = None
 
     @classmethod
-    def make_netcdf(cls, inf, inputfile, nc_method='cdl_files'):
+    def make_netcdf(cls, inf, inputfile, nc_method='cdl_files', run_dir=None):
+        """
+        Create the netCDF input file, from a `.cdl` file or an analytic function,
+        in run_dir, by default the run directory of the class.
+
+        Set environment variable 'TCD_CACHE_DIR' to reuse files generated
+        from the same inputs by earlier runs, see nc_cache.
+        """
+        run_dir = run_dir or cls.test_dir
         if nc_method == 'cdl_files':
             # create a netCDF file from the `.cdl` input
-            subprocess.run(['ncgen', '-k', 'nc4', '-o', inputfile,
-                            inf], cwd=cls.test_dir, check=True)
+            nc_cache.ncgen(inf, inputfile, cwd=run_dir)
         elif nc_method == 'data_func':
-            cwd = Path(cls.test_dir)
+            cwd = Path(run_dir)
             inputfile = cwd/inputfile
             if cls.mesh_file_cdl is None:
                 ugrid_inputfile = None
@@ -46,8 +82,7 @@ class _TestCase(unittest.TestCase):
             else:
                 mesh_file_nc = cwd/Path(cls.mesh_file_cdl).with_suffix('.nc')
                 # create a mesh netCDF file from the mesh `.cdl` file
-                subprocess.run(['ncgen', '-k', 'nc4', '-o', mesh_file_nc,
-                                cls.mesh_file_cdl], cwd=cls.test_dir, check=True)
+                nc_cache.ncgen(cls.mesh_file_cdl, mesh_file_nc, cwd=run_dir)
                 name, ext = os.path.splitext(inputfile)
                 ugrid_inputfile = f"{name}_ugrid{ext}"
                 nlat = [81]
@@ -57,104 +92,225 @@ class _TestCase(unittest.TestCase):
                 ugrid_data_name = 'original_data'
 
             # create a  netCDF file from an analytic function
-            gn.run(file_out=inputfile, ugrid_file_out=ugrid_inputfile,
-                   nlat=nlat, nlon=nlon, dim_suffix=dim_suffix,
-                   data_name=data_name, ugrid_data_name=ugrid_data_name,
-                   func_str=inf, mesh_file=mesh_file_nc)
+            nc_cache.gen_netcdf_run(file_out=inputfile, ugrid_file_out=ugrid_inputfile,
+                                    nlat=nlat, nlon=nlon, dim_suffix=dim_suffix,
+                                    data_name=data_name, ugrid_data_name=ugrid_data_name,
+                                    func_str=inf, mesh_file=mesh_file_nc)
 
     @classmethod
-    def run_mpi_xios(cls, nclients=1, nservers=1):
-        # run the compiled Fortran XIOS programme
-        if os.environ.get('PLATFORM', '') == 'Archer2':
-            run_cmd = ['srun', '--distribution=block:block', '--hint=nomultithread',
-                       '--het-group=0', '--nodes=1', '-n', str(nclients),
-                       cls.executable, ':',
-                       '--het-group=1', '--nodes=1', '-n', str(nservers),
-                       './xios_server.exe']
-            print(' '.join(run_cmd))
-            subprocess.run(run_cmd,cwd=cls.test_dir, check=True)
-        else:
-            run_cmd = ['mpiexec', '-n', str(nclients), cls.executable, ':',
-                       '-n', str(nservers), './xios_server.exe']
-            if os.environ.get('MPI_FLAVOUR', '') == 'openmpi':
-                # use hwthread for github ubuntu runner
-                # but only for known openMPI (set by env var)
-                run_cmd = run_cmd[0:1] + ['--use-hwthread-cpus'] + run_cmd[1:]
-            print(' '.join(run_cmd))
-            subprocess.run(run_cmd, cwd=cls.test_dir, check=True)
+    def run_mpi_xios(cls, nclients=None, nservers=None, run_dir=None):
+        """
+        Run the compiled Fortran XIOS programme on nclients ranks with the XIOS
+        server on nservers ranks, by default those of the class, in run_dir,
+        by default the run directory of the class, using the MPI launcher
+        chosen by environment variables, see mpi_launcher.
+        """
+        run_dir = run_dir or cls.test_dir
+        nclients = nclients or cls.nclients
+        nservers = nservers or cls.nservers
+        launcher = mpi_launcher.get_launcher()
+        # time the run, written to the file named by 'PERF_LOG', see perf_log
+        run_cmd = launcher.command(cls.executable, nclients, nservers)
+        print(' '.join(run_cmd), flush=True)
+        started = time.time()
+        perf_log.measure(run_cmd, cwd=run_dir)
+        perf_log.annotate(launcher=type(launcher).__name__, command=run_cmd,
+                          stage_dir=stage_root(),
+                          xios=xios_report.collect(run_dir, since=started))
 
     @classmethod
     def setUpClass(cls):
         """
         First, build the fortran code only once for this class.
 
+        Then run the tests of this class in a new run directory, as test_dir,
+        holding links to the example files and the XIOS XML configuration,
+        see xios_config.XiosConfig, so the example directory is unchanged.
+
+        Set environment variable 'TCD_CACHE_DIR' to reuse unchanged builds
+        from earlier runs, see build_cache, or 'TCD_BUILT' when the example
+        has been built already, e.g. by parallel_runner.
+
+        Set environment variable 'TCD_STAGE_DIR' to a fast local directory,
+        e.g. /dev/shm, or to 'tmpfs', to make the run directory there, so
+        transient inputs and outputs are not written to shared file systems.
         """
-        subprocess.run(['make', 'clean'], cwd=cls.test_dir, check=True)
-        subprocess.run(['make'], cwd=cls.test_dir, check=True)
+        if not os.environ.get('TCD_BUILT'):
+            build_cache.build(cls.test_dir)
+        cls.xios_config = xios_config.XiosConfig(cls.test_dir)
         if os.environ.get('MVER', '').startswith('XIOS3/trunk'):
-            with open(os.path.join(cls.test_dir, 'xios.xml'), 'r') as ioin:
-                iodef_in = ioin.read()
-            # patch in transport protocol choice for XIOS3
+            # set transport protocol choice for XIOS3
             # needed for CI runners
-            in2 = '<variable_group id="parameters" >'
-            in3 = ('<variable_group id="parameters" >\n'
-                   '    <variable id="transport_protocol" '
-                   'type="string" >p2p</variable>')
-            iodef_out = iodef_in.replace(in2, in3)
-            with open(os.path.join(cls.test_dir, 'xios.xml'), 'w') as ioout:
-                ioout.write(iodef_out)
+            cls.xios_config.set_variable('transport_protocol', 'p2p')
+        cls.source_dir = cls.test_dir
+        cls.test_dir = cls.xios_config.stage(root=stage_root())
+        if stage_root() is not None:
+            cls.staged = {'bytes': 0, 'files': 0, 'copy_s': 0.0, 'runs': {}}
+
+    def setUp(self):
+        """
+        Before each test function, set its run directory, run_dir, that of the
+        class, or if environment variable 'TCD_SANDBOX' is set, a new scratch
+        directory, on tmpfs if available, so that the test functions of a
+        class may run concurrently.
+        """
+        self.run_dir = self.test_dir
+        if os.environ.get('TCD_SANDBOX'):
+            self.run_dir = self.xios_config.stage(root=stage_root() or xios_config.scratch_root())
 
     def tearDown(self):
         """
         After each test function,
+        record run timings if environment variable 'PERF_LOG' is set,
         report any errors from XIOS, then
-        remove the input and output netCDF files.
+        remove the input and output netCDF files, and any sandbox.
 
         Use environment variable 'files' to avoid clean up of transient files
         note; this can cause multi-test classes to fail with ncgen errors, use
         for single test functions only.
+
+        With a staging directory, see setUpClass, the transient files and
+        XIOS logs are copied back to the example directory if the test
+        failed or 'files' is set.
         """
 
-        for ef in glob.glob('{}/*.err'.format(self.test_dir)):
+        if self.staged is not None:
+            self.copy_back(copy=self.has_failed() or bool(os.environ.get('files')))
+
+        perf_log.flush(self.id(), self.run_dir)
+
+        for ef in glob.glob('{}/*.err'.format(self.run_dir)):
             print(ef)
             with open(ef, 'r') as efile:
                 print(efile.read(), flush=True)
 
         for t_in in self.transient_inputs:
-            rf = '{}/{}'.format(self.test_dir, t_in)
+            rf = '{}/{}'.format(self.run_dir, t_in)
             if os.path.exists(rf) and not os.environ.get("files"):
                 os.remove(rf)
         for t_out in self.transient_outputs:
-            rf = '{}/{}'.format(self.test_dir, t_out)
+            rf = '{}/{}'.format(self.run_dir, t_out)
             if os.path.exists(rf) and not os.environ.get("files"):
                 os.remove(rf)
 
+        if self.run_dir != self.test_dir:
+            if os.environ.get('logs') or os.environ.get('files'):
+                print(f'sandbox kept: {self.run_dir}', flush=True)
+            else:
+                shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def has_failed(self):
+        """
+        Return whether the test function has failed, from the errors and
+        failures reported to its unittest TestResult; expected failures are not
+        reported there.  Runners with other result objects, such as pytest,
+        do not keep these lists, so their failures are not detected.
+
+        """
+        outcome = getattr(self, '_outcome', None)
+        result = getattr(outcome, 'result', None)
+        reported = list(getattr(result, 'errors', [])) + list(getattr(result, 'failures', []))
+        # before Python 3.11, errors are held by the outcome until after tearDown
+        reported += [error for error in getattr(outcome, 'errors', []) if error[1] is not None]
+        # failed subtests are reported as _SubTest objects of the test
+        return any(getattr(test, 'test_case', test) is self for test, _ in reported)
+
+    def copy_back(self, copy=False):
+        """
+        Count the transient files and XIOS run time of the test in the staging
+        directory, and with copy, copy the files and the XIOS logs to the
+        example directory.
+
+        """
+        start = time.perf_counter()
+        self.staged['runs'][self.id()] = sum(record['wall_s'] for record in perf_log.pending
+                                             if record['ok'])
+        names = list(self.transient_inputs) + list(self.transient_outputs)
+        logs = [os.path.basename(path) for pattern in ['*.out', '*.err']
+                for path in glob.glob(os.path.join(self.run_dir, pattern))]
+        for name in names:
+            path = os.path.join(self.run_dir, name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                self.staged['bytes'] += os.path.getsize(path)
+                self.staged['files'] += 1
+        if copy:
+            for name in names + logs:
+                path = os.path.join(self.run_dir, name)
+                if os.path.isfile(path) and not os.path.islink(path):
+                    shutil.copy2(path, os.path.join(self.source_dir, name))
+            print(f'transient files of {self.id()} copied to {self.source_dir}', flush=True)
+            self.staged['copy_s'] += time.perf_counter() - start
+
+    @classmethod
+    def report_staging(cls):
+        """
+        Print the transient files of this class run on the staging directory,
+        the wall time of its XIOS runs there and of copying files back, and
+        the time saved against earlier runs of the same tests without staging,
+        from the PERF_LOG file, if any.
+
+        """
+        staged = cls.staged
+        cls.staged = None
+        if not staged or not staged['runs']:
+            return
+        stage_dir = os.path.dirname(cls.test_dir)
+        stage_s = sum(staged['runs'].values())
+        print(f"staged {staged['files']} transient files ({staged['bytes'] / 1e6:.1f} MB) "
+              f"on {stage_dir}: XIOS runs took {stage_s:.2f} s, copying back "
+              f"{staged['copy_s']:.2f} s", flush=True)
+        unstaged = perf_log.unstaged_wall(staged['runs'])
+        if unstaged:
+            saved = sum(unstaged[test] - staged['runs'][test] for test in unstaged)
+            print(f"staging saved {saved - staged['copy_s']:.2f} s against earlier runs "
+                  f"without staging of {len(unstaged)} of {len(staged['runs'])} tests "
+                  f"in {os.environ['PERF_LOG']}", flush=True)
+
     @classmethod
     def tearDownClass(cls):
         """
-        Finally, clean the build for this class, after all tests have run.
+        Finally, clean the build and remove the run directory for this class,
+        after all tests have run, reporting the time saved by any staging.
 
-        Use environment variable 'logs' to avoid clean up, e.g. to keep logs
+        Use environment variable 'logs' to avoid clean up, e.g. to keep logs,
+        or 'files' to keep the run directory with its files
         """
-        if not os.environ.get('logs'):
+        if cls.source_dir is not None:
+            cls.report_staging()
+        run_dir = cls.test_dir
+        if cls.source_dir is not None:
+            cls.test_dir = cls.source_dir
+            cls.source_dir = None
+            if os.environ.get('logs') or os.environ.get('files'):
+                print(f'run directory kept: {run_dir}', flush=True)
+            else:
+                shutil.rmtree(run_dir, ignore_errors=True)
+        if not os.environ.get('logs') and not os.environ.get('TCD_BUILT'):
             subprocess.run(['make', 'clean'], cwd=cls.test_dir)
-        if os.environ.get('MVER', '').startswith('XIOS3/trunk'):
-            with open(os.path.join(cls.test_dir, 'xios.xml'), 'r') as ioin:
-                iodef_in = ioin.read()
-            # patch back out transport protocol choice for XIOS3
-            # to avoid spurious git diff
-            in2 = '<variable_group id="parameters" >'
-            in3 = ('<variable_group id="parameters" >\n'
-                   '    <variable id="transport_protocol" '
-                   'type="string" >p2p</variable>')
-            iodef_out = iodef_in.replace(in3, in2)
-            with open(os.path.join(cls.test_dir, 'xios.xml'), 'w') as ioout:
-                ioout.write(iodef_out)
 
 
+    def assert_close(self, result, expected, rtol=None, atol=1e-08,
+                     fill_value=None, msg=''):
+        """
+        Assert result is close to expected, as numpy.allclose with the class
+        rtol by default, comparing masked and netCDF4 arrays block by block,
+        see nc_compare.check_close.
+
+        A summary of the worst points is built, and printed (as expected
+        failures do not report msg), only if the check fails.
+        """
+        if rtol is None:
+            rtol = self.rtol
+        passed, report = nc_compare.check_close(result, expected, rtol=rtol, atol=atol,
+                                                fill_value=fill_value)
+        if not passed:
+            msg = f'{msg}\n{report}' if msg else report
+            print(msg, flush=True)
+            self.fail(msg)
+
     @classmethod
     def make_a_resample_test(cls, inf, nc_method='cdl_files',
-                             nclients=1, nservers=1):
+                             nclients=None, nservers=None):
         """
         this function makes a test case and returns it as a test function,
         suitable to be dynamically added to a TestCase for running.
@@ -167,28 +323,17 @@ class _TestCase(unittest.TestCase):
         outputfile = cls.transient_outputs[0]
         def test_resample(self):
             # create a netCDF file using nc_method
-            cls.make_netcdf(infcp, inputfile, nc_method=nc_method)
-            cls.run_mpi_xios(nclients=nclients, nservers=nservers)
+            cls.make_netcdf(infcp, inputfile, nc_method=nc_method, run_dir=self.run_dir)
+            cls.run_mpi_xios(nclients=nclients, nservers=nservers, run_dir=self.run_dir)
 
             # load the result netCDF file
-            runfile = '{}/{}'.format(cls.test_dir, outputfile)
+            runfile = '{}/{}'.format(self.run_dir, outputfile)
             assert(os.path.exists(runfile))
-            rootgrp = netCDF4.Dataset(runfile, 'r')
-            # read data from the resampled, expected & diff variables
-            diff = rootgrp['resampled_minus_resample'][:]
-            expected = rootgrp['resample_data'][:]
-            result = rootgrp['resampled_data'][:]
-            # prepare message for failure
-            msg = ('the expected resample data array\n {exp}\n '
-                   'differs from the resampled data array\n {res} \n '
-                   'with diff \n {diff}\n')
-            msg = msg.format(exp=expected, res=result, diff=diff)
-            if not np.allclose(result, expected, rtol=cls.rtol):
-                # print message for fail case,
-                # as expected failures do not report msg.
-                print(msg)
-            # assert that all of the `diff` varaible values are zero
-            # self.assertTrue(not np.any(diff), msg=msg)
-            self.assertTrue(np.allclose(result, expected, rtol=cls.rtol),
-                            msg=msg)
+            with netCDF4.Dataset(runfile, 'r') as rootgrp:
+                # compare the resampled & expected variables
+                expected = rootgrp['resample_data']
+                result = rootgrp['resampled_data']
+                msg = ('the expected resample data array resample_data '
+                       'differs from the resampled data array resampled_data')
+                self.assert_close(result, expected, rtol=cls.rtol, msg=msg)
         return test_resample
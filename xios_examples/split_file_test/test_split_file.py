@@ -1,11 +1,9 @@
 import copy
 import glob
-from netCDF4 import Dataset
-import numpy as np
 import os
-import subprocess
 import unittest
 
+import xios_examples.nc_compare as nc_compare
 import xios_examples.shared_testing as xshared
 
 this_path = os.path.realpath(__file__)
@@ -22,9 +20,9 @@ class SplitFile(xshared._TestCase):
         """
         Check/test the split across files of outputted fields are correct.
         """
-        self.run_mpi_xios()
+        self.run_mpi_xios(run_dir=self.run_dir)
 
-        with open("{}/xios.xml".format(self.test_dir)) as cxml:
+        with open("{}/xios.xml".format(self.run_dir)) as cxml:
             print(cxml.read(), flush=True)
 
         kgo_cdl_files = [
@@ -42,51 +40,35 @@ class SplitFile(xshared._TestCase):
             "prog_file_2022121409-2022121412.cdl",
         ]
 
+        jobs = []
         for cdl_file in kgo_cdl_files:
 
-            kgo_file = cdl_file.replace("cdl", "nc")
-            kgo_file_path = f"{self.test_dir}/kgo_{kgo_file}"
-
             # Check output file with same name as kgo file was produced
-            output_file = kgo_file
-            output_file_path = f"{self.test_dir}/{output_file}"
+            output_file = cdl_file.replace("cdl", "nc")
+            output_file_path = f"{self.run_dir}/{output_file}"
             self.assertTrue(os.path.exists(output_file_path))
 
-            # Create netcdf kgo file
-            subprocess.run(
-                [
-                    "ncgen",
-                    "-k",
-                    "nc4",
-                    "-o",
-                    kgo_file_path,
-                    cdl_file,
-                 ],
-                cwd=self.kgo_cdl_dir,
-                check=True,
-            )
-
-            # Check time axis values and field values are what is expected
-            print(f"Comparing output file {output_file_path} to reference kgo file {kgo_file_path}", flush=True)
-
             if "prog_file_" in output_file:
-               test_results_t_instants = Dataset(output_file_path, "r")["time_instant"][:]
-               expected_t_instants = Dataset(kgo_file_path, "r")["time_instant"][:]
-               test_results_t = Dataset(output_file_path, "r")["temperature"][:]
-               expected_t = Dataset(kgo_file_path, "r")["temperature"][:]
+                time_var, field_var = "time_instant", "temperature"
 
             if "diag_file_" in output_file:
-               test_results_t_instants = Dataset(output_file_path, "r")["time_centered"][:]
-               expected_t_instants = Dataset(kgo_file_path, "r")["time_centered"][:]
-               test_results_t = Dataset(output_file_path, "r")["average_temperature"][:]
-               expected_t = Dataset(kgo_file_path, "r")["average_temperature"][:]
-
-            msg = (
-                f"Time series data in output file {output_file_path} differs from data in kgo file {kgo_file_path}"
-            )
-
-            self.assertTrue(
-                np.array_equal(test_results_t_instants, expected_t_instants)
-                and np.allclose(test_results_t, expected_t, rtol=self.rtol),
-                msg=msg,
-            )
+                time_var, field_var = "time_centered", "average_temperature"
+
+            # Check time axis values and field values are what is expected,
+            # against the kgo compiled from the cdl file
+            print(f"Comparing output file {output_file_path} to reference kgo file {cdl_file}", flush=True)
+            jobs.append(dict(cdl_dir=self.kgo_cdl_dir, cdl_file=cdl_file,
+                             result_path=output_file_path,
+                             variables=[time_var, field_var], rtol=self.rtol,
+                             exact=[time_var]))
+
+        # verify the files concurrently, gathering one report
+        results = nc_compare.verify_files(jobs)
+        report = nc_compare.format_results(results)
+        print(report, flush=True)
+
+        msg = (
+            f"Time series data in output files differs from data in kgo files\n{report}"
+        )
+
+        self.assertTrue(nc_compare.results_ok(results), msg=msg)
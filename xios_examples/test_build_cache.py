@@ -0,0 +1,130 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import xios_examples.build_cache as build_cache
+
+# stand-in for make: compiles each changed source to an object and the modules
+# it defines, logging each compile, then links prog.exe
+make_script = """#!/bin/sh
+if [ "$1" = clean ]; then rm -f *.o *.mod *.exe; exit 0; fi
+for f in *.F90; do
+  s=${f%.F90}
+  if [ ! -e $s.o ] || [ $f -nt $s.o ]; then
+    echo "compile $f" >> ../make.log
+    cp $f $s.o
+    for m in $(sed -n 's/^ *module  *\\([a-z_]*\\).*/\\1/p' $f); do cp $f $m.mod; done
+  fi
+done
+cat *.o > prog.exe
+"""
+
+
+class TestBuildCache(unittest.TestCase):
+    """
+    Check builds are stored and restored, whole or by unchanged sources,
+    using a stand-in for make.
+
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        bin_dir = os.path.join(self.tmp.name, 'bin')
+        os.mkdir(bin_dir)
+        stand_in = os.path.join(bin_dir, 'make')
+        with open(stand_in, 'w') as fout:
+            fout.write(make_script)
+        os.chmod(stand_in, os.stat(stand_in).st_mode | stat.S_IEXEC)
+        self.test_dir = os.path.join(self.tmp.name, 'example')
+        os.mkdir(self.test_dir)
+        self.write('Makefile', 'all:\n')
+        self.write('alpha.F90', 'module alpha\nend module alpha\n')
+        self.write('main.F90', 'program main\nuse alpha\nend program main\n')
+        env = {'PATH': bin_dir + os.pathsep + os.environ.get('PATH', ''),
+               'TCD_CACHE_DIR': os.path.join(self.tmp.name, 'cache'),
+               'XIOS_BINDIR': self.tmp.name}
+        self.env = mock.patch.dict(os.environ, env)
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.test_dir, name), 'w') as fout:
+            fout.write(text)
+
+    def compiled(self):
+        log = os.path.join(self.tmp.name, 'make.log')
+        if not os.path.exists(log):
+            return []
+        with open(log) as fin:
+            lines = fin.read().split()[1::2]
+        os.remove(log)
+        return lines
+
+    def restored(self):
+        bdir = build_cache.builds_dir(self.test_dir)
+        build_cache.subprocess.run(['make', 'clean'], cwd=self.test_dir, check=True)
+        build_cache.restore_objects(self.test_dir, bdir, build_cache.source_hashes(self.test_dir))
+        return sorted(name for name in os.listdir(self.test_dir) if name.endswith(('.o', '.mod')))
+
+    def test_module_sources(self):
+        self.write('procs.F90', 'module procs\ninterface f\n  module procedure g\nend interface\n'
+                                'end module procs\n')
+        modules = build_cache.module_sources(self.test_dir, build_cache.source_hashes(self.test_dir))
+        self.assertEqual(modules, {'alpha': ['alpha.F90'], 'procs': ['procs.F90']})
+
+    def test_restore_modules(self):
+        build_cache.build(self.test_dir)
+        self.assertEqual(sorted(self.compiled()), ['alpha.F90', 'main.F90'])
+        self.write('main.F90', 'program main\nuse alpha\nprint *, 1\nend program main\n')
+        self.assertEqual(self.restored(), ['alpha.mod', 'alpha.o'])
+        # a module whose source changed is rebuilt, not restored
+        self.write('main.F90', 'program main\nuse alpha\nend program main\n')
+        self.write('alpha.F90', 'module alpha\ninteger :: i\nend module alpha\n')
+        self.assertEqual(self.restored(), ['main.o'])
+
+    def test_reuse(self):
+        build_cache.build(self.test_dir)
+        self.compiled()
+        with open(os.path.join(self.test_dir, 'prog.exe')) as fin:
+            built = fin.read()
+        # an unchanged example reuses its executables without compiling
+        build_cache.build(self.test_dir)
+        self.assertEqual(self.compiled(), [])
+        with open(os.path.join(self.test_dir, 'prog.exe')) as fin:
+            self.assertEqual(fin.read(), built)
+        self.assertTrue(os.path.islink(os.path.join(self.test_dir, 'xios_server.exe')))
+        # a changed source is recompiled, the others restored
+        self.write('main.F90', 'program main\nuse alpha\nprint *, 1\nend program main\n')
+        build_cache.build(self.test_dir)
+        self.assertEqual(self.compiled(), ['main.F90'])
+
+    def test_keys(self):
+        key = build_cache.toolchain_key()
+        self.assertEqual(build_cache.toolchain_key(), key)
+        with mock.patch.dict(os.environ, {'FCFLAGS': '-O3'}):
+            self.assertNotEqual(build_cache.toolchain_key(), key)
+        self.assertEqual(set(build_cache.source_hashes(self.test_dir)),
+                         {'Makefile', 'alpha.F90', 'main.F90'})
+        with mock.patch.dict(os.environ):
+            del os.environ['TCD_CACHE_DIR']
+            self.assertIsNone(build_cache.builds_dir(self.test_dir))
+
+    def test_max_builds(self):
+        for version in range(build_cache.max_builds + 2):
+            self.write('main.F90', f'program main\nprint *, {version}\nend program main\n')
+            build_cache.build(self.test_dir)
+        builds = [name for name in os.listdir(build_cache.builds_dir(self.test_dir))
+                  if not name.startswith('.')]
+        self.assertEqual(len(builds), build_cache.max_builds)
+
+    def test_without_cache(self):
+        with mock.patch.dict(os.environ):
+            del os.environ['TCD_CACHE_DIR']
+            build_cache.build(self.test_dir)
+            build_cache.build(self.test_dir)
+        self.assertEqual(sorted(self.compiled()), ['alpha.F90', 'alpha.F90', 'main.F90', 'main.F90'])
@@ -0,0 +1,361 @@
+import filecmp
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import netCDF4
+import numpy as np
+
+import xios_examples.gen_netcdf as gen_netcdf
+import xios_examples.dataFunc as dataFunc_module
+from xios_examples.dataFunc import dataFunc
+
+
+def write_mesh(path, lon_offset=0.):
+    """
+    Write a UGRID mesh of two quadrilateral faces, with start_index 1.
+
+    """
+    with netCDF4.Dataset(path, 'w') as ds:
+        ds.createDimension('nmesh_face', 2)
+        ds.createDimension('nmesh_node', 6)
+        ds.createDimension('nmesh_edge', 7)
+        ds.createDimension('four', 4)
+        ds.createDimension('two', 2)
+        mesh = ds.createVariable('mesh', 'i4')
+        mesh.cf_role = 'mesh_topology'
+        mesh.face_coordinates = 'face_x face_y'
+        mesh.node_coordinates = 'node_x node_y'
+        mesh.face_node_connectivity = 'face_nodes'
+        mesh.edge_node_connectivity = 'edge_nodes'
+        mesh.face_edge_connectivity = 'face_edges'
+        mesh.face_face_connectivity = 'face_links'
+        node_lon = np.array([0., 10., 20., 0., 10., 20.]) + lon_offset
+        node_lat = np.array([0., 0., 0., 10., 10., 10.])
+        face_nodes = np.array([[0, 1, 4, 3], [1, 2, 5, 4]])
+        for name, values, standard_name, dim in [
+                ('node_x', node_lon, 'longitude', 'nmesh_node'),
+                ('node_y', node_lat, 'latitude', 'nmesh_node'),
+                ('face_x', node_lon[face_nodes].mean(1), 'longitude', 'nmesh_face'),
+                ('face_y', node_lat[face_nodes].mean(1), 'latitude', 'nmesh_face')]:
+            var = ds.createVariable(name, 'f8', (dim,))
+            var.standard_name = standard_name
+            var[:] = values
+        for name, values, dims, fill in [
+                ('face_nodes', face_nodes, ('nmesh_face', 'four'), None),
+                ('edge_nodes', [[0, 1], [1, 2], [3, 4], [4, 5], [0, 3], [1, 4], [2, 5]],
+                 ('nmesh_edge', 'two'), None),
+                ('face_edges', [[0, 5, 2, 4], [1, 6, 3, 5]], ('nmesh_face', 'four'), None),
+                ('face_links', [[1, -999, -999, -999], [0, -999, -999, -999]],
+                 ('nmesh_face', 'four'), -999)]:
+            var = ds.createVariable(name, 'i4', dims, fill_value=fill)
+            var.start_index = 1
+            values = np.array(values)
+            var[:] = np.where(values == -999, -999, values + 1)
+
+
+# sha256 of the data values written by the original gen_netcdf for each function
+# on a 19 x 24 grid with 2 levels
+regular_reference = {
+    'cossin': 'c45761ec4c002c548160e0c92df2914a616e616bb955938d670ddbf874245cfa',
+    'gulfstream': '0e78f5339ef4c5b70349ad0e4e3a0722dc02a759b31b9cbb9252b05fb2c45dc4',
+    'harmonic': '238b9a4d32751e8731922bb04ad00fd67018fa63ad988534771edca41c94ebac',
+    'sinusiod': '5a77d4eae60e6702b6e0c39ea843b71b5054fa81fd402dc9097eeb04d0475009',
+    'vortex': '96a891156d63c6b07650277ccc90550ceb430b0249d8a96e449ed1bc09a1539e',
+}
+
+# the UGRID file written by the original gen_netcdf for write_mesh with the vortex
+# function on 3 levels, as (name, dtype, dimensions, attributes, values) in file order
+ugrid_reference_dims = [('nMesh2d_face', 2), ('nMesh2d_node', 6), ('nMesh2d_edge', 7), ('nMesh2d_vertex', 4), ('Two', 2), ('level', 3)]
+ugrid_reference = [
+    ('Mesh2d', 'int32', (),
+     [('cf_role', 'mesh_topology'), ('long_name', 'Topology data of 2D unstructured mesh'), ('topology_dimension', 2), ('face_coordinates', 'Mesh2d_face_x Mesh2d_face_y'), ('node_coordinates', 'Mesh2d_node_x Mesh2d_node_y'), ('edge_coordinates', 'Mesh2d_edge_x Mesh2d_edge_y'), ('face_node_connectivity', 'Mesh2d_face_nodes'), ('edge_node_connectivity', 'Mesh2d_edge_nodes'), ('face_edge_connectivity', 'Mesh2d_face_edges'), ('face_face_connectivity', 'Mesh2d_face_links')],
+     None),
+    ('Mesh2d_face_x', 'float32', ('nMesh2d_face',),
+     [('standard_name', 'longitude'), ('long_name', 'Characteristic longitude of mesh faces.'), ('units', 'degrees_east'), ('bounds', 'Mesh2d_face_x_bounds')],
+     [5.0, 15.0]),
+    ('Mesh2d_face_y', 'float32', ('nMesh2d_face',),
+     [('standard_name', 'latitude'), ('long_name', 'Characteristic latitude of mesh faces.'), ('units', 'degrees_north'), ('bounds', 'Mesh2d_face_y_bounds')],
+     [5.0, 5.0]),
+    ('Mesh2d_node_x', 'float32', ('nMesh2d_node',),
+     [('standard_name', 'longitude'), ('long_name', 'Longitude of mesh nodes.'), ('units', 'degrees_east')],
+     [0.0, 10.0, 20.0, 0.0, 10.0, 20.0]),
+    ('Mesh2d_node_y', 'float32', ('nMesh2d_node',),
+     [('standard_name', 'latitude'), ('long_name', 'Latitude of mesh nodes.'), ('units', 'degrees_north')],
+     [0.0, 0.0, 0.0, 10.0, 10.0, 10.0]),
+    ('Mesh2d_edge_x', 'float32', ('nMesh2d_edge',),
+     [('standard_name', 'longitude'), ('long_name', 'Characteristic longitude of mesh edges.'), ('units', 'degrees_east')],
+     [None, None, None, None, None, None, None]),
+    ('Mesh2d_edge_y', 'float32', ('nMesh2d_edge',),
+     [('standard_name', 'latitude'), ('long_name', 'Characteristic latitude of mesh edges.'), ('units', 'degrees_north')],
+     [None, None, None, None, None, None, None]),
+    ('Mesh2d_face_nodes', 'int32', ('nMesh2d_face', 'nMesh2d_vertex'),
+     [('cf_role', 'face_node_connectivity'), ('long_name', 'Maps every face to its corner nodes.'), ('start_index', 0)],
+     [[0, 1, 4, 3], [1, 2, 5, 4]]),
+    ('Mesh2d_edge_nodes', 'int32', ('nMesh2d_edge', 'Two'),
+     [('cf_role', 'edge_node_connectivity'), ('long_name', 'Maps every edge/link to two nodes that it connects.'), ('start_index', 0)],
+     [[0, 1], [1, 2], [3, 4], [4, 5], [0, 3], [1, 4], [2, 5]]),
+    ('Mesh2d_face_edges', 'int32', ('nMesh2d_face', 'nMesh2d_vertex'),
+     [('_FillValue', 999999), ('cf_role', 'face_edge_connectivity'), ('long_name', 'Maps every face to its edges.'), ('start_index', 0)],
+     [[0, 5, 2, 4], [1, 6, 3, 5]]),
+    ('Mesh2d_face_links', 'int32', ('nMesh2d_face', 'nMesh2d_vertex'),
+     [('_FillValue', 999999), ('cf_role', 'face_face_connectivity'), ('long_name', 'Indicates which other faces neighbor each face'), ('start_index', 0), ('flag_values', -1), ('flag_meanings', 'out_of_mesh')],
+     [[1, None, None, None], [0, None, None, None]]),
+    ('Mesh2d_face_x_bounds', 'float32', ('nMesh2d_face', 'nMesh2d_vertex'),
+     [],
+     [[0.0, 10.0, 10.0, 0.0], [10.0, 20.0, 20.0, 10.0]]),
+    ('Mesh2d_face_y_bounds', 'float32', ('nMesh2d_face', 'nMesh2d_vertex'),
+     [],
+     [[0.0, 0.0, 10.0, 10.0], [0.0, 0.0, 10.0, 10.0]]),
+    ('level', 'float32', ('level',),
+     [('units', '1'), ('standard_name', 'model_levels')],
+     [1.0, 2.0, 3.0]),
+    ('data', 'float64', ('level', 'nMesh2d_face'),
+     [('long_name', 'input data values'), ('mesh', 'Mesh2d'), ('location', 'face'), ('coordinates', 'Mesh2d_face_y Mesh2d_face_x')],
+     [[2.8171274374141717, 2.9418017612767238], [2.8171274374141717, 2.9418017612767238], [2.8171274374141717, 2.9418017612767238]]),
+]
+
+
+class TestMeshCache(unittest.TestCase):
+    """
+    Check UGRID meshes are read once and reread only when the file changes.
+
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mesh_file = os.path.join(self.tmp.name, 'mesh.nc')
+        write_mesh(self.mesh_file)
+        self.cache = mock.patch.dict(gen_netcdf.mesh_cache, clear=True)
+        self.cache.start()
+
+    def tearDown(self):
+        self.cache.stop()
+        self.tmp.cleanup()
+
+    def test_mesh(self):
+        mesh = gen_netcdf.load_mesh(self.mesh_file)
+        self.assertEqual(mesh.varname, 'mesh')
+        self.assertEqual((mesh.nface, mesh.nnode, mesh.nedge), (2, 6, 7))
+        self.assertEqual(mesh.face_lon.tolist(), [5., 15.])
+        self.assertIsNone(mesh.edge_face)
+        self.assertIsNone(mesh.edge_lon)
+        data, missing = mesh.face_face
+        self.assertEqual(data[:, 0].tolist(), [1, 0])
+        self.assertTrue(missing[:, 1:].all())
+        with self.assertRaises(ValueError):
+            mesh.face_lon[0] = 0.
+
+    def test_read_once(self):
+        mesh = gen_netcdf.load_mesh(self.mesh_file)
+        with mock.patch.object(gen_netcdf, 'UgridMesh') as reader:
+            again = gen_netcdf.load_mesh(self.mesh_file)
+        reader.assert_not_called()
+        self.assertIs(again, mesh)
+
+    def test_reread_changed(self):
+        mesh = gen_netcdf.load_mesh(self.mesh_file)
+        write_mesh(self.mesh_file, lon_offset=90.)
+        stat = os.stat(self.mesh_file)
+        os.utime(self.mesh_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        again = gen_netcdf.load_mesh(self.mesh_file)
+        self.assertIsNot(again, mesh)
+        self.assertEqual(again.face_lon.tolist(), [95., 105.])
+
+    def test_evict(self):
+        with mock.patch.object(gen_netcdf, 'max_mesh_cache', 1):
+            mesh = gen_netcdf.load_mesh(self.mesh_file)
+            other = os.path.join(self.tmp.name, 'other.nc')
+            write_mesh(other)
+            gen_netcdf.load_mesh(other)
+            self.assertEqual(list(gen_netcdf.mesh_cache), [(os.path.realpath(other), None)])
+            self.assertIsNot(gen_netcdf.load_mesh(self.mesh_file), mesh)
+
+
+class TestFunctions(unittest.TestCase):
+    """
+    Check several analytic functions are written as variables of one file.
+
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_regular(self):
+        multi_file = os.path.join(self.tmp.name, 'multi.nc')
+        single_file = os.path.join(self.tmp.name, 'single.nc')
+        gen_netcdf.run(file_out=multi_file, func_str=['vortex', 'sinusiod'],
+                       nlat=[11], nlon=[10], nlev=2, nlat_chunk=4)
+        gen_netcdf.run(file_out=single_file, func_str='vortex', nlat=[11], nlon=[10], nlev=2)
+        with netCDF4.Dataset(multi_file) as multi, netCDF4.Dataset(single_file) as single:
+            self.assertIn('data_sinusiod', multi.variables)
+            self.assertNotIn('data', multi.variables)
+            self.assertEqual(multi['latitude'].shape, (11,))
+            np.testing.assert_array_equal(multi['data_vortex'][:], single['data'][:])
+
+    def test_ugrid(self):
+        mesh_file = os.path.join(self.tmp.name, 'mesh.nc')
+        out_file = os.path.join(self.tmp.name, 'ugrid.nc')
+        write_mesh(mesh_file)
+        gen_netcdf.main(['-u', out_file, '-m', mesh_file, '--ugrid_data_name', 'field',
+                         '--func', 'vortex', 'sinusiod'])
+        with netCDF4.Dataset(out_file) as ds:
+            self.assertEqual(ds['field_vortex'].mesh, 'Mesh2d')
+            self.assertEqual(ds['field_sinusiod'].shape, (2,))
+
+    def test_ugrid_reference(self):
+        mesh_file = os.path.join(self.tmp.name, 'mesh.nc')
+        out_file = os.path.join(self.tmp.name, 'ugrid.nc')
+        write_mesh(mesh_file)
+        gen_netcdf.main(['-u', out_file, '-m', mesh_file, '--func', 'vortex', '--nlev', '3'])
+        with netCDF4.Dataset(out_file) as ds:
+            self.assertEqual(ds.__dict__, {'Conventions': 'UGRID-1.0'})
+            self.assertEqual([(name, len(dim)) for name, dim in ds.dimensions.items()],
+                             ugrid_reference_dims)
+            self.assertEqual(list(ds.variables), [ref[0] for ref in ugrid_reference])
+            for name, dtype, dims, attrs, values in ugrid_reference:
+                with self.subTest(variable=name):
+                    var = ds[name]
+                    self.assertEqual((str(var.dtype), var.dimensions), (dtype, dims))
+                    self.assertEqual([(att, var.getncattr(att)) for att in var.ncattrs()], attrs)
+                    self.assertEqual(var[:].tolist(), values)
+
+    def test_time(self):
+        time_file = os.path.join(self.tmp.name, 'time.nc')
+        static_file = os.path.join(self.tmp.name, 'static.nc')
+        gen_netcdf.main(['-o', time_file, '--func', 'vortex', 'harmonic', '--nlat', '11',
+                         '--nlon', '10', '--nlev', '2', '--ntime', '3', '--timestep', '6'])
+        gen_netcdf.run(file_out=static_file, func_str=['vortex', 'harmonic'],
+                       nlat=[11], nlon=[10], nlev=2)
+        with netCDF4.Dataset(time_file) as timed, netCDF4.Dataset(static_file) as static:
+            self.assertTrue(timed.dimensions['time'].isunlimited())
+            self.assertEqual(timed['time'][:].tolist(), [0., 6., 12.])
+            self.assertEqual(timed['data_vortex'].shape, (3, 2, 11, 10))
+            self.assertEqual(timed['data_vortex'].chunking(), [1, 1, 11, 10])
+            # the vortex evolves in time, with its static field at 6 hours
+            np.testing.assert_allclose(timed['data_vortex'][1], static['data_vortex'][:])
+            # other functions drift eastward from their static field at time 0
+            np.testing.assert_allclose(timed['data_harmonic'][0], static['data_harmonic'][:])
+            self.assertFalse(np.allclose(timed['data_harmonic'][1], static['data_harmonic'][:]))
+
+    def test_time_ugrid(self):
+        mesh_file = os.path.join(self.tmp.name, 'mesh.nc')
+        out_file = os.path.join(self.tmp.name, 'ugrid.nc')
+        write_mesh(mesh_file)
+        gen_netcdf.main(['-u', out_file, '-m', mesh_file, '--ugrid_data_name', 'field',
+                         '--nlev', '3', '--ntime', '2'])
+        with netCDF4.Dataset(out_file) as ds:
+            self.assertEqual(ds['field'].shape, (2, 3, 2))
+            self.assertEqual(ds['field'].chunking(), [1, 1, 2])
+
+
+class TestRegularGrid(unittest.TestCase):
+    """
+    Check regular grid data written in latitude bands is that of the whole grid.
+
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.grid = dict(func_str=['vortex', 'gulfstream'], nlat=[37], nlon=[50], nlev=3)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, **kwargs):
+        path = os.path.join(self.tmp.name, name)
+        gen_netcdf.run(file_out=path, **self.grid, **kwargs)
+        return path
+
+    def test_lat_bands(self):
+        self.assertEqual(list(gen_netcdf.lat_bands(10, 4)), [slice(0, 4), slice(4, 8), slice(8, 10)])
+        self.assertEqual(list(gen_netcdf.lat_bands(10)), [slice(0, 10)])
+        serial = self.write('serial.nc')
+        banded = self.write('banded.nc', nlat_chunk=5)
+        with netCDF4.Dataset(serial) as whole, netCDF4.Dataset(banded) as bands:
+            self.assertEqual(bands['data_vortex'].chunking(), [1, 5, 50])
+            for name in ['latitude', 'longitude', 'data_vortex', 'data_gulfstream']:
+                np.testing.assert_array_equal(bands[name][:], whole[name][:])
+
+    def test_workers(self):
+        # workers fill bands of a memory-mapped buffer, the file is that written serially
+        for nlat_chunk in [None, 5]:
+            serial = self.write(f'serial_{nlat_chunk}.nc', nlat_chunk=nlat_chunk)
+            parallel = self.write(f'workers_{nlat_chunk}.nc', nlat_chunk=nlat_chunk, workers=3)
+            self.assertTrue(filecmp.cmp(serial, parallel, shallow=False))
+
+    def test_reference(self):
+        # data written in bands, serially or by workers, is that of the original code
+        for backend in ['numpy', 'fused']:
+            for kwargs in [{}, {'nlat_chunk': 5}, {'nlat_chunk': 5, 'workers': 2}]:
+                path = os.path.join(self.tmp.name, f'reference_{len(kwargs)}.nc')
+                gen_netcdf.run(file_out=path, func_str=sorted(regular_reference), nlat=[19],
+                               nlon=[24], nlev=2, backend=backend, **kwargs)
+                with netCDF4.Dataset(path) as ds:
+                    for name, digest in regular_reference.items():
+                        with self.subTest(func=name, backend=backend, **kwargs):
+                            values = ds[f'data_{name}'][:]
+                            self.assertEqual(values.shape, (2, 19, 24))
+                            self.assertEqual(hashlib.sha256(values.tobytes()).hexdigest(), digest)
+
+
+class TestDataFunc(unittest.TestCase):
+    """
+    Check the analytic functions on broadcast axes, and their backends,
+    against the plain NumPy evaluation on full 2-D coordinates.
+
+    """
+
+    def setUp(self):
+        lat = np.linspace(-90., 90., 37)
+        lon = np.linspace(-180., 180., 50, endpoint=False) + 0.3
+        self.lat, self.lon = lat[:, np.newaxis], lon[np.newaxis, :]
+        self.lat2d, self.lon2d = np.meshgrid(lat, lon, indexing='ij')
+
+    def test_broadcast(self):
+        df = dataFunc()
+        for name in df.get_funclist():
+            with self.subTest(name):
+                expected = dataFunc().get_func(name)(self.lat2d, self.lon2d)
+                result = df.get_func(name)(self.lat, self.lon)
+                self.assertEqual(result.shape, expected.shape)
+                np.testing.assert_array_equal(result, expected)
+        # axis terms are shared between functions and calls
+        self.assertTrue(df._axis_cache)
+        np.testing.assert_array_equal(df.get_func('vortex')(self.lat, self.lon),
+                                      dataFunc().get_func('vortex')(self.lat2d, self.lon2d))
+
+    def test_backends(self):
+        # relative tolerance of each backend against numpy, by function
+        tolerances = {'inplace': {}, 'numexpr': {'gulfstream': 1e-13}}
+        default_rtol = {'inplace': 0., 'numexpr': 1e-14}
+        for backend, rtols in tolerances.items():
+            if backend == 'numexpr' and dataFunc_module.numexpr is None:
+                continue
+            df = dataFunc(backend)
+            for name in df.get_funclist():
+                times = [{'t': t} for t in [0., 3., 24.]] if name in df.time_funcs else [{}]
+                for kwargs in times:
+                    with self.subTest(backend=backend, func=name, **kwargs):
+                        expected = dataFunc().get_func(name)(self.lat, self.lon, **kwargs)
+                        result = df.get_func(name)(self.lat, self.lon, **kwargs)
+                        np.testing.assert_allclose(result, expected, atol=0.,
+                                                   rtol=rtols.get(name, default_rtol[backend]))
+
+    def test_fused(self):
+        # fused is bit-identical to numpy, numexpr is only used when asked for
+        df = dataFunc('fused')
+        self.assertEqual(df.backend, 'inplace')
+        # also on float32 latitudes, as written by gen_netcdf, where numpy mixes precisions
+        lat32 = self.lat.astype(np.float32)
+        for name in df.get_funclist():
+            for lat in [self.lat, lat32]:
+                with self.subTest(func=name, dtype=lat.dtype):
+                    np.testing.assert_array_equal(df.get_func(name)(lat, self.lon),
+                                                  dataFunc().get_func(name)(lat, self.lon))
+
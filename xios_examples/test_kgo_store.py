@@ -0,0 +1,84 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import netCDF4
+import numpy as np
+
+import xios_examples.kgo_store as kgo_store
+
+
+class TestKgoStore(unittest.TestCase):
+    """
+    Check references are compiled once per CDL file and load as written,
+    using a stand-in for ncgen which copies a prepared netCDF file.
+
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        stand_in = os.path.join(self.tmp.name, 'ncgen')
+        with open(stand_in, 'w') as fout:
+            fout.write('#!/bin/sh\necho "$5" >> "$(dirname "$5")/ncgen.log"\ncp "$5.src" "$4"\n')
+        os.chmod(stand_in, os.stat(stand_in).st_mode | stat.S_IEXEC)
+        self.cdl_file = os.path.join(self.tmp.name, 'reference.cdl')
+        with open(self.cdl_file, 'w') as fout:
+            fout.write('netcdf reference {}\n')
+        with netCDF4.Dataset(self.cdl_file + '.src', 'w') as ds:
+            ds.title = 'reference'
+            ds.createDimension('time_counter', None)
+            ds.createDimension('n', 3)
+            field = ds.createVariable('field_A', 'f4', ('time_counter', 'n'), fill_value=-1.)
+            field.units = 'K'
+            field[:] = np.ma.masked_equal([[1., 2., -1.], [4., 5., 6.]], -1.)
+        env = {'PATH': self.tmp.name + os.pathsep + os.environ.get('PATH', ''),
+               'TCD_CACHE_DIR': os.path.join(self.tmp.name, 'cache')}
+        self.env = mock.patch.dict(os.environ, env)
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_compile_once(self):
+        kgo = kgo_store.load(self.cdl_file)
+        again = kgo_store.load(self.cdl_file)
+        with open(os.path.join(self.tmp.name, 'ncgen.log')) as fin:
+            self.assertEqual(len(fin.readlines()), 1)
+        self.assertEqual(kgo.path, again.path)
+        self.assertEqual(kgo.attrs, {'title': 'reference'})
+        self.assertEqual(kgo.dimensions['time_counter'], {'size': 2, 'unlimited': True})
+
+    def test_variable(self):
+        field = kgo_store.load(self.cdl_file)['field_A']
+        self.assertEqual(field.shape, (2, 3))
+        self.assertEqual(field.dimensions, ('time_counter', 'n'))
+        self.assertEqual(field.attrs['units'], 'K')
+        values = field[1:2]
+        self.assertEqual(values.tolist(), [[4., 5., 6.]])
+        self.assertTrue(np.ma.getmaskarray(field[0:1])[0, 2])
+
+    def test_session_store(self):
+        del os.environ['TCD_CACHE_DIR']
+        with mock.patch.object(kgo_store, '_session_dir', None):
+            kgo = kgo_store.load(self.cdl_file)
+            self.assertEqual(kgo.path.parent, kgo_store._session_dir)
+        self.assertTrue(kgo.path.parent.name.startswith('tcd_kgo_'))
+        self.assertFalse(kgo.path.is_relative_to(self.tmp.name))
+
+    def test_evict(self):
+        kgo = kgo_store.load(self.cdl_file)
+        other = os.path.join(self.tmp.name, 'other.cdl')
+        with open(other, 'w') as fout:
+            fout.write('netcdf other {}\n')
+        os.link(self.cdl_file + '.src', other + '.src')
+        stamp = os.stat(kgo.path).st_mtime - 10
+        os.utime(kgo.path, (stamp, stamp))
+        # room for one reference only, the least recently used is removed
+        size = sum(f.stat().st_size for f in kgo.path.iterdir())
+        with mock.patch.object(kgo_store.nc_cache, 'max_bytes', return_value=int(1.5 * size)):
+            again = kgo_store.load(other)
+        self.assertFalse(kgo.path.exists())
+        self.assertTrue(again.path.exists())
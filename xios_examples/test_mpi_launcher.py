@@ -0,0 +1,79 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import xios_examples.mpi_launcher as mpi_launcher
+
+
+class TestMpiLauncher(unittest.TestCase):
+    """
+    Check the MPI launch commands built for each MPI implementation,
+    and run one through a local stand-in for mpiexec.
+
+    """
+
+    def test_default_command(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            launcher = mpi_launcher.get_launcher()
+        self.assertIs(type(launcher), mpi_launcher.Launcher)
+        self.assertEqual(launcher.command('./resample.exe', 3, 1),
+                         ['mpiexec', '-n', '3', './resample.exe', ':',
+                          '-n', '1', './xios_server.exe'])
+
+    def test_openmpi_binding(self):
+        with mock.patch.dict(os.environ, {'MPI_FLAVOUR': 'openmpi',
+                                          'MPI_BINDING': 'socket'}, clear=True):
+            launcher = mpi_launcher.get_launcher()
+        self.assertEqual(launcher.command('./write.exe', 2, 2),
+                         ['mpiexec', '--use-hwthread-cpus',
+                          '--map-by', 'socket', '--bind-to', 'socket',
+                          '-n', '2', './write.exe', ':',
+                          '-n', '2', './xios_server.exe'])
+
+    def test_mpich_binding(self):
+        launcher = mpi_launcher.get_launcher('mpich', binding='numa')
+        self.assertEqual(launcher.command('./write.exe'),
+                         ['mpiexec', '-map-by', 'numa', '-bind-to', 'numa',
+                          '-n', '1', './write.exe', ':',
+                          '-n', '1', './xios_server.exe'])
+
+    def test_slurm_het_groups(self):
+        with mock.patch.dict(os.environ, {'PLATFORM': 'Archer2'}, clear=True):
+            launcher = mpi_launcher.get_launcher(binding='core')
+        self.assertEqual(launcher.command('./resample.exe', 3, 1),
+                         ['srun', '--distribution=block:block', '--hint=nomultithread',
+                          '--cpu-bind=cores',
+                          '--het-group=0', '--nodes=1', '-n', '3', './resample.exe', ':',
+                          '--distribution=block:block', '--hint=nomultithread',
+                          '--cpu-bind=cores',
+                          '--het-group=1', '--nodes=1', '-n', '1', './xios_server.exe'])
+
+    def test_clients_per_server(self):
+        with mock.patch.dict(os.environ, {'XIOS_CLIENTS_PER_SERVER': '4'}, clear=True):
+            launcher = mpi_launcher.get_launcher()
+        self.assertEqual(launcher.ranks(16, 1), (16, 4))
+        self.assertEqual(launcher.ranks(5, 1), (5, 2))
+        self.assertEqual(launcher.ranks(1, 3), (1, 1))
+
+    def test_unsupported_binding(self):
+        with self.assertRaises(ValueError):
+            mpi_launcher.get_launcher('mpiexec', binding='core')
+
+    def test_stand_in_mpiexec(self):
+        with tempfile.TemporaryDirectory() as run_dir:
+            stand_in = os.path.join(run_dir, 'mpiexec')
+            with open(stand_in, 'w') as fout:
+                fout.write('#!/bin/sh\necho "$@" > launched.txt\n')
+            os.chmod(stand_in, os.stat(stand_in).st_mode | stat.S_IEXEC)
+            with mock.patch.dict(os.environ, {'MPIEXEC': stand_in,
+                                              'MPI_FLAVOUR': 'openmpi',
+                                              'MPI_BINDING': 'core'}, clear=True):
+                launcher = mpi_launcher.get_launcher()
+            launcher.run('./resample.exe', nclients=2, nservers=1, cwd=run_dir)
+            with open(os.path.join(run_dir, 'launched.txt')) as fin:
+                launched = fin.read().split()
+        self.assertEqual(launched, ['--use-hwthread-cpus', '--map-by', 'core',
+                                    '--bind-to', 'core', '-n', '2', './resample.exe',
+                                    ':', '-n', '1', './xios_server.exe'])
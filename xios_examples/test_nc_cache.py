@@ -0,0 +1,110 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import xios_examples.nc_cache as nc_cache
+
+
+class TestNcCache(unittest.TestCase):
+    """
+    Check cache keys, hits and misses, and eviction of the least recently
+    used files, using a stand-in for ncgen which logs each call.
+
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = os.path.join(self.tmp.name, 'cache')
+        stand_in = os.path.join(self.tmp.name, 'ncgen')
+        with open(stand_in, 'w') as fout:
+            fout.write('#!/bin/sh\necho "$5" >> ../ncgen.log\ncp "$5" "$4"\n')
+        os.chmod(stand_in, os.stat(stand_in).st_mode | stat.S_IEXEC)
+        self.work = os.path.join(self.tmp.name, 'work')
+        os.mkdir(self.work)
+        with open(os.path.join(self.work, 'input.cdl'), 'w') as fout:
+            fout.write('netcdf input {}\n')
+        env = {'PATH': self.tmp.name + os.pathsep + os.environ.get('PATH', ''),
+               'TCD_CACHE_DIR': self.cache}
+        self.env = mock.patch.dict(os.environ, env)
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def ncgen_calls(self):
+        log = os.path.join(self.tmp.name, 'ncgen.log')
+        if not os.path.exists(log):
+            return 0
+        with open(log) as fin:
+            return len(fin.readlines())
+
+    def test_make_key(self):
+        self.assertEqual(nc_cache.make_key('a', b'b'), nc_cache.make_key(b'a', 'b'))
+        self.assertNotEqual(nc_cache.make_key('ab', 'c'), nc_cache.make_key('a', 'bc'))
+
+    def test_disabled(self):
+        with mock.patch.dict(os.environ):
+            del os.environ['TCD_CACHE_DIR']
+            self.assertIsNone(nc_cache.cache_dir('ncgen'))
+            nc_cache.ncgen('input.cdl', 'input.nc', cwd=self.work)
+            nc_cache.ncgen('input.cdl', 'input.nc', cwd=self.work)
+        self.assertEqual(self.ncgen_calls(), 2)
+        self.assertFalse(os.path.exists(self.cache))
+
+    def test_ncgen_hit(self):
+        nc_cache.ncgen('input.cdl', 'input.nc', cwd=self.work)
+        nc_cache.ncgen('input.cdl', 'again.nc', cwd=self.work)
+        self.assertEqual(self.ncgen_calls(), 1)
+        with open(os.path.join(self.work, 'again.nc')) as fin:
+            self.assertEqual(fin.read(), 'netcdf input {}\n')
+        # a changed input is a miss
+        with open(os.path.join(self.work, 'input.cdl'), 'a') as fout:
+            fout.write('\n')
+        nc_cache.ncgen('input.cdl', 'input.nc', cwd=self.work)
+        self.assertEqual(self.ncgen_calls(), 2)
+
+    def test_fetch_store(self):
+        src = os.path.join(self.work, 'a.nc')
+        with open(src, 'w') as fout:
+            fout.write('a')
+        dest = os.path.join(self.work, 'b.nc')
+        self.assertFalse(nc_cache.fetch('kind', 'key', [dest]))
+        nc_cache.store('kind', 'key', [src])
+        self.assertTrue(nc_cache.fetch('kind', 'key', [dest]))
+        with open(dest) as fin:
+            self.assertEqual(fin.read(), 'a')
+        # outputs are unlinked before being regenerated, leaving the cached file intact
+        nc_cache.unlink_outputs([dest])
+        self.assertFalse(os.path.exists(dest))
+        self.assertTrue(nc_cache.fetch('kind', 'key', [dest]))
+
+    def test_evict(self):
+        paths = []
+        for name in ['old', 'new']:
+            src = os.path.join(self.work, f'{name}.nc')
+            with open(src, 'wb') as fout:
+                fout.write(b'x' * 1000)
+            nc_cache.store('kind', name, [src])
+            paths.append(os.path.join(self.cache, 'kind', f'{name}.0.nc'))
+        os.utime(paths[0], (1, 1))
+        with mock.patch.object(nc_cache, 'max_bytes', return_value=1500):
+            nc_cache.evict()
+        self.assertEqual([os.path.exists(path) for path in paths], [False, True])
+
+    def test_gen_netcdf_key(self):
+        calls = []
+        with mock.patch.object(nc_cache.gn, 'run',
+                               side_effect=lambda **kwargs: calls.append(kwargs) or
+                               open(kwargs['file_out'], 'w').close()):
+            for name, workers in [('a.nc', 1), ('b.nc', 4)]:
+                nc_cache.gen_netcdf_run(file_out=os.path.join(self.work, name),
+                                        func_str='vortex', nlat=[11], workers=workers)
+            # the output names and workers do not change the key
+            self.assertEqual(len(calls), 1)
+            nc_cache.gen_netcdf_run(file_out=os.path.join(self.work, 'c.nc'),
+                                    func_str='harmonic', nlat=[11], workers=1)
+            self.assertEqual(len(calls), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.work, 'b.nc')))
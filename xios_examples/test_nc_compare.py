@@ -0,0 +1,157 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import netCDF4
+import numpy as np
+
+import xios_examples.nc_compare as nc_compare
+
+
+def write(path, temperature, time):
+    with netCDF4.Dataset(path, 'w') as ds:
+        ds.createDimension('time_counter', None)
+        ds.createDimension('lat', temperature.shape[1])
+        ds.createVariable('time_instant', 'f8', ('time_counter',))[:] = time
+        ds.createVariable('temperature', 'f4', ('time_counter', 'lat'))[:] = temperature
+
+
+class TestNcCompare(unittest.TestCase):
+    """
+    Check chunked comparison of netCDF variables against numpy.allclose.
+
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.expected = os.path.join(self.tmp.name, 'kgo.nc')
+        self.result = os.path.join(self.tmp.name, 'result.nc')
+        self.temperature = np.linspace(250., 300., 60, dtype=np.float32).reshape(12, 5)
+        self.time = np.arange(12) * 3600.
+        write(self.expected, self.temperature, self.time)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunk_slices(self):
+        self.assertEqual(list(nc_compare.chunk_slices((5, 4), 8)),
+                         [(slice(0, 2),), (slice(2, 4),), (slice(4, 5),)])
+        self.assertEqual(list(nc_compare.chunk_slices(())), [()])
+
+    def test_within_tolerance(self):
+        write(self.result, self.temperature * 1.001, self.time)
+        reports = nc_compare.compare_files(self.result, self.expected,
+                                           ['time_instant', 'temperature'],
+                                           rtol=5e-3, exact=['time_instant'], max_elements=10)
+        self.assertTrue(all(report['ok'] for report in reports))
+        self.assertEqual(reports[1]['checked'], 60)
+        self.assertAlmostEqual(reports[1]['max_rel'], 1e-3, places=6)
+
+    def test_stops_at_first_failure(self):
+        temperature = self.temperature.copy()
+        temperature[5, 2] += 10.
+        write(self.result, temperature, self.time)
+        report, = nc_compare.compare_files(self.result, self.expected, ['temperature'],
+                                           rtol=5e-3, max_elements=10)
+        self.assertFalse(report['ok'])
+        self.assertEqual(report['failed_at'], (slice(4, 6),))
+        self.assertEqual(report['checked'], 30)
+        self.assertAlmostEqual(report['max_abs'], 10., places=4)
+        self.assertIn('out of tolerance in records 4:6', nc_compare.format_report([report]))
+
+    def test_exact_and_missing(self):
+        write(self.result, self.temperature, self.time + 1.)
+        reports = nc_compare.compare_files(self.result, self.expected,
+                                           ['time_instant', 'pressure'], exact=['time_instant'])
+        self.assertEqual([report['ok'] for report in reports], [False, False])
+        self.assertIn('variable missing', reports[1]['error'])
+
+    def test_verify_files(self):
+        # a stand-in for ncgen which copies <cdl>.src to the output
+        stand_in = os.path.join(self.tmp.name, 'ncgen')
+        with open(stand_in, 'w') as fout:
+            fout.write('#!/bin/sh\ncp "$5.src" "$4"\n')
+        os.chmod(stand_in, os.stat(stand_in).st_mode | stat.S_IEXEC)
+        jobs = []
+        for ifile in range(3):
+            cdl_file = f'file_{ifile}.cdl'
+            with open(os.path.join(self.tmp.name, cdl_file), 'w') as fout:
+                fout.write(f'netcdf file_{ifile} {{}}\n')
+            write(os.path.join(self.tmp.name, cdl_file + '.src'), self.temperature + ifile, self.time)
+            result_path = os.path.join(self.tmp.name, f'file_{ifile}.nc')
+            write(result_path, (self.temperature + ifile) * (1.01 if ifile == 1 else 1.), self.time)
+            jobs.append(dict(cdl_dir=self.tmp.name, cdl_file=cdl_file, result_path=result_path,
+                             variables=['time_instant', 'temperature'],
+                             rtol=5e-3, exact=['time_instant']))
+        path = self.tmp.name + os.pathsep + os.environ.get('PATH', '')
+        with mock.patch.dict(os.environ, {'PATH': path,
+                                          'TCD_CACHE_DIR': os.path.join(self.tmp.name, 'cache')}):
+            results = nc_compare.verify_files(jobs, workers=3)
+        self.assertEqual([result['result'] for result in results],
+                         [job['result_path'] for job in jobs])
+        self.assertEqual([[report['ok'] for report in result['reports']] for result in results],
+                         [[True, True], [True, False], [True, True]])
+        self.assertFalse(nc_compare.results_ok(results))
+
+    def test_structure(self):
+        stand_in = os.path.join(self.tmp.name, 'ncgen')
+        with open(stand_in, 'w') as fout:
+            fout.write('#!/bin/sh\ncp "$5.src" "$4"\n')
+        os.chmod(stand_in, os.stat(stand_in).st_mode | stat.S_IEXEC)
+        cdl_file = os.path.join(self.tmp.name, 'expected.cdl')
+        with open(cdl_file, 'w') as fout:
+            fout.write('netcdf expected {}\n')
+        for path, uuid, units, scale in [(cdl_file + '.src', 'abc', 'K', 1.),
+                                         (self.result, 'def', 'degC', 1.1)]:
+            write(path, self.temperature * scale, self.time)
+            with netCDF4.Dataset(path, 'a') as ds:
+                ds.uuid = uuid
+                ds['temperature'].units = units
+                crs = ds.createVariable('crs', 'i2', (), fill_value=-32767)
+                crs.crs_wkt = 'GEOGCRS["WGS 84"]'
+        path = self.tmp.name + os.pathsep + os.environ.get('PATH', '')
+        with mock.patch.dict(os.environ, {'PATH': path,
+                                          'TCD_CACHE_DIR': os.path.join(self.tmp.name, 'cache')}):
+            differences = nc_compare.compare_structure(self.result, cdl_file, rtol=5e-3)
+            self.assertEqual(differences[0],
+                             "temperature attribute units: 'degC' differs from expected 'K'")
+            self.assertEqual(len(differences), 2)
+            self.assertTrue(differences[1].startswith('values of temperature: FAILED'))
+            self.assertEqual(nc_compare.compare_structure(self.result, cdl_file,
+                                                          ignore_attrs=('uuid', 'units'),
+                                                          rtol=0.2), [])
+            differences = nc_compare.compare_structure(self.result, cdl_file,
+                                                       ignore_attrs=('uuid', 'units'),
+                                                       rtol=0.2, exact=True)
+            self.assertEqual(len(differences), 1)
+            self.assertTrue(differences[0].startswith('values of temperature: FAILED'))
+
+    def test_check_close(self):
+        with netCDF4.Dataset(self.expected, 'r') as ds:
+            passed, report = nc_compare.check_close(ds['temperature'], self.temperature * 1.001,
+                                                    rtol=5e-3, max_elements=10)
+        self.assertTrue(passed)
+        self.assertEqual(report, '')
+        result = np.ma.masked_array(self.temperature.copy(), mask=False)
+        result[0, 0] = np.ma.masked
+        result[2, 3] += 5.
+        result[11, 4] = np.nan
+        passed, report = nc_compare.check_close(result, self.temperature, rtol=5e-3,
+                                                worst=1, max_elements=10)
+        self.assertFalse(passed)
+        lines = report.splitlines()
+        self.assertEqual(lines[0], '2 of 59 values differ by more than rtol=0.005, atol=1e-08')
+        self.assertEqual(lines[2], '1 values masked in the result only, 0 in the expected only')
+        self.assertEqual(lines[3:], ['worst 1 points:',
+                                     '  (11, 4): result nan, expected 300, diff nan'])
+
+    def test_check_close_broadcast(self):
+        expected = np.array([[[273.70905]], [[228.19833]]])
+        self.assertTrue(nc_compare.check_close(expected[np.newaxis] * 1.0001, expected,
+                                               rtol=5e-4)[0])
+        self.assertTrue(nc_compare.check_close(np.float64(2.8), 2.8)[0])
+        passed, report = nc_compare.check_close(np.ones(3), np.ones(4))
+        self.assertFalse(passed)
+        self.assertIn('does not match', report)
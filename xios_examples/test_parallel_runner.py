@@ -0,0 +1,85 @@
+import os
+import unittest
+from unittest import mock
+
+import xios_examples.mpi_launcher as mpi_launcher
+import xios_examples.parallel_runner as parallel_runner
+
+example_dir = os.path.join(parallel_runner.this_dir, 'read_domain_decomp_resample')
+
+
+class FakeProcess:
+    """
+    A finished job process after a number of polls, recording the ranks
+    in use while it runs.
+
+    """
+    running = []
+
+    def __init__(self, job, polls):
+        self.job = job
+        self.polls = polls
+        self.returncode = None
+        FakeProcess.running.append(job)
+
+    def poll(self):
+        self.polls -= 1
+        if self.polls <= 0:
+            FakeProcess.running.remove(self.job)
+            self.returncode = 0
+        return self.returncode
+
+
+class TestParallelRunner(unittest.TestCase):
+    """
+    Check test classes are grouped into jobs by test directory, or by test
+    function, with their MPI ranks, and jobs are packed within the cores.
+
+    """
+
+    def test_find_jobs(self):
+        job, = parallel_runner.find_jobs(example_dir)
+        self.assertEqual(job['test_dir'], example_dir)
+        self.assertEqual(job['names'],
+                         ['xios_examples.read_domain_decomp_resample.test_resample_cases.TestResampleDomain'])
+        # 3 clients and 1 server
+        self.assertEqual(job['ranks'], 4)
+        self.assertEqual(parallel_runner.job_name(job), 'xios_examples/read_domain_decomp_resample')
+
+    def test_split_jobs(self):
+        jobs = parallel_runner.find_jobs(example_dir, split=True)
+        self.assertGreater(len(jobs), 1)
+        self.assertTrue(all(len(job['names']) == 1 and job['ranks'] == 4 for job in jobs))
+        self.assertEqual({job['label'] for job in jobs},
+                         {job['names'][0].split('.')[-1] for job in jobs})
+
+    def test_class_ranks(self):
+        cls = type('Case', (), {'nclients': 8, 'nservers': 1})
+        self.assertEqual(parallel_runner.class_ranks(cls, mpi_launcher.Launcher()), 9)
+        self.assertEqual(parallel_runner.class_ranks(cls, mpi_launcher.Launcher(clients_per_server=4)), 10)
+        self.assertEqual(parallel_runner.class_ranks(unittest.TestCase, mpi_launcher.Launcher()), 1)
+
+    def test_packing(self):
+        jobs = [{'test_dir': f'/dir{ranks}_{i}', 'names': [f'job{ranks}_{i}'], 'ranks': ranks, 'label': None}
+                for i, ranks in enumerate([2, 4, 1, 3, 2, 8])]
+        started = []
+        peak = []
+
+        def popen(cmd, **kwargs):
+            job = next(job for job in jobs if job['names'][0] == cmd[-1])
+            started.append(job['ranks'])
+            proc = FakeProcess(job, polls=3)
+            peak.append(sum(running['ranks'] for running in FakeProcess.running))
+            return proc
+
+        with mock.patch.object(parallel_runner.subprocess, 'Popen', side_effect=popen), \
+             mock.patch.object(parallel_runner.time, 'sleep'), \
+             mock.patch('builtins.print'):
+            results = parallel_runner.run_jobs(jobs, cores=6)
+        self.assertEqual(len(results), len(jobs))
+        self.assertTrue(all(result['returncode'] == 0 for result in results))
+        # largest first, a job larger than the cores runs alone
+        self.assertEqual(started[0], 8)
+        self.assertEqual(peak[0], 8)
+        self.assertLessEqual(max(peak[1:]), 6)
+        self.assertEqual(started[1:3], [4, 2])
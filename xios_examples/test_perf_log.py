@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import xios_examples.perf_log as perf_log
+
+
+def python_cmd(code):
+    return [sys.executable, '-c', code]
+
+
+class TestPerfLog(unittest.TestCase):
+    """
+    Check the timing and memory recorded for each run belong to that run,
+    and the records written to PERF_LOG.
+
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pending = mock.patch.object(perf_log, 'pending', [])
+        self.pending.start()
+
+    def tearDown(self):
+        self.pending.stop()
+        self.tmp.cleanup()
+
+    def test_run_memory(self):
+        perf_log.measure(python_cmd('x = bytearray(200 * 2**20); x[::4096] = b"1" * len(x[::4096])'))
+        perf_log.measure(python_cmd('pass'))
+        large, small = perf_log.pending
+        self.assertTrue(large['ok'] and small['ok'])
+        self.assertGreater(large['max_rss_kb'], 200 * 1024)
+        # the peak of an earlier, larger run is not carried over
+        self.assertLess(small['max_rss_kb'], 100 * 1024)
+        self.assertGreater(large['user_cpu_s'] + large['sys_cpu_s'], 0.)
+        self.assertGreater(large['wall_s'], 0.)
+
+    def test_failed_run(self):
+        with self.assertRaises(subprocess.CalledProcessError) as err:
+            perf_log.measure(python_cmd('raise SystemExit(3)'))
+        self.assertEqual(err.exception.returncode, 3)
+        self.assertFalse(perf_log.pending[-1]['ok'])
+
+    def test_flush(self):
+        log_file = os.path.join(self.tmp.name, 'perf.jsonl')
+        perf_log.measure(python_cmd('open("out.nc", "wb").write(b"x" * 100)'), cwd=self.tmp.name)
+        perf_log.annotate(command=['run'])
+        with mock.patch.dict(os.environ, {'PERF_LOG': log_file}):
+            perf_log.flush('test.id', self.tmp.name)
+        self.assertEqual(perf_log.pending, [])
+        with open(log_file) as fin:
+            record, = [json.loads(line) for line in fin]
+        self.assertEqual(record['test'], 'test.id')
+        self.assertEqual(record['command'], ['run'])
+        self.assertEqual(record['output_bytes'], {'out.nc': 100})
+        self.assertEqual(record['total_output_bytes'], 100)
+        self.assertTrue({'wall_s', 'user_cpu_s', 'sys_cpu_s', 'max_rss_kb', 'time', 'host'} <= set(record))
+
+    def test_unstaged_wall(self):
+        log_file = os.path.join(self.tmp.name, 'perf.jsonl')
+        records = [{'test': 'a', 'run': 0, 'ok': True, 'wall_s': 2.0, 'stage_dir': None},
+                   {'test': 'a', 'run': 0, 'ok': True, 'wall_s': 4.0},
+                   {'test': 'a', 'run': 0, 'ok': True, 'wall_s': 9.0},
+                   {'test': 'a', 'run': 1, 'ok': True, 'wall_s': 1.0},
+                   {'test': 'a', 'run': 0, 'ok': True, 'wall_s': 0.5, 'stage_dir': '/dev/shm'},
+                   {'test': 'a', 'run': 0, 'ok': False, 'wall_s': 0.1},
+                   {'test': 'b', 'run': 0, 'ok': True, 'wall_s': 3.0, 'stage_dir': '/dev/shm'},
+                   {'test': 'c', 'run': 0, 'ok': True, 'wall_s': 5.0}]
+        with open(log_file, 'w') as fout:
+            fout.write(''.join(json.dumps(record) + '\n' for record in records))
+        # the median of each run without staging, summed over runs
+        self.assertEqual(perf_log.unstaged_wall({'a', 'b'}, log_file), {'a': 5.0})
+        with mock.patch.dict(os.environ, {'PERF_LOG': os.path.join(self.tmp.name, 'none.jsonl')}):
+            self.assertEqual(perf_log.unstaged_wall({'a'}), {})
@@ -0,0 +1,83 @@
+import io
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+import xml.etree.ElementTree as ET
+
+import xios_examples.mpi_launcher as mpi_launcher
+import xios_examples.scale_write_parallel as scaling
+
+# XIOS performance reports, as written to the client and server logs
+client_log = ('-> report :  Performance report : total time spent for XIOS : 0.31 s\n'
+              '-> report :  Performance report : Ratio : 0.78 %\n')
+server_log = ('-> report : Performance report : Time spent for XIOS : 1.4\n'
+              '-> report : Performance report : Ratio : 14.2%\n')
+
+
+class TestScaling(unittest.TestCase):
+    """
+    Check the scaling cases and efficiencies, and run a case through a
+    local stand-in for mpiexec which writes an output file of 1000 bytes
+    and XIOS client and server reports.
+
+    """
+
+    def test_cases(self):
+        cases = scaling.make_cases(['strong', 'weak'], [2, 4], [1, 2], 100, 101, 3, 10)
+        self.assertEqual(len(cases), 8)
+        strong = [case for case in cases if case['mode'] == 'strong']
+        self.assertEqual({case['ncell'] for case in strong}, {10000})
+        weak = [case for case in cases if case['mode'] == 'weak' and case['nservers'] == 2]
+        self.assertEqual([(case['nclients'], case['nlat'], case['ncell']) for case in weak],
+                         [(2, 101, 10000), (4, 201, 20000)])
+
+    def test_clients_per_server(self):
+        cases = scaling.make_cases(['strong'], [1, 4, 8], [1], 10, 10, 1, 1,
+                                   clients_per_server=4)
+        self.assertEqual([case['nservers'] for case in cases], [1, 1, 2])
+        self.assertEqual({case['group'] for case in cases}, {'4 clients per server'})
+
+    def test_efficiency(self):
+        results = [{'mode': 'strong', 'group': '1 servers', 'nclients': 1, 'wall_s': 8.},
+                   {'mode': 'strong', 'group': '1 servers', 'nclients': 4, 'wall_s': 4.},
+                   {'mode': 'weak', 'group': '1 servers', 'nclients': 1, 'wall_s': 2.},
+                   {'mode': 'weak', 'group': '1 servers', 'nclients': 4, 'wall_s': 2.5}]
+        scaling.add_efficiency(results)
+        self.assertEqual([result['speedup'] for result in results], [1., 2., 1., 0.8])
+        self.assertEqual([result['efficiency'] for result in results], [1., 0.5, 1., 0.8])
+
+    def test_run_case(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            stand_in = os.path.join(tmp, 'mpiexec')
+            with open(stand_in, 'w') as fout:
+                fout.write('#!/bin/sh\nhead -c 1000 /dev/zero > domain_output_1.nc\n'
+                           'printf "%s \\n" "$@" > args\ncp main.xml main.xml.run\n'
+                           f'cp {tmp}/xios_*.out .\n')
+            for name, log in [('xios_client_0.out', client_log), ('xios_server_0.out', server_log)]:
+                with open(os.path.join(tmp, name), 'w') as fout:
+                    fout.write(log)
+            os.chmod(stand_in, os.stat(stand_in).st_mode | stat.S_IEXEC)
+            work_dir = os.path.join(tmp, 'work')
+            os.mkdir(work_dir)
+            case = scaling.make_cases(['weak'], [1, 2], [1], 20, 11, 2, 5)[1]
+            launcher = mpi_launcher.Launcher(program=stand_in)
+            # keep the run directory to inspect it
+            with mock.patch.object(scaling.shutil, 'rmtree'):
+                result = scaling.run_case(case, launcher, work_dir)
+            run_dir, = [os.path.join(work_dir, name) for name in os.listdir(work_dir)]
+            with open(os.path.join(run_dir, 'args')) as fin:
+                self.assertEqual(fin.read().split(),
+                                 ['-n', '2', './write_parallel.exe', ':', '-n', '1', './xios_server.exe'])
+            variables = {var.get('id'): var.text for var in
+                         ET.parse(os.path.join(run_dir, 'main.xml.run')).iter('variable')}
+            self.assertEqual(variables, {'nlon': '20', 'nlat': '21', 'nlevs': '2', 'n_steps': '5'})
+            self.assertEqual(result['bytes'], 1000)
+            self.assertEqual(result['client_xios_s'], 0.31)
+            self.assertEqual(result['server_xios_s'], 1.4)
+            output = io.StringIO()
+            scaling.write_csv(scaling.add_efficiency([result]), output)
+            header, row = output.getvalue().splitlines()
+            self.assertEqual(header.split(','), scaling.columns)
+            self.assertTrue(row.startswith('weak,1 servers,2,1,20,21,2,400,5,'))
@@ -0,0 +1,119 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import xios_examples.mpi_launcher as mpi_launcher
+import xios_examples.tune_xios as tune_xios
+import xios_examples.xios_config as xios_config
+
+xios_xml = """<context>
+  <!-- buffer sizing -->
+  <variable_definition>
+    <variable_group id="buffer">
+      <variable id="optimal_buffer_size" type="string">
+	performance
+      </variable>
+      <variable id="buffer_size_factor" type="double">
+	1.0
+      </variable>
+    </variable_group>
+    <variable_group id="parameters" >
+       <variable id="using_server" type="bool">true</variable>
+    </variable_group>
+  </variable_definition>
+</context>
+"""
+
+
+class TestXiosConfig(unittest.TestCase):
+    """
+    Check XIOS variables are read, set and added through the XML tree,
+    and a tuning run through a local stand-in for mpiexec.
+
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.example_dir = os.path.join(self.tmp.name, 'example')
+        os.mkdir(self.example_dir)
+        self.xml_file = os.path.join(self.example_dir, 'xios.xml')
+        with open(self.xml_file, 'w') as fout:
+            fout.write(xios_xml)
+        with open(os.path.join(self.example_dir, 'iodef.xml'), 'w') as fout:
+            fout.write('<simulation>\n<context id="xios" src="./xios.xml"/>\n</simulation>\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_set_variables(self):
+        tree = xios_config.parse(self.xml_file)
+        self.assertEqual(xios_config.get_variables(tree),
+                         {'optimal_buffer_size': 'performance', 'buffer_size_factor': 1.0,
+                          'using_server': True})
+        xios_config.set_variable(tree, 'buffer_size_factor', 4)
+        xios_config.set_variable(tree, 'transport_protocol', 'p2p')
+        xios_config.set_variable(tree, 'using_server', False)
+        xios_config.write(tree, self.xml_file)
+        tree = xios_config.parse(self.xml_file)
+        self.assertEqual(xios_config.get_variables(tree),
+                         {'optimal_buffer_size': 'performance', 'buffer_size_factor': 4.0,
+                          'using_server': False, 'transport_protocol': 'p2p'})
+        self.assertEqual(tree.find(".//variable_group[@id='parameters']")[-1].get('type'), 'string')
+        self.assertIn('<!-- buffer sizing -->', xios_config.tostring(tree))
+        xios_config.remove_variable(tree, 'transport_protocol')
+        self.assertIsNone(xios_config.find_variable(tree, 'transport_protocol'))
+
+    def test_tune(self):
+        stand_in = os.path.join(self.tmp.name, 'mpiexec')
+        with open(stand_in, 'w') as fout:
+            # writes more output for larger buffers
+            fout.write('#!/bin/sh\n'
+                       'size=$(grep -A1 buffer_size_factor xios.xml | grep -o "[0-9]" | head -1)\n'
+                       'head -c ${size}000 /dev/zero > output.nc\n')
+        os.chmod(stand_in, os.stat(stand_in).st_mode | stat.S_IEXEC)
+        launcher = mpi_launcher.Launcher(program=stand_in)
+        configs = tune_xios.make_configs([1], [1.0, 2.0], ['memory'], [None])
+        results = [tune_xios.run_config(config, self.example_dir, './example.exe', 2,
+                                        launcher, self.tmp.name) for config in configs]
+        self.assertEqual([result['bytes'] for result in results], [1000, 2000])
+        self.assertTrue(all(result['ok'] for result in results))
+        runs = [{'ok': True, 'bytes': 1000, 'wall_s': 1.0, 'nservers': 1},
+                {'ok': True, 'bytes': 1000, 'wall_s': 0.5, 'nservers': 2},
+                {'ok': False, 'bytes': 0, 'wall_s': None, 'nservers': 4}]
+        self.assertEqual(tune_xios.best(runs)['nservers'], 2)
+        self.assertIsNone(tune_xios.best(runs[2:]))
+        xconfig = tune_xios.example_config(self.example_dir, results[1])
+        self.assertEqual(xconfig.get_variables()['optimal_buffer_size'], 'memory')
+
+    def test_stage(self):
+        for name in ['run.exe', 'input.cdl', 'stale.nc', 'xios_client_0.out']:
+            with open(os.path.join(self.example_dir, name), 'w') as fout:
+                fout.write(name)
+        xconfig = xios_config.XiosConfig(self.example_dir)
+        self.assertEqual(list(xconfig.trees), ['iodef.xml', 'xios.xml'])
+        xconfig.set_variable('transport_protocol', 'p2p')
+        run_dir = xconfig.stage(os.path.join(self.tmp.name, 'run'))
+        self.assertEqual(sorted(os.listdir(run_dir)),
+                         ['input.cdl', 'iodef.xml', 'run.exe', 'xios.xml'])
+        self.assertTrue(os.path.islink(os.path.join(run_dir, 'run.exe')))
+        self.assertFalse(os.path.islink(os.path.join(run_dir, 'xios.xml')))
+        self.assertEqual(xios_config.get_variables(xios_config.parse(
+            os.path.join(run_dir, 'xios.xml')))['transport_protocol'], 'p2p')
+        # the example is unchanged
+        with open(self.xml_file) as fin:
+            self.assertEqual(fin.read(), xios_xml)
+
+    def test_scratch(self):
+        shm = os.path.join(self.tmp.name, 'shm')
+        os.mkdir(shm)
+        with mock.patch.object(xios_config, 'tmpfs_dirs', [os.path.join(self.tmp.name, 'missing'), shm]):
+            self.assertEqual(xios_config.scratch_root(), shm)
+            sandboxes = [xios_config.XiosConfig(self.example_dir).stage(root=xios_config.scratch_root())
+                         for _ in range(2)]
+            self.assertNotEqual(sandboxes[0], sandboxes[1])
+            self.assertTrue(all(os.path.dirname(sandbox) == shm for sandbox in sandboxes))
+            self.assertIn('xios.xml', os.listdir(sandboxes[0]))
+        with mock.patch.object(xios_config, 'tmpfs_dirs', [os.path.join(self.tmp.name, 'missing')]):
+            self.assertIsNone(xios_config.scratch_root())
@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+import unittest
+
+import xios_examples.xios_report as xios_report
+
+client_log = """-> info : Client side context is finalized
+-> report :  Performance report : total time spent for XIOS : {total} s
+-> report :  Performance report : time spent for waiting free buffer : 0.012 s
+-> report :  Performance report : Ratio : 0.78 %
+-> report :  Performance report : This ratio must be close to zero.
+-> report :  Memory report : Minimum buffer size required : 86528 bytes
+-> report : Timer : Blocking time    -->   cumulated time : 1.2e-02
+"""
+
+
+class TestXiosReport(unittest.TestCase):
+    """
+    Check the parsing of XIOS performance reports and their tabulation.
+
+    """
+
+    def test_collect(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            for rank, total in enumerate([0.31, 0.45]):
+                with open(os.path.join(test_dir, f'xios_client_{rank}.out'), 'w') as fout:
+                    fout.write(client_log.format(total=total))
+            with open(os.path.join(test_dir, 'xios_server_0.out'), 'w') as fout:
+                fout.write('-> report : Performance report : Time spent for XIOS : 1.4\n'
+                           '-> report : Performance report : Ratio : 14.2%\n')
+            reports = xios_report.collect(test_dir)
+        self.assertEqual(reports['client']['ranks'], 2)
+        self.assertEqual(reports['client']['max'],
+                         {'total time spent for xios (s)': 0.45,
+                          'time spent for waiting free buffer (s)': 0.012,
+                          'ratio (%)': 0.78,
+                          'minimum buffer size required (bytes)': 86528.0,
+                          'timer:Blocking time': 0.012})
+        self.assertEqual(reports['server'], {'ranks': 1,
+                                             'max': {'time spent for xios': 1.4,
+                                                     'ratio (%)': 14.2}})
+
+    def test_table(self):
+        record = {'test': 'mod.TestCase.test_one', 'mver': 'XIOS/trunk', 'wall_s': 2.0,
+                  'xios': {'client': {'ranks': 1, 'max': {'timer:XIOS': 0.25}}}}
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file = os.path.join(log_dir, 'perf.jsonl')
+            with open(log_file, 'w') as fout:
+                fout.write(json.dumps(record) + '\n')
+            records = xios_report.load(log_file)
+        with tempfile.TemporaryFile(mode='w+') as out:
+            xios_report.table(records, ['wall_s', 'client:timer:XIOS', 'server:timer:XIOS'], out)
+            out.seek(0)
+            lines = out.read().splitlines()
+        self.assertEqual(lines[1].split(), ['TestCase.test_one', 'XIOS/trunk', '2', '0.25', '-'])
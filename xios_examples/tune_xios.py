@@ -0,0 +1,190 @@
+"""
+Tune the XIOS parameters of an example for output throughput.
+
+Runs an example programme over a grid of XIOS settings: the buffer size
+factor, `optimal_buffer_size` (performance or memory), the transport protocol
+(XIOS3) and the number of server ranks.  Each configuration runs in its own
+directory, holding links to the files of the example and its `xios.xml` with
+the parameters set, see xios_config.XiosConfig, so the example directory is
+not modified.  The throughput of a run is the bytes of netCDF written per second
+of wall time; the configuration with the best throughput is written out as a
+recommended `xios.xml`.
+
+The example must have been built, which is done first, and any netCDF inputs
+it reads must be present, e.g. kept from a test run with `files` set.
+
+usage: python -m xios_examples.tune_xios [EXAMPLE] [--clients 4] [--servers 1 2]
+           [--buffer_size_factor 1 2 4] [--optimal_buffer_size performance memory]
+           [--transport_protocol p2p legacy] [--output recommended_xios.xml]
+"""
+import argparse
+import csv
+import glob
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import xios_examples.build_cache as build_cache
+import xios_examples.mpi_launcher as mpi_launcher
+import xios_examples.xios_config as xios_config
+import xios_examples.xios_report as xios_report
+
+this_path = os.path.realpath(__file__)
+this_dir = os.path.dirname(this_path)
+
+# xios.xml parameters tuned, in the order of the configuration columns
+tuned_variables = ['buffer_size_factor', 'optimal_buffer_size', 'transport_protocol']
+columns = ['nservers'] + tuned_variables + ['ok', 'wall_s', 'bytes', 'mb_per_s', 'server_xios_s']
+
+
+def make_configs(servers, factors, optimal, protocols):
+    """
+    Return the grid of configurations, as dicts of nservers and the tuned
+    variables, a value of None leaving the variable as in the example.
+
+    """
+    return [dict(zip(['nservers'] + tuned_variables, values))
+            for values in itertools.product(servers, factors, optimal, protocols)]
+
+
+def example_config(example_dir, config):
+    """
+    Return the XiosConfig of the example with the xios.xml variables of config set.
+
+    """
+    xconfig = xios_config.XiosConfig(example_dir)
+    for name in tuned_variables:
+        if config.get(name) is not None:
+            xconfig.set_variable(name, config[name])
+    return xconfig
+
+
+def written_bytes(run_dir):
+    """
+    Return the total size of the netCDF files written in run_dir, not linked.
+
+    """
+    return sum(os.path.getsize(path) for path in glob.glob(os.path.join(run_dir, '*.nc'))
+               if not os.path.islink(path))
+
+
+def run_config(config, example_dir, executable, nclients, launcher, work_dir, repeat=1):
+    """
+    Run the example for one configuration, returning it with its results,
+    for the best of repeat runs.
+
+    """
+    result = dict(config)
+    result.update({'ok': False, 'wall_s': None, 'bytes': 0, 'mb_per_s': None,
+                   'server_xios_s': None})
+    times = []
+    for _ in range(repeat):
+        run_dir = tempfile.mkdtemp(dir=work_dir, prefix='run_')
+        example_config(example_dir, config).stage(run_dir)
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            launcher.run(executable, nclients=nclients, nservers=config['nservers'], cwd=run_dir)
+        except subprocess.CalledProcessError as err:
+            print(f'configuration {config} failed: {err}', file=sys.stderr, flush=True)
+            return result
+        times.append(time.perf_counter() - start)
+        if times[-1] == min(times):
+            result['bytes'] = written_bytes(run_dir)
+            server = xios_report.collect(run_dir, since=started).get('server', {})
+            result['server_xios_s'] = server.get('max', {}).get('time spent for xios')
+        shutil.rmtree(run_dir, ignore_errors=True)
+    result['ok'] = True
+    result['wall_s'] = min(times)
+    result['mb_per_s'] = result['bytes'] / result['wall_s'] / 1e6
+    return result
+
+
+def best(results):
+    """
+    Return the successful result with the best throughput, or the shortest
+    time if no output was written, or None if every run failed.
+
+    """
+    ok = [result for result in results if result['ok']]
+    if not ok:
+        return None
+    return max(ok, key=lambda result: (result['bytes'] / result['wall_s'], -result['wall_s']))
+
+
+def find_executable(example_dir):
+    exes = [os.path.basename(path) for path in glob.glob(os.path.join(example_dir, '*.exe'))
+            if os.path.basename(path) != os.path.basename(mpi_launcher.xios_server)]
+    if len(exes) != 1:
+        raise ValueError(f'found executables {exes} in {example_dir}, use --executable')
+    return f'./{exes[0]}'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tune the XIOS parameters of an example for throughput')
+    parser.add_argument('example', nargs='?', default='write_domain_parallel',
+                        help='Example directory, relative to xios_examples (default: %(default)s)')
+    parser.add_argument('--executable', help='Example programme (default: the one .exe built)')
+    parser.add_argument('--clients', type=int, default=2,
+                        help='Number of client ranks, the workload (default: %(default)s)')
+    parser.add_argument('--servers', nargs='+', type=int, default=[1, 2],
+                        help='Numbers of XIOS server ranks (default: %(default)s)')
+    parser.add_argument('--buffer_size_factor', nargs='+', type=float, default=[1.0, 2.0, 4.0],
+                        help='Buffer size factors (default: %(default)s)')
+    parser.add_argument('--optimal_buffer_size', nargs='+', choices=['performance', 'memory'],
+                        default=['performance', 'memory'],
+                        help='Buffer sizing strategies (default: %(default)s)')
+    parser.add_argument('--transport_protocol', nargs='+', default=[None],
+                        help='XIOS3 transport protocols, e.g. p2p legacy one_sided '
+                             '(default: as in the example)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per configuration, the best time is used (default: %(default)s)')
+    parser.add_argument('--csv', help='Write the results of all configurations to this CSV file')
+    parser.add_argument('--output', default='recommended_xios.xml',
+                        help='Recommended xios.xml written (default: %(default)s)')
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.clients < 1 or min(args.servers) < 1:
+        parser.error('--repeat, --clients and --servers must be at least 1')
+
+    example_dir = os.path.join(this_dir, args.example)
+    build_cache.build(example_dir)
+    executable = args.executable or find_executable(example_dir)
+    # the server counts are swept here, not derived from the clients
+    launcher = mpi_launcher.get_launcher(clients_per_server=0)
+    configs = make_configs(args.servers, args.buffer_size_factor, args.optimal_buffer_size,
+                           args.transport_protocol)
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for config in configs:
+            result = run_config(config, example_dir, executable, args.clients, launcher,
+                                work_dir, args.repeat)
+            if result['ok']:
+                print(f"{result['nservers']:3d} servers {result['buffer_size_factor']:6g} "
+                      f"{result['optimal_buffer_size']:11s} {str(result['transport_protocol']):9s} "
+                      f"{result['wall_s']:9.3f} s {result['mb_per_s']:9.2f} MB/s",
+                      file=sys.stderr, flush=True)
+            results.append(result)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as fout:
+            writer = csv.DictWriter(fout, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(results)
+    chosen = best(results)
+    if chosen is None:
+        print('every configuration failed', file=sys.stderr)
+        return 1
+    xios_config.write(example_config(example_dir, chosen).trees['xios.xml'], args.output)
+    print(f"best: {chosen['nservers']} servers, buffer_size_factor {chosen['buffer_size_factor']:g}, "
+          f"optimal_buffer_size {chosen['optimal_buffer_size']}, "
+          f"transport_protocol {chosen['transport_protocol'] or 'default'}, "
+          f"{chosen['mb_per_s']:.2f} MB/s; written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
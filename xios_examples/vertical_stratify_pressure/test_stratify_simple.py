@@ -21,11 +21,11 @@ class TestResampleAxis(xshared._TestCase):
 
     def test_pressure_stratification(self):
         # run the compiled Fortran XIOS programme
-        with open('{}/xios.xml'.format(self.test_dir)) as cxml:
+        with open('{}/xios.xml'.format(self.run_dir)) as cxml:
             print(cxml.read(), flush=True)
-        self.run_mpi_xios()
+        self.run_mpi_xios(run_dir=self.run_dir)
         outputfile = self.transient_outputs[0]
-        runfile = '{}/{}'.format(self.test_dir, outputfile)
+        runfile = '{}/{}'.format(self.run_dir, outputfile)
         assert(os.path.exists(runfile))
         rootgrp = netCDF4.Dataset(runfile, 'r')
 
@@ -36,15 +36,6 @@ class TestResampleAxis(xshared._TestCase):
                             [[233.3793 ]]])
 
         result = rootgrp['temponP'][:]
-        diff = result - expected
-        # prepare message for failure
-        msg = ('the expected resample data array\n {exp}\n '
-               'differs from the resampled data array\n {res} \n '
-               'with diff \n {diff}\n')
-        msg = msg.format(exp=expected, res=result, diff=diff)
-        if not np.allclose(result, expected, rtol=self.rtol):
-            # print message for fail case,
-            # as expected failures do not report msg.
-            print(msg)
-        self.assertTrue(np.allclose(result, expected, rtol=self.rtol), msg=msg)
-
+        rootgrp.close()
+        msg = 'the expected resample data array differs from the resampled data array'
+        self.assert_close(result, expected, msg=msg)
@@ -18,8 +18,9 @@ class TestResampleDomain(xshared._TestCase):
     rtol = 5e-03
 
     def setUp(self):
+        super().setUp()
         for inx in ['iodef.xml', 'xios.xml', 'axis_check.xml', 'main.xml']:
-            with open('{}/{}'.format(self.test_dir, inx)) as cxml:
+            with open('{}/{}'.format(self.run_dir, inx)) as cxml:
                 print(inx, flush=True)
                 print(cxml.read(), flush=True)
 
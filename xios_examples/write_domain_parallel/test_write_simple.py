@@ -17,16 +17,18 @@ class TestParallelWrite(xshared._TestCase):
     transient_outputs = ["domain_output_1.nc"]
     rtol = 5e-04
     executable = './write_parallel.exe'
+    nclients = 2
+    nservers = 2
 
     def test_parallel_write(self):
         # run the compiled Fortran XIOS programme
-        with open('{}/xios.xml'.format(self.test_dir)) as cxml:
+        with open('{}/xios.xml'.format(self.run_dir)) as cxml:
             print(cxml.read(), flush=True)
-        self.run_mpi_xios(nclients=2, nservers=2)
+        self.run_mpi_xios(run_dir=self.run_dir)
         outputfile_1 = self.transient_outputs[0]
 
         # Check the expected output file exists
-        runfile_1 = '{}/{}'.format(self.test_dir, outputfile_1)
+        runfile_1 = '{}/{}'.format(self.run_dir, outputfile_1)
         self.assertTrue(os.path.exists(runfile_1))
 
         # Checks for output file
@@ -39,15 +41,6 @@ class TestParallelWrite(xshared._TestCase):
         # Check average value of file for level 1, time 1
         expected = 2.8
         result = np.average(file_1_data[-1,0,:])
-        diff = result - expected
-        # prepare message for failure
-        msg = (self.transient_outputs[0] + ': the expected result\n {exp}\n '
-               'differs from the actual result\n {res} \n '
-               'with diff \n {diff}\n')
-        msg = msg.format(exp=expected, res=result, diff=diff)
-        self.assertTrue(np.allclose(result, expected, rtol=self.rtol), msg=msg)
-
-        
-        
-
-
+        rootgrp.close()
+        msg = self.transient_outputs[0] + ': the expected result differs from the actual result'
+        self.assert_close(result, expected, msg=msg)
@@ -1,11 +1,9 @@
 import copy
 import glob
-import netCDF4
-import numpy as np
 import os
-import subprocess
 import unittest
 
+import xios_examples.nc_compare as nc_compare
 import xios_examples.shared_testing as xshared
 
 this_path = os.path.realpath(__file__)
@@ -16,11 +14,10 @@ class TestWriteMetadata(xshared._TestCase):
     transient_inputs = ['spatial_data_input.nc']
     transient_outputs = ['spatial_data_output.nc']
     executable = './write.exe'
-    rtol = 5e-03
 
     @classmethod
     def make_a_write_test(cls, inf, nc_method='cdl_files',
-                          nclients=1, nservers=1):
+                          nclients=None, nservers=None):
         """
         this function makes a test case and returns it as a test function,
         suitable to be dynamically added to a TestCase for running.
@@ -33,25 +30,19 @@ class TestWriteMetadata(xshared._TestCase):
         outputfile = cls.transient_outputs[0]
         def test_write_metadata(self):
             # create a netCDF file using nc_method
-            cls.make_netcdf(infcp, inputfile, nc_method=nc_method)
-            cls.run_mpi_xios(nclients=nclients, nservers=nservers)
+            cls.make_netcdf(infcp, inputfile, nc_method=nc_method, run_dir=self.run_dir)
+            cls.run_mpi_xios(nclients=nclients, nservers=nservers, run_dir=self.run_dir)
 
             # load the result netCDF file
-            runfile = '{}/{}'.format(cls.test_dir, outputfile)
+            runfile = '{}/{}'.format(self.run_dir, outputfile)
             assert(os.path.exists(runfile))
-            run_cmd = ['ncdump', runfile]
-            ncd = subprocess.run(run_cmd, check=True, capture_output=True)
-
-            with open(f'{this_dir}/expected_domain_output.cdl') as fin:
-                exptd = fin.read()
-            emsg = ''
-            for eline, aline in zip(exptd.split('\n'),
-                                    ncd.stdout.decode("utf-8").split('\n')):
-                if eline != aline:
-                    # skip timestamp and uuid
-                    # until we work out how not to set these
-                    if not (':timeStamp' in eline or ':uuid' in eline):
-                        emsg += eline + '\n' + aline + '\n\tmismatch\n\n'
+            # compare the file structure, attributes and exact values with
+            # the kgo compiled from the expected cdl, skipping the
+            # timeStamp and uuid attributes set by XIOS on each run
+            differences = nc_compare.compare_structure(
+                runfile, f'{this_dir}/expected_domain_output.cdl',
+                exact=True)
+            emsg = '\n'.join(differences)
 
             self.assertFalse(emsg, msg=emsg)
         return test_write_metadata
@@ -0,0 +1,209 @@
+"""
+Read and set the XIOS parameters of an `xios.xml` context file.
+
+The `xios` context of each example holds `variable` elements, in the
+`variable_group`s 'buffer' and 'parameters', such as
+
+    <variable id="buffer_size_factor" type="double">1.0</variable>
+
+These are read and set through the XML tree, adding variables not yet
+defined to their usual group with their XIOS type.
+
+An XiosConfig holds the `iodef.xml` of an example and the context files it
+includes in memory, to be modified and written, with links to the other
+files of the example, to a run directory, leaving the example unchanged.
+"""
+import glob
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+
+# group and XIOS type of the parameters set by the tests and the tuner
+known_variables = {'optimal_buffer_size': ('buffer', 'string'),
+                   'buffer_size_factor': ('buffer', 'double'),
+                   'min_buffer_size': ('buffer', 'int'),
+                   'using_server': ('parameters', 'bool'),
+                   'info_level': ('parameters', 'int'),
+                   'print_file': ('parameters', 'bool'),
+                   'transport_protocol': ('parameters', 'string')}
+
+
+def parse(path):
+    """
+    Return the ElementTree of an XML file, keeping any comments.
+
+    """
+    parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
+    return ET.parse(path, parser=parser)
+
+
+def to_text(value, var_type):
+    """
+    Return value as the text of an XIOS variable of var_type.
+
+    """
+    if var_type == 'bool':
+        if isinstance(value, str):
+            value = value.strip().lower() in ('true', '.true.', '1')
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def from_text(text, var_type):
+    """
+    Return the value of the text of an XIOS variable of var_type.
+
+    """
+    text = (text or '').strip()
+    if var_type == 'bool':
+        return text.lower() in ('true', '.true.')
+    if var_type == 'int':
+        return int(text)
+    if var_type == 'double':
+        return float(text)
+    return text
+
+
+def find_variable(tree, var_id):
+    return tree.getroot().find(f".//variable[@id='{var_id}']")
+
+
+def get_variables(tree):
+    """
+    Return a dict of id to value of the variables of the tree.
+
+    """
+    return {var.get('id'): from_text(var.text, var.get('type', 'string'))
+            for var in tree.getroot().iter('variable')}
+
+
+def set_variable(tree, var_id, value, var_type=None, group=None):
+    """
+    Set the value of variable var_id, adding it if not defined.
+
+        Parameters:
+            tree: ElementTree of an XIOS context
+            var_id: Variable id
+            value: New value
+            var_type: XIOS type, by default that of the existing or known variable,
+                      else string
+            group: Id of the variable_group of a new variable, by default that of
+                   the known variable, else 'parameters'
+    """
+    var = find_variable(tree, var_id)
+    known_group, known_type = known_variables.get(var_id, ('parameters', 'string'))
+    if var is None:
+        group = group or known_group
+        vdef = tree.getroot().find('variable_definition')
+        if vdef is None:
+            vdef = ET.SubElement(tree.getroot(), 'variable_definition')
+        vgroup = vdef.find(f"variable_group[@id='{group}']")
+        if vgroup is None:
+            vgroup = ET.SubElement(vdef, 'variable_group', {'id': group})
+        var = ET.SubElement(vgroup, 'variable', {'id': var_id})
+        var.set('type', var_type or known_type)
+    elif var_type is not None:
+        var.set('type', var_type)
+    var.text = to_text(value, var.get('type', 'string'))
+    return var
+
+
+def remove_variable(tree, var_id):
+    """
+    Remove variable var_id, if defined.
+
+    """
+    for parent in tree.getroot().iter():
+        for var in parent.findall(f"variable[@id='{var_id}']"):
+            parent.remove(var)
+
+
+def tostring(tree):
+    """
+    Return the XML text of the tree, indented.
+
+    """
+    ET.indent(tree, space='  ')
+    return ET.tostring(tree.getroot(), encoding='unicode') + '\n'
+
+
+def write(tree, path):
+    with open(path, 'w') as fout:
+        fout.write(tostring(tree))
+
+
+# files of an example directory made by builds and runs, not linked into run directories
+generated_patterns = ['*.nc', '*.out', '*.err', '*.o', '*.mod', '*.MOD']
+# memory backed file systems used for scratch directories, if available
+tmpfs_dirs = ['/dev/shm']
+
+
+def scratch_root():
+    """
+    Return a directory for scratch run directories, a tmpfs if available,
+    else None for the system temporary directory.
+
+    """
+    for tmpfs in tmpfs_dirs:
+        if os.path.isdir(tmpfs) and os.access(tmpfs, os.W_OK | os.X_OK):
+            return tmpfs
+    return None
+
+
+class XiosConfig:
+    """
+    The XIOS configuration of an example directory, iodef.xml and the context
+    files it includes with src, parsed into memory.
+
+    """
+
+    def __init__(self, source_dir, iodef='iodef.xml'):
+        self.source_dir = os.path.realpath(source_dir)
+        self.trees = {iodef: parse(os.path.join(self.source_dir, iodef))}
+        for context in self.trees[iodef].getroot().iter('context'):
+            src = context.get('src')
+            if src is not None:
+                src = os.path.normpath(src)
+                self.trees[src] = parse(os.path.join(self.source_dir, src))
+
+    def get_variables(self, name='xios.xml'):
+        return get_variables(self.trees[name])
+
+    def set_variable(self, var_id, value, var_type=None, group=None, name='xios.xml'):
+        """
+        Set the value of variable var_id in the XML file name, see set_variable.
+
+        """
+        return set_variable(self.trees[name], var_id, value, var_type=var_type, group=group)
+
+    def write(self, run_dir):
+        """
+        Write the XML files to run_dir.
+
+        """
+        for name, tree in self.trees.items():
+            path = os.path.join(run_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write(tree, path)
+
+    def stage(self, run_dir=None, root=None):
+        """
+        Fill run_dir, a new temporary directory in root if None, with links to
+        the files of the example and the XML files, and return its path.
+
+        Built executables and source files are linked; files from earlier
+        builds and runs, see generated_patterns, are not.
+        """
+        if run_dir is None:
+            run_dir = tempfile.mkdtemp(dir=root, prefix=f'tcd_{os.path.basename(self.source_dir)}_')
+        os.makedirs(run_dir, exist_ok=True)
+        generated = set()
+        for pattern in generated_patterns:
+            generated.update(glob.glob(os.path.join(self.source_dir, pattern)))
+        for path in glob.glob(os.path.join(self.source_dir, '*')):
+            name = os.path.basename(path)
+            if name in self.trees or path in generated or os.path.isdir(path):
+                continue
+            os.symlink(os.path.realpath(path), os.path.join(run_dir, name))
+        self.write(run_dir)
+        return run_dir
@@ -0,0 +1,162 @@
+"""
+Parse the performance reports written by XIOS clients and servers.
+
+With `print_file` set in xios.xml, each XIOS rank writes a log,
+`xios_client_<rank>.out` or `xios_server_<rank>.out`, ending with report lines
+such as
+
+    -> report : Performance report : time spent for waiting free buffer : 0.012 s
+    -> report : Memory report : Minimum buffer size required : 86528 bytes
+
+and, with `info_level` 100 as used by these examples, the cumulated time of
+every internal XIOS timer
+
+    -> report : Timer : Blocking time    -->   cumulated time : 0.012
+
+The timers of a run are collected into the PERF_LOG records, see perf_log.
+Run as a programme to tabulate runs from a PERF_LOG file:
+
+usage: python -m xios_examples.xios_report PERF_LOG [-c COLUMN] [-k SUBSTRING] [--keys]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+
+report_line = re.compile(r'(?:Performance|Memory) report\s*:\s*(?P<label>.+?)\s*:\s*'
+                         r'(?P<value>[-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?)\s*(?P<unit>[^\s:]*)\s*$')
+timer_line = re.compile(r'Timer\s*:\s*(?P<label>.+?)\s*-->\s*cumulated time\s*:\s*'
+                        r'(?P<value>[-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?)')
+
+# columns tabulated by default, as role:key
+default_columns = ['client:total time spent for xios (s)',
+                   'client:time spent for waiting free buffer (s)',
+                   'server:time spent for xios',
+                   'server:time spent in processing events']
+
+
+def parse_log(path):
+    """
+    Return a dict of report key to value from one XIOS log file.
+
+    Report keys are the lower case label, with the unit in brackets if given;
+    timer keys are 'timer:' followed by the timer name, in seconds.
+    """
+    values = {}
+    with open(path, errors='replace') as fin:
+        for line in fin:
+            match = timer_line.search(line)
+            if match:
+                values[f'timer:{match["label"]}'] = float(match['value'])
+                continue
+            match = report_line.search(line)
+            if match:
+                key = match['label'].lower()
+                if match['unit']:
+                    key = f'{key} ({match["unit"]})'
+                values[key] = float(match['value'])
+    return values
+
+
+def collect(test_dir, since=None):
+    """
+    Return the reports of the XIOS logs in test_dir, per role.
+
+    For each of 'client' and 'server', gives the number of ranks reporting
+    and the maximum of each value over ranks, the rank on the critical path.
+    Logs modified before time since, left from earlier runs, are ignored.
+    """
+    reports = {}
+    for role in ['client', 'server']:
+        ranks = 0
+        values = {}
+        for path in sorted(glob.glob(os.path.join(test_dir, f'xios_{role}_*.out'))):
+            if since is not None and os.path.getmtime(path) < since:
+                continue
+            ranks += 1
+            for key, value in parse_log(path).items():
+                values[key] = max(value, values.get(key, value))
+        if ranks:
+            reports[role] = {'ranks': ranks, 'max': values}
+    return reports
+
+
+def load(log_file):
+    """
+    Return the records from a PERF_LOG file.
+
+    """
+    records = []
+    with open(log_file) as fin:
+        for line in fin:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def value(record, column):
+    """
+    Return the value of column, a record field or role:key, from record.
+
+    """
+    if ':' in column:
+        role, key = column.split(':', 1)
+        if role in ('client', 'server'):
+            return record.get('xios', {}).get(role, {}).get('max', {}).get(key)
+    return record.get(column)
+
+
+def table(records, columns, fout=None):
+    """
+    Write a table of the columns for each record, with the test and XIOS version.
+
+    """
+    fout = fout or sys.stdout
+    names = ['.'.join(record.get('test', '').split('.')[-2:]) for record in records]
+    width = max([len('test')] + [len(name) for name in names])
+    mwidth = max([len('mver')] + [len(record.get('mver', '')) for record in records])
+    cwidths = [max(10, len(column)) for column in columns]
+    fout.write(f'{"test":{width}s}  {"mver":{mwidth}s} ' +
+               ' '.join(f'{column:>{cw}s}' for column, cw in zip(columns, cwidths)) + '\n')
+    for name, record in zip(names, records):
+        cells = []
+        for column, cw in zip(columns, cwidths):
+            val = value(record, column)
+            cells.append(f'{"-":>{cw}s}' if val is None else f'{val:{cw}.4g}')
+        fout.write(f'{name:{width}s}  {record.get("mver", ""):{mwidth}s} ' + ' '.join(cells) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tabulate XIOS performance reports from a PERF_LOG file')
+    parser.add_argument('log_file', nargs='?', default=os.environ.get('PERF_LOG'),
+                        help='JSON lines file written by the tests (default: $PERF_LOG)')
+    parser.add_argument('-c', '--column', action='append', default=[],
+                        help='Column to show, a record field such as wall_s or role:key '
+                             'such as client:timer:Blocking time, may be repeated')
+    parser.add_argument('-k', dest='only', action='append', default=[],
+                        help='Only show tests containing this substring, may be repeated')
+    parser.add_argument('--keys', action='store_true',
+                        help='List the available role:key columns and exit')
+    args = parser.parse_args(argv)
+    if not args.log_file:
+        parser.error('no PERF_LOG file given')
+
+    records = load(args.log_file)
+    if args.only:
+        records = [record for record in records
+                   if any(only in record.get('test', '') for only in args.only)]
+    if args.keys:
+        keys = set()
+        for record in records:
+            for role, report in record.get('xios', {}).items():
+                keys.update(f'{role}:{key}' for key in report.get('max', {}))
+        print('\n'.join(sorted(keys)))
+        return 0
+    table(records, ['wall_s'] + (args.column or default_columns))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())